@@ -0,0 +1,178 @@
+# ===========================================================
+# BENCHMARK DEL ARRANQUE DE LA APP
+# ===========================================================
+# Mide lo que cuesta un arranque en frío de la app de Streamlit:
+#
+# - Importación: cada módulo (la capa de datos y cada página de
+#   proyecto/paginas/) en un intérprete nuevo, y qué dependencias pesadas
+#   (pandas, numpy, fpdf) arrastra. Las páginas se miden después de
+#   importar streamlit, que se mide aparte.
+# - Primer render: con streamlit.testing (AppTest), en un proceso nuevo,
+#   el primer rerun de la app (carga de datos incluida), la primera visita
+#   a cada página (importa su módulo) y un segundo rerun de la misma.
+#
+#     python benchmarks/bench_arranque.py                        # 2k usuarios, 20k facturas
+#     python benchmarks/bench_arranque.py 20000 200000 --salida arranque.json
+#
+# Cada medida se repite en procesos nuevos y se queda la mejor. Lo que no
+# se puede medir porque falta una dependencia se anota con un error.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROYECTO = os.path.join(RAIZ, "proyecto")
+sys.path.insert(0, PROYECTO)
+
+from generador import generar_datos, SEMILLA
+
+USUARIOS = 2000
+FACTURAS = 20000
+REPETICIONES = 3
+PESADOS = ["pandas", "numpy", "fpdf"]
+MODULOS = ["repositorio", "negocio", "paginas.comun"]
+PAGINAS = {
+    "Registrar Usuario": "registrar_usuario",
+    "Crear Factura": "crear_factura",
+    "Ver Usuarios": "ver_usuarios",
+    "Buscar Usuario": "buscar_usuario",
+    "Facturas por Usuario": "facturas_usuario",
+    "Eliminar Usuario": "eliminar_usuario",
+    "Resumen Financiero": "resumen_financiero",
+    "Ver Estadísticas": "ver_estadisticas",
+    "Exportar Datos": "exportar_datos",
+    "Importar Datos": "importar_datos",
+}
+
+# Se ejecutan con `python -c` en un intérprete nuevo y escriben un JSON en la salida estándar
+SCRIPT_IMPORTACION = """
+import json, sys, time
+sys.path.insert(0, {proyecto!r})
+resultado = {{}}
+try:
+    if {previo!r}:
+        inicio = time.perf_counter()
+        __import__({previo!r})
+        resultado["previo_s"] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    __import__({modulo!r})
+    resultado["segundos"] = time.perf_counter() - inicio
+except ImportError as e:
+    resultado["error"] = f"dependencia no disponible: {{e.name}}"
+resultado["pesados"] = [m for m in {pesados!r} if m in sys.modules]
+print(json.dumps(resultado))
+"""
+
+SCRIPT_RENDER = """
+import json, sys, time
+resultado = {{}}
+try:
+    from streamlit.testing.v1 import AppTest
+except ImportError as e:
+    print(json.dumps({{"error": f"dependencia no disponible: {{e.name}}"}}))
+    sys.exit()
+prueba = AppTest.from_file({app!r}, default_timeout=600)
+inicio = time.perf_counter()
+prueba.run()
+resultado["primer_rerun_s"] = time.perf_counter() - inicio
+resultado["pesados_al_arrancar"] = [m for m in {pesados!r} if m in sys.modules]
+paginas = {{}}
+for opcion in {opciones!r}:
+    medida = {{}}
+    inicio = time.perf_counter()
+    prueba.sidebar.radio[0].set_value(opcion).run()
+    medida["primera_visita_s"] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    prueba.run()
+    medida["rerun_s"] = time.perf_counter() - inicio
+    if prueba.exception:
+        medida["error"] = str(prueba.exception[0].value)
+    paginas[opcion] = medida
+resultado["paginas"] = paginas
+print(json.dumps(resultado))
+"""
+
+
+def ejecutar(script, entorno=None):
+    salida = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=entorno, cwd=RAIZ)
+    if salida.returncode:
+        return {"error": salida.stderr.strip().splitlines()[-1]}
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def mejor(medidas, clave):
+    """La medida con el menor valor de `clave` (o la primera con error)."""
+    validas = [m for m in medidas if clave in m]
+    return min(validas, key=lambda m: m[clave]) if validas else medidas[0]
+
+
+def medir_importacion(modulo, previo, repeticiones):
+    script = SCRIPT_IMPORTACION.format(proyecto=PROYECTO, modulo=modulo, previo=previo, pesados=PESADOS)
+    return mejor([ejecutar(script) for _ in range(repeticiones)], "segundos")
+
+
+def medir_render(directorio, repeticiones):
+    script = SCRIPT_RENDER.format(app=os.path.join(PROYECTO, "app.py"), pesados=PESADOS, opciones=list(PAGINAS))
+    entorno = dict(os.environ, CRM_DATA_DIR=directorio)
+    return mejor([ejecutar(script, entorno) for _ in range(repeticiones)], "primer_rerun_s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importación y primer render de la app.")
+    parser.add_argument("usuarios", nargs="?", type=int, default=USUARIOS)
+    parser.add_argument("facturas", nargs="?", type=int, default=FACTURAS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args()
+
+    importacion = {"streamlit": medir_importacion("streamlit", None, args.repeticiones)}
+    for modulo in MODULOS:
+        importacion[modulo] = medir_importacion(modulo, None, args.repeticiones)
+    for pagina in PAGINAS.values():
+        importacion[f"paginas.{pagina}"] = medir_importacion(f"paginas.{pagina}", "streamlit", args.repeticiones)
+    for modulo, medida in importacion.items():
+        detalle = medida.get("error") or f"{medida['segundos'] * 1000:8.1f} ms"
+        print(f"importar {modulo:<28} | {detalle} | pesados: {', '.join(medida['pesados']) or '-'}", file=sys.stderr)
+
+    directorio = tempfile.mkdtemp(prefix="bench_arranque_")
+    try:
+        generar_datos(directorio, args.usuarios, args.facturas, SEMILLA)
+        render = medir_render(directorio, args.repeticiones)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    if "error" in render:
+        print(f"primer render | {render['error']}", file=sys.stderr)
+    else:
+        print(f"primer rerun                          | {render['primer_rerun_s'] * 1000:8.1f} ms | "
+              f"pesados: {', '.join(render['pesados_al_arrancar']) or '-'}", file=sys.stderr)
+        for opcion, medida in render["paginas"].items():
+            print(f"{opcion:<22} | primera visita {medida['primera_visita_s'] * 1000:8.1f} ms | "
+                  f"rerun {medida['rerun_s'] * 1000:8.1f} ms" + (f" | {medida['error']}" if "error" in medida else ""),
+                  file=sys.stderr)
+
+    informe = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "usuarios": args.usuarios,
+        "facturas": args.facturas,
+        "importacion": importacion,
+        "render": render,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
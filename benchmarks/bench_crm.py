@@ -0,0 +1,276 @@
+# ===========================================================
+# BENCHMARK DE LAS OPERACIONES PRINCIPALES DEL CRM
+# ===========================================================
+# Genera datos sintéticos (ver generador.py) de varios tamaños y mide el
+# tiempo y la memoria máxima de cada operación: cargar y guardar datos,
+# altas de usuarios y facturas, resumen financiero, búsqueda por nombre,
+# estadísticas, exportación CSV e informes PDF. El resultado se escribe como JSON para poder comparar
+# ejecuciones y detectar regresiones.
+#
+#     python benchmarks/bench_crm.py                          # 1k, 10k, 100k y 1M facturas
+#     python benchmarks/bench_crm.py 1000 10000 --backend sqlite --salida bench.json
+#     python benchmarks/bench_crm.py 100000 --operaciones cargar_datos,resumen_financiero
+#     python benchmarks/bench_crm.py 1000000 --particiones 8     # datos repartidos (ver particiones.py)
+#
+# La memoria máxima se mide con tracemalloc en una segunda ejecución de
+# cada operación (tracemalloc ralentiza el código, así que no se mezcla
+# con la medida de tiempo); --sin-memoria se la salta.
+# Las operaciones cuyas dependencias (pandas, fpdf) no estén instaladas
+# se anotan con un error en lugar de detener el benchmark.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proyecto"))
+
+from generador import generar_datos, SEMILLA, NOMBRES, APELLIDOS
+from busqueda import IndiceBusqueda
+from exportacion import exportar_csv, exportar_csv_facturas
+from particiones import repartir
+from repositorio import abrir_repositorio, migrar_json_a_sqlite, CAMPOS_USUARIO
+
+TAMANOS = [1_000, 10_000, 100_000, 1_000_000]
+FACTURAS_POR_USUARIO = 5
+# Más altas que MAX_ENTRADAS_DIARIO, para que se compacte en segundo plano mientras tanto
+ALTAS = 1000
+BUSQUEDAS = [n.lower() for n in NOMBRES[:5]] + [f"{n[:3]} {a[:4]}" for n, a in zip(NOMBRES[5:10], APELLIDOS)]
+
+
+# -------- operaciones --------
+# Cada operación recibe el contexto de la medición (repositorio abierto,
+# directorio de datos y directorio temporal) y devuelve un número de
+# repeticiones si mide varias llamadas, o None.
+
+def op_cargar_datos(ctx):
+    abrir_repositorio(ctx["directorio"], ctx["backend"]).cerrar()
+
+
+def ensuciar_diario(ctx):
+    """Da de alta y de baja un usuario con una factura, para que guardar() tenga que reescribir la foto entera.
+
+    Sin cambios pendientes guardar() no hace nada (solo se reescribe lo
+    que cambió), y la medida sería siempre 0.
+    """
+    repo = ctx["repo"]
+    repo.crear_usuario({
+        "nombre": "Bench Guardar", "email": "bench.guardar@example.com", "telefono": "No especificado",
+        "direccion": "No especificado", "fecha_registro": "01/01/2024",
+    })
+    repo.crear_factura({
+        "fecha": "01/01/2024 10:00", "descripcion": "Bench", "monto": 10.0, "estado": "Pendiente",
+        "cliente": "Bench Guardar", "email": "bench.guardar@example.com",
+    })
+    repo.eliminar_usuario("bench.guardar@example.com")
+
+
+def op_guardar_datos(ctx):
+    ctx["repo"].guardar()
+
+
+def op_registrar_usuarios(ctx):
+    repo, base = ctx["repo"], ctx.setdefault("altas", 0)
+    for i in range(base, base + ALTAS // 5):
+        repo.crear_usuario({
+            "nombre": f"Bench {i}", "email": f"bench{i}@example.com", "telefono": "No especificado",
+            "direccion": "No especificado", "fecha_registro": "01/01/2024",
+        })
+    ctx["altas"] = base + ALTAS // 5
+    return ALTAS // 5
+
+
+def op_emitir_facturas(ctx):
+    repo = ctx["repo"]
+    usuario = repo.obtener_usuario(repo.emails()[0])
+    for _ in range(ALTAS):
+        repo.crear_factura({
+            "fecha": "01/01/2024 10:00", "descripcion": "Bench", "monto": 10.0, "estado": "Pendiente",
+            "cliente": usuario["nombre"], "email": usuario["email"],
+        })
+    return ALTAS
+
+
+def op_resumen_financiero(ctx):
+    from analitica import MotorAnalitico
+    MotorAnalitico(ctx["repo"]).resumen_por_usuario()
+
+
+def op_indice_busqueda(ctx):
+    IndiceBusqueda(ctx["repo"].usuarios())
+
+
+def op_buscar_usuarios(ctx):
+    for consulta in BUSQUEDAS:
+        ctx["repo"].buscar_usuarios(consulta)
+    return len(BUSQUEDAS)
+
+
+def op_ver_estadisticas(ctx):
+    resumen = ctx["repo"].resumen_mensual()
+    meses = resumen.lista_meses()
+    desde = meses[len(meses) // 2] if meses else None
+    resumen.meses()
+    resumen.por_estado()
+    resumen.totales()
+    resumen.meses(desde, None, ["Pagada"])
+    resumen.totales(desde, None, ["Pagada"])
+
+
+def op_exportar_csv_usuarios(ctx):
+    exportar_csv(ctx["repo"].usuarios(), CAMPOS_USUARIO, os.path.join(ctx["tmp"], "usuarios.csv"))
+
+
+def op_exportar_csv_facturas(ctx):
+    exportar_csv_facturas(ctx["repo"], os.path.join(ctx["tmp"], "facturas.csv"))
+
+
+def op_generar_pdf_usuarios(ctx):
+    from informes import generar_pdf_usuarios
+    generar_pdf_usuarios(ctx["repo"].usuarios(), os.path.join(ctx["tmp"], "usuarios.pdf"))
+
+
+def op_generar_pdf_facturas(ctx):
+    from informes import generar_pdf_facturas_de
+    generar_pdf_facturas_de(ctx["repo"], os.path.join(ctx["tmp"], "facturas.pdf"))
+
+
+OPERACIONES = {
+    "cargar_datos": op_cargar_datos,
+    "guardar_datos": op_guardar_datos,
+    "registrar_usuarios": op_registrar_usuarios,
+    "emitir_facturas": op_emitir_facturas,
+    "resumen_financiero": op_resumen_financiero,
+    "indice_busqueda": op_indice_busqueda,
+    "buscar_usuarios": op_buscar_usuarios,
+    "ver_estadisticas": op_ver_estadisticas,
+    "exportar_csv_usuarios": op_exportar_csv_usuarios,
+    "exportar_csv_facturas": op_exportar_csv_facturas,
+    "generar_pdf_usuarios": op_generar_pdf_usuarios,
+    "generar_pdf_facturas": op_generar_pdf_facturas,
+}
+
+# Lo que hay que hacer antes de cada ejecución de una operación, fuera de la medida
+PREPARACION = {
+    "guardar_datos": ensuciar_diario,
+}
+
+
+# -------- medición --------
+def medir(nombre, ctx, con_memoria):
+    operacion = OPERACIONES[nombre]
+    preparar = PREPARACION.get(nombre, lambda ctx: None)
+    resultado = {"operacion": nombre}
+    try:
+        preparar(ctx)
+        inicio = time.perf_counter()
+        repeticiones = operacion(ctx)
+        resultado["segundos"] = round(time.perf_counter() - inicio, 6)
+        if repeticiones:
+            resultado["repeticiones"] = repeticiones
+        if con_memoria:
+            preparar(ctx)
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            operacion(ctx)
+            resultado["memoria_pico_mb"] = round((tracemalloc.get_traced_memory()[1] - base) / 1024 / 1024, 3)
+            tracemalloc.stop()
+    except ImportError as e:
+        tracemalloc.stop()
+        resultado["error"] = f"dependencia no disponible: {e.name}"
+    return resultado
+
+
+def memoria_maxima_mb():
+    """Memoria residente máxima del proceso (ru_maxrss está en KB en Linux)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir_tamano(n_facturas, args):
+    n_usuarios = max(1, n_facturas // args.facturas_por_usuario)
+    directorio = tempfile.mkdtemp(prefix=f"bench_crm_{n_facturas}_")
+    try:
+        inicio = time.perf_counter()
+        generar_datos(directorio, n_usuarios, n_facturas, args.semilla)
+        if args.backend == "sqlite":
+            migrar_json_a_sqlite(directorio)
+        else:
+            # Se guarda una vez para medir con la foto de facturas de disco
+            # y no con el facturas.json que escribe el generador
+            repo = abrir_repositorio(directorio, args.backend)
+            repo.guardar()
+            repo.cerrar()
+        if args.particiones:
+            repartir(directorio, args.particiones, args.backend)
+        generacion = time.perf_counter() - inicio
+        ctx = {"directorio": directorio, "backend": args.backend, "tmp": directorio}
+        ctx["repo"] = abrir_repositorio(directorio, args.backend)
+        # buscar_usuarios mide solo las consultas; la construcción del
+        # índice se mide aparte en indice_busqueda
+        if "buscar_usuarios" in args.operaciones:
+            ctx["repo"].indice_busqueda
+        try:
+            resultados = []
+            for nombre in args.operaciones:
+                resultado = medir(nombre, ctx, not args.sin_memoria)
+                resultados.append(resultado)
+                print(f"{n_facturas:>9} facturas | {nombre:<22} | "
+                      + (resultado.get("error") or f"{resultado['segundos']:9.3f} s"), file=sys.stderr)
+        finally:
+            ctx["repo"].cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return {
+        "usuarios": n_usuarios,
+        "facturas": n_facturas,
+        "segundos_generacion": round(generacion, 3),
+        "operaciones": resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las operaciones principales del CRM.")
+    parser.add_argument("tamanos", nargs="*", type=int, default=TAMANOS, help="números de facturas a generar")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--particiones", type=int, default=0, help="repartir los datos en N particiones")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--facturas-por-usuario", type=int, default=FACTURAS_POR_USUARIO)
+    parser.add_argument("--operaciones", type=lambda s: s.split(","), default=list(OPERACIONES),
+                        help="lista separada por comas: " + ", ".join(OPERACIONES))
+    parser.add_argument("--sin-memoria", action="store_true", help="no medir la memoria con tracemalloc")
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args()
+    desconocidas = set(args.operaciones) - set(OPERACIONES)
+    if desconocidas:
+        parser.error(f"operaciones desconocidas: {', '.join(sorted(desconocidas))}")
+
+    informe = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "backend": args.backend,
+        "particiones": args.particiones,
+        "semilla": args.semilla,
+        "resultados": [medir_tamano(n, args) for n in args.tamanos],
+        "memoria_maxima_proceso_mb": memoria_maxima_mb(),
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# ===========================================================
+# BENCHMARK DE INFORMES PDF
+# ===========================================================
+# Mide el tiempo, el tamaño del fichero y la memoria máxima del proceso
+# al generar el listado de facturas en PDF con distintos números de filas.
+# Con más de FILAS_POR_PDF filas el resultado es un ZIP con varios PDF.
+#
+#     python benchmarks/bench_informes.py                 # 10k, 100k y 1M filas
+#     python benchmarks/bench_informes.py 10000 50000
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proyecto"))
+
+from informes import generar_pdf_facturas
+
+TAMANOS = [10_000, 100_000, 1_000_000]
+
+
+def facturas_sinteticas(n):
+    """Genera las facturas una a una, sin tenerlas todas en memoria."""
+    for i in range(n):
+        yield {
+            "cliente": f"Cliente {i % 5000}",
+            "email": f"cliente{i % 5000}@ejemplo.com",
+            "fecha": f"{1 + i % 28:02d}/{1 + i % 12:02d}/2024 10:00",
+            "monto": round(10 + (i * 7.31) % 990, 2),
+        }
+
+
+def memoria_maxima_mb():
+    """Memoria residente máxima del proceso (ru_maxrss está en KB en Linux)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir(n):
+    ruta = os.path.join(tempfile.gettempdir(), f"bench_facturas_{n}.pdf")
+    inicio = time.perf_counter()
+    ruta = generar_pdf_facturas(facturas_sinteticas(n), ruta)
+    segundos = time.perf_counter() - inicio
+    tamano_mb = os.path.getsize(ruta) / 1024 / 1024
+    os.remove(ruta)
+    print(f"{n:>9} filas | {segundos:8.2f} s | {n / segundos:9.0f} filas/s | "
+          f"{tamano_mb:8.1f} MB | memoria máx. {memoria_maxima_mb():8.1f} MB")
+
+
+if __name__ == "__main__":
+    tamanos = [int(n) for n in sys.argv[1:]] or TAMANOS
+    for n in tamanos:
+        medir(n)
@@ -0,0 +1,135 @@
+# ===========================================================
+# BENCHMARK DEL CÁLCULO EN VARIOS PROCESOS
+# ===========================================================
+# Mide el resumen financiero, la exportación CSV de facturas y la
+# preparación de las filas del informe PDF de facturas con 1, 2, 4 y 8
+# procesos (ver paralelo.py) sobre los mismos datos sintéticos, y la
+# aceleración respecto a un solo proceso.
+#
+#     python benchmarks/bench_paralelo.py                       # 5M facturas
+#     python benchmarks/bench_paralelo.py 1000000 --procesos 1,2,4 --salida paralelo.json
+#
+# Con un proceso todo se hace en el proceso principal, como por debajo
+# de CRM_UMBRAL_PARALELO. Cada medida se repite y se queda la mejor; la
+# primera pasada de cada número de procesos (arranque del grupo de
+# procesos e imports) no se cuenta. Las operaciones cuyas dependencias
+# (pandas, fpdf) no estén instaladas se anotan con un error.
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proyecto"))
+
+import paralelo
+from exportacion import exportar_csv_facturas
+from generador import generar_datos, SEMILLA
+from repositorio import abrir_repositorio
+
+FACTURAS = 5_000_000
+FACTURAS_POR_USUARIO = 25
+PROCESOS = [1, 2, 4, 8]
+REPETICIONES = 3
+
+
+# -------- operaciones --------
+def op_resumen_financiero(repo, procesos, tmp):
+    from analitica import MotorAnalitico
+    MotorAnalitico(repo, procesos).resumen_por_usuario()
+
+
+def op_exportar_csv_facturas(repo, procesos, tmp):
+    exportar_csv_facturas(repo, os.path.join(tmp, "facturas.csv"), procesos)
+
+
+def op_filas_pdf_facturas(repo, procesos, tmp):
+    # Solo la preparación de las filas: escribir el PDF es un único documento y no se reparte
+    from informes import filas_de_tramo, filas_facturas
+    if procesos == 1:
+        filas = filas_facturas(repo.facturas())
+    else:
+        tramos = repo.tramos_facturas(paralelo.TAM_TRAMO)
+        filas = itertools.chain.from_iterable(paralelo.en_orden(filas_de_tramo, tramos, procesos=procesos))
+    for _ in filas:
+        pass
+
+
+OPERACIONES = {
+    "resumen_financiero": op_resumen_financiero,
+    "exportar_csv_facturas": op_exportar_csv_facturas,
+    "filas_pdf_facturas": op_filas_pdf_facturas,
+}
+
+
+def medir(operacion, repo, procesos, tmp):
+    operacion(repo, procesos, tmp)  # calentamiento
+    mejor = float("inf")
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        operacion(repo, procesos, tmp)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalado del cálculo en varios procesos.")
+    parser.add_argument("facturas", nargs="?", type=int, default=FACTURAS)
+    parser.add_argument("--procesos", type=lambda s: [int(p) for p in s.split(",")], default=PROCESOS)
+    parser.add_argument("--operaciones", type=lambda s: s.split(","), default=list(OPERACIONES),
+                        help="lista separada por comas: " + ", ".join(OPERACIONES))
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args()
+
+    # Siempre en paralelo con más de un proceso, sea cual sea el tamaño
+    paralelo.UMBRAL_PARALELO = 0
+    directorio = tempfile.mkdtemp(prefix="bench_paralelo_")
+    resultados = []
+    try:
+        generar_datos(directorio, max(1, args.facturas // FACTURAS_POR_USUARIO), args.facturas, SEMILLA)
+        repo = abrir_repositorio(directorio, "json")
+        repo.guardar()
+        for nombre in args.operaciones:
+            base = None
+            for procesos in args.procesos:
+                resultado = {"operacion": nombre, "procesos": procesos}
+                try:
+                    segundos = medir(OPERACIONES[nombre], repo, procesos, directorio)
+                except ImportError as e:
+                    resultado["error"] = f"dependencia no disponible: {e.name}"
+                    resultados.append(resultado)
+                    print(f"{nombre:<22} | {procesos:>2} procesos | {resultado['error']}", file=sys.stderr)
+                    break
+                base = base or segundos
+                resultado.update(segundos=round(segundos, 3), aceleracion=round(base / segundos, 2))
+                resultados.append(resultado)
+                print(f"{nombre:<22} | {procesos:>2} procesos | {segundos:8.3f} s | x{resultado['aceleracion']:.2f}",
+                      file=sys.stderr)
+        repo.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    informe = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+        "facturas": args.facturas,
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# ===========================================================
+# PRUEBA DE CARGA DE LA API HTTP
+# ===========================================================
+# Lanza la API (proyecto/api.py) sobre datos sintéticos en un directorio
+# temporal, o usa una que ya esté en marcha con --url, y la somete
+# durante unos segundos a N conexiones persistentes que hacen peticiones
+# mezcladas: consultas de usuarios y facturas, páginas por clave,
+# revalidaciones con If-None-Match, búsquedas, resumen y altas sueltas y
+# por lotes. Muestra peticiones por segundo y latencias (p50, p95, p99)
+# por operación.
+#
+#     python benchmarks/carga_api.py                                  # 20k usuarios, 200k facturas
+#     python benchmarks/carga_api.py --conexiones 64 --segundos 30 --salida carga.json
+#     python benchmarks/carga_api.py --url http://127.0.0.1:8000      # API ya arrancada
+#
+# Con --url las altas se hacen sobre esos datos. El cliente es asyncio
+# puro (sin dependencias) y corre en un solo proceso: en una máquina con
+# pocos núcleos compite con el servidor por la CPU.
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proyecto"))
+
+from generador import generar_datos, SEMILLA
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+USUARIOS = 20_000
+FACTURAS = 200_000
+CONEXIONES = 32
+SEGUNDOS = 10
+MAX_USUARIOS_MUESTRA = 5000
+TAM_LOTE = 100
+
+# Operación -> peso en la mezcla
+MEZCLA = {
+    "ver_usuario": 25,
+    "facturas_usuario": 20,
+    "pagina_usuarios": 10,
+    "revalidar_pagina": 10,
+    "buscar": 10,
+    "resumen": 5,
+    "alta_factura": 15,
+    "lote_facturas": 5,
+}
+
+
+# -------- cliente HTTP/1.1 --------
+class Conexion:
+    """Conexión persistente con la API; una petición cada vez."""
+
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = self.escritor = None
+
+    async def pedir(self, metodo, ruta, datos=None, cabeceras=None):
+        """(estado, cabeceras, cuerpo) de la respuesta."""
+        if self.escritor is None:
+            self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+        cuerpo = b"" if datos is None else json.dumps(datos).encode("utf-8")
+        lineas = [f"{metodo} {ruta} HTTP/1.1", f"host: {self.host}", f"content-length: {len(cuerpo)}"]
+        if cuerpo:
+            lineas.append("content-type: application/json")
+        lineas += [f"{nombre}: {valor}" for nombre, valor in (cabeceras or {}).items()]
+        self.escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + cuerpo)
+        await self.escritor.drain()
+        estado = int((await self.lector.readline()).split()[1])
+        respuesta = {}
+        while True:
+            linea = await self.lector.readline()
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            respuesta[nombre.strip().lower()] = valor.strip()
+        longitud = int(respuesta.get("content-length", 0))
+        contenido = await self.lector.readexactly(longitud) if longitud else b""
+        if respuesta.get("connection") == "close":
+            self.cerrar()
+        return estado, respuesta, contenido
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.lector = self.escritor = None
+
+
+# -------- operaciones --------
+class Carga:
+    def __init__(self, usuarios, rng):
+        self.usuarios = usuarios
+        self.rng = rng
+        self.etags = {}
+
+    def usuario(self):
+        return self.rng.choice(self.usuarios)
+
+    def factura(self):
+        return {
+            "email": self.usuario()["email"],
+            "descripcion": "Prueba de carga",
+            "monto": round(self.rng.uniform(5, 500), 2),
+            "estado": self.rng.choice(["Pendiente", "Pagada"]),
+        }
+
+    async def ver_usuario(self, conexion):
+        return await conexion.pedir("GET", "/usuarios/" + quote(self.usuario()["email"]))
+
+    async def facturas_usuario(self, conexion):
+        return await conexion.pedir("GET", "/usuarios/" + quote(self.usuario()["email"]) + "/facturas?limite=20")
+
+    async def pagina_usuarios(self, conexion):
+        return await conexion.pedir("GET", f"/usuarios?limite=100&despues={self.usuario()['id']}")
+
+    async def revalidar_pagina(self, conexion):
+        # Siempre las mismas pocas páginas: con los datos sin cambios, la respuesta es un 304
+        ruta = f"/usuarios?limite=100&despues={self.usuarios[self.rng.randrange(10)]['id']}"
+        cabeceras = {"if-none-match": self.etags[ruta]} if ruta in self.etags else None
+        estado, respuesta, cuerpo = await conexion.pedir("GET", ruta, cabeceras=cabeceras)
+        if "etag" in respuesta:
+            self.etags[ruta] = respuesta["etag"]
+        return estado, respuesta, cuerpo
+
+    async def buscar(self, conexion):
+        palabra = self.usuario()["nombre"].split()[0]
+        return await conexion.pedir("GET", "/usuarios/buscar?q=" + quote(palabra))
+
+    async def resumen(self, conexion):
+        return await conexion.pedir("GET", "/resumen")
+
+    async def alta_factura(self, conexion):
+        return await conexion.pedir("POST", "/facturas", self.factura())
+
+    async def lote_facturas(self, conexion):
+        return await conexion.pedir("POST", "/facturas/lote", [self.factura() for _ in range(TAM_LOTE)])
+
+
+async def muestra_usuarios(host, puerto):
+    """Hasta MAX_USUARIOS_MUESTRA usuarios, recorriendo la lista por páginas."""
+    conexion = Conexion(host, puerto)
+    usuarios = []
+    despues = None
+    while len(usuarios) < MAX_USUARIOS_MUESTRA:
+        ruta = "/usuarios?limite=1000" + (f"&despues={despues}" if despues else "")
+        estado, _, cuerpo = await conexion.pedir("GET", ruta)
+        if estado != 200:
+            raise RuntimeError(f"GET {ruta}: {estado} {cuerpo[:200]!r}")
+        pagina = json.loads(cuerpo)
+        usuarios += pagina["datos"]
+        despues = pagina["siguiente"]
+        if not despues:
+            break
+    conexion.cerrar()
+    return usuarios
+
+
+async def trabajador(carga, conexion, pesos, fin, medidas):
+    nombres, valores = zip(*pesos.items())
+    while time.perf_counter() < fin:
+        nombre = carga.rng.choices(nombres, valores)[0]
+        inicio = time.perf_counter()
+        try:
+            estado, _, _ = await getattr(carga, nombre)(conexion)
+            correcta = estado < 400
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            conexion.cerrar()
+            correcta = False
+        medidas[nombre].append((time.perf_counter() - inicio, correcta))
+    conexion.cerrar()
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def resumir(medidas, segundos):
+    resultados = []
+    for nombre, lista in medidas.items():
+        tiempos = sorted(t for t, _ in lista)
+        if not tiempos:
+            continue
+        resultados.append({
+            "operacion": nombre,
+            "peticiones": len(tiempos),
+            "errores": sum(1 for _, correcta in lista if not correcta),
+            "por_segundo": round(len(tiempos) / segundos, 1),
+            "p50_ms": round(percentil(tiempos, 0.50) * 1000, 2),
+            "p95_ms": round(percentil(tiempos, 0.95) * 1000, 2),
+            "p99_ms": round(percentil(tiempos, 0.99) * 1000, 2),
+        })
+    return resultados
+
+
+async def lanzar_carga(host, puerto, conexiones, segundos, semilla):
+    usuarios = await muestra_usuarios(host, puerto)
+    if not usuarios:
+        raise RuntimeError("La API no tiene usuarios con los que probar.")
+    carga = Carga(usuarios, random.Random(semilla))
+    medidas = {nombre: [] for nombre in MEZCLA}
+    fin = time.perf_counter() + segundos
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        trabajador(carga, Conexion(host, puerto), MEZCLA, fin, medidas) for _ in range(conexiones)
+    ))
+    return resumir(medidas, time.perf_counter() - inicio)
+
+
+# -------- servidor local --------
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_servidor(host, puerto, proceso, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError("La API terminó al arrancar.")
+        try:
+            socket.create_connection((host, puerto), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("La API no empezó a escuchar a tiempo.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API HTTP del CRM.")
+    parser.add_argument("--url", help="API ya arrancada (por defecto se lanza una sobre datos sintéticos)")
+    parser.add_argument("--usuarios", type=int, default=USUARIOS)
+    parser.add_argument("--facturas", type=int, default=FACTURAS)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--conexiones", type=int, default=CONEXIONES)
+    parser.add_argument("--segundos", type=float, default=SEGUNDOS)
+    parser.add_argument("--salida", help="fichero JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args()
+
+    directorio = proceso = None
+    try:
+        if args.url:
+            partes = urlsplit(args.url)
+            host, puerto = partes.hostname, partes.port or 80
+        else:
+            directorio = tempfile.mkdtemp(prefix="carga_api_")
+            generar_datos(directorio, args.usuarios, args.facturas, SEMILLA)
+            entorno = dict(os.environ, CRM_BACKEND=args.backend)
+            if args.backend == "sqlite":
+                subprocess.run([sys.executable, os.path.join(RAIZ, "proyecto", "repositorio.py"), directorio],
+                               check=True, env=entorno, stdout=subprocess.DEVNULL)
+            host, puerto = "127.0.0.1", puerto_libre()
+            proceso = subprocess.Popen(
+                [sys.executable, os.path.join(RAIZ, "proyecto", "api.py"), directorio, "--puerto", str(puerto)],
+                env=entorno, stderr=subprocess.DEVNULL,
+            )
+            esperar_servidor(host, puerto, proceso)
+        resultados = asyncio.run(lanzar_carga(host, puerto, args.conexiones, args.segundos, SEMILLA))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    total = sum(r["peticiones"] for r in resultados)
+    for r in resultados:
+        print(f"{r['operacion']:<18} | {r['por_segundo']:8.1f} pet/s | p50 {r['p50_ms']:7.2f} ms | "
+              f"p95 {r['p95_ms']:7.2f} ms | p99 {r['p99_ms']:7.2f} ms | {r['errores']} errores", file=sys.stderr)
+    informe = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+        "url": args.url,
+        "backend": None if args.url else args.backend,
+        "usuarios": None if args.url else args.usuarios,
+        "facturas": None if args.url else args.facturas,
+        "conexiones": args.conexiones,
+        "segundos": args.segundos,
+        "peticiones_por_segundo": round(total / args.segundos, 1),
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# ===========================================================
+# GENERADOR DE DATOS SINTÉTICOS
+# ===========================================================
+# Crea un directorio de datos (usuarios.json y facturas.json) con N
+# usuarios y M facturas de aspecto realista. Con la misma semilla se
+# obtienen siempre los mismos datos, así que los benchmarks son
+# comparables entre ejecuciones.
+#
+# - Pocos clientes concentran muchas facturas (reparto tipo Zipf).
+# - Las fechas cubren los dos años anteriores a FECHA_FIN, con más
+#   facturas recientes, en días laborables y en horario de oficina.
+# - Las facturas antiguas casi siempre están pagadas; las del último mes
+#   suelen estar pendientes.
+# - Los importes siguen una distribución log-normal (muchos pequeños,
+#   pocos grandes).
+#
+#     python benchmarks/generador.py data 1000 10000        # 1k usuarios, 10k facturas
+#     python benchmarks/generador.py /tmp/crm 200000 1000000 7
+
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proyecto"))
+
+from busqueda import normalizar
+from repositorio import USUARIOS_FILE, FACTURAS_FILE
+from secuencias import formatear_id
+from validaciones import SIN_DATO
+
+SEMILLA = 42
+FECHA_FIN = datetime.datetime(2025, 12, 31, 18, 0)
+DIAS_HISTORIA = 730
+
+NOMBRES = [
+    "María", "Carmen", "Ana", "Laura", "Lucía", "Marta", "Sofía", "Paula", "Elena", "Valentina",
+    "Antonio", "José", "Manuel", "Francisco", "David", "Javier", "Daniel", "Carlos", "Miguel", "Pablo",
+]
+APELLIDOS = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez",
+    "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez", "Romero",
+]
+DOMINIOS = ["gmail.com", "hotmail.com", "yahoo.es", "outlook.com", "empresa.es"]
+CALLES = ["Calle Mayor", "Avenida de la Constitución", "Calle Real", "Plaza de España", "Calle del Sol"]
+CIUDADES = ["Madrid", "Barcelona", "Valencia", "Sevilla", "Zaragoza", "Málaga", "Bilbao"]
+DESCRIPCIONES = [
+    "Consultoría", "Mantenimiento mensual", "Licencia anual", "Formación", "Soporte técnico",
+    "Desarrollo a medida", "Auditoría", "Hosting",
+]
+
+
+def generar_usuarios(n, rng):
+    """Usuarios con IDs consecutivos y emails únicos; teléfono y dirección a veces vacíos."""
+    for i in range(1, n + 1):
+        nombre = rng.choice(NOMBRES)
+        apellido1, apellido2 = rng.choice(APELLIDOS), rng.choice(APELLIDOS)
+        usuario_email = normalizar(f"{nombre}.{apellido1}").replace(" ", "")
+        registro = FECHA_FIN - datetime.timedelta(days=rng.randint(DIAS_HISTORIA, 2 * DIAS_HISTORIA))
+        yield {
+            "id": formatear_id("USR", i),
+            "nombre": f"{nombre} {apellido1} {apellido2}",
+            "email": f"{usuario_email}{i}@{rng.choice(DOMINIOS)}",
+            "telefono": f"+34 6{rng.randint(0, 99_999_999):08d}" if rng.random() < 0.8 else SIN_DATO,
+            "direccion": (
+                f"{rng.choice(CALLES)} {rng.randint(1, 200)}, {rng.choice(CIUDADES)}"
+                if rng.random() < 0.7 else SIN_DATO
+            ),
+            "fecha_registro": registro.strftime("%d/%m/%Y"),
+        }
+
+
+def fecha_factura(rng):
+    """Fecha en días laborables y horario de oficina, más probable cuanto más reciente."""
+    dias = int(DIAS_HISTORIA * (1 - rng.random() ** 0.7))
+    fecha = FECHA_FIN - datetime.timedelta(days=dias)
+    while fecha.weekday() >= 5:
+        fecha -= datetime.timedelta(days=1)
+        dias += 1
+    fecha = fecha.replace(hour=rng.randint(8, 19), minute=rng.choice((0, 15, 30, 45)))
+    return fecha, dias
+
+
+def estado_factura(dias, rng):
+    if dias <= 30:
+        pesos = (0.35, 0.60, 0.05)
+    elif dias <= 90:
+        pesos = (0.75, 0.20, 0.05)
+    else:
+        pesos = (0.90, 0.02, 0.08)
+    return rng.choices(("Pagada", "Pendiente", "Cancelada"), pesos)[0]
+
+
+def generar_facturas(m, clientes, rng):
+    """Facturas repartidas entre `clientes` [(email, nombre)] con más peso en los primeros."""
+    acumulados = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(len(clientes))))
+    for i in range(1, m + 1):
+        email, nombre = rng.choices(clientes, cum_weights=acumulados)[0]
+        fecha, dias = fecha_factura(rng)
+        yield {
+            "numero": formatear_id("FAC", i),
+            "fecha": fecha.strftime("%d/%m/%Y %H:%M"),
+            "descripcion": rng.choice(DESCRIPCIONES),
+            "monto": round(max(1.0, rng.lognormvariate(4.5, 0.9)), 2),
+            "estado": estado_factura(dias, rng),
+            "cliente": nombre,
+            "email": email,
+        }
+
+
+def escribir_json_por_partes(ruta, partes, abrir, cerrar):
+    """Escribe un JSON grande trozo a trozo, sin montarlo entero en memoria."""
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(abrir)
+        for i, parte in enumerate(partes):
+            f.write(",\n" if i else "\n")
+            f.write(parte)
+        f.write("\n" + cerrar)
+
+
+def generar_datos(directorio, n_usuarios, n_facturas, semilla=SEMILLA):
+    """Crea en `directorio` los JSON de usuarios y facturas (sin diario ni secuencias)."""
+    if n_facturas and not n_usuarios:
+        raise ValueError("No se pueden generar facturas sin usuarios.")
+    os.makedirs(directorio, exist_ok=True)
+    rng = random.Random(semilla)
+    clientes = []
+
+    def usuarios_json():
+        for usuario in generar_usuarios(n_usuarios, rng):
+            clientes.append((usuario["email"], usuario["nombre"]))
+            yield f"{json.dumps(usuario['email'])}: {json.dumps(usuario, ensure_ascii=False)}"
+
+    escribir_json_por_partes(os.path.join(directorio, USUARIOS_FILE), usuarios_json(), "{", "}")
+    facturas = (json.dumps(f, ensure_ascii=False) for f in generar_facturas(n_facturas, clientes, rng))
+    escribir_json_por_partes(os.path.join(directorio, FACTURAS_FILE), facturas, "[", "]")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.exit("Uso: python benchmarks/generador.py DIRECTORIO USUARIOS FACTURAS [semilla]")
+    directorio, n_usuarios, n_facturas = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+    semilla = int(sys.argv[4]) if len(sys.argv) > 4 else SEMILLA
+    if any(os.path.exists(os.path.join(directorio, f)) for f in ("diario.jsonl", "crm.db", "secuencias.json")):
+        sys.exit(f"{directorio} ya contiene datos de trabajo (diario, base SQLite o secuencias); usa un directorio limpio.")
+    generar_datos(directorio, n_usuarios, n_facturas, semilla)
+    print(f"Generados {n_usuarios} usuarios y {n_facturas} facturas en {directorio} (semilla {semilla})")
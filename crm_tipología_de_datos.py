@@ -5,62 +5,51 @@
 # Se pueden realizar búsquedas, consultar resúmenes financieros
 # y los datos se guardan automáticamente en disco para no perderse.
 
-import datetime
-import re
-import json
 import os
+import sys
+
+# Los módulos compartidos con la app de Streamlit viven en proyecto/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "proyecto"))
+
+import negocio
+from repositorio import abrir_repositorio, UsuarioDuplicado, UsuarioNoEncontrado
+from analitica import MotorAnalitico
+from validaciones import email_valido
+from modelo import Estado
 
 # -----------------------------------------------------------
 # ARCHIVOS DE PERSISTENCIA
 # -----------------------------------------------------------
 # Guardamos los usuarios y facturas en archivos separados (.json)
 # Esto nos permite mantener la información aunque el programa se cierre.
-USUARIOS_FILE = "usuarios.json"
-FACTURAS_FILE = "facturas.json"
+# Cada cambio se añade además a un diario (.jsonl) para no reescribir
+# los archivos completos en cada alta.
+# Con CRM_BACKEND=sqlite los datos se guardan en crm.db en su lugar.
+DATA_DIR = "."
 
 # -----------------------------------------------------------
-# FUNCIONES DE CARGA Y GUARDADO
+# FUNCIONES DE CARGA
 # -----------------------------------------------------------
+# No hace falta guardar a mano: cada alta o baja queda en disco al
+# confirmarse, y al salir se cierra el repositorio (ver menu()).
 def cargar_datos():
-    """Carga los datos desde archivos JSON si existen."""
-    usuarios = {}
-    facturas = []
-    if os.path.exists(USUARIOS_FILE):
-        with open(USUARIOS_FILE, "r", encoding="utf-8") as f:
-            usuarios = json.load(f)
-    if os.path.exists(FACTURAS_FILE):
-        with open(FACTURAS_FILE, "r", encoding="utf-8") as f:
-            facturas = json.load(f)
-    return usuarios, facturas
-
-def guardar_datos(usuarios, facturas):
-    """Guarda los datos en archivos JSON para persistencia."""
-    with open(USUARIOS_FILE, "w", encoding="utf-8") as f:
-        json.dump(usuarios, f, indent=4, ensure_ascii=False)
-    with open(FACTURAS_FILE, "w", encoding="utf-8") as f:
-        json.dump(facturas, f, indent=4, ensure_ascii=False)
+    """Abre el repositorio de datos (JSON o SQLite)."""
+    return abrir_repositorio(DATA_DIR)
 
 # -----------------------------------------------------------
 # VALIDACIONES Y GENERACIÓN DE IDS
 # -----------------------------------------------------------
-def email_valido(email):
-    """Valida formato básico de email."""
-    return re.match(r"[^@]+@[^@]+\.[^@]+", email)
-
-def generar_id_usuario(usuarios):
-    """Genera un ID único para usuario, e.g. USR001"""
-    contador = len(usuarios) + 1
-    return f"USR{contador:03d}"
-
-def generar_id_factura(facturas):
-    """Genera un ID único para factura, e.g. FAC001"""
-    contador = len(facturas) + 1
-    return f"FAC{contador:03d}"
+# email_valido y el resto de reglas viven en proyecto/validaciones.py,
+# compartidas con la app y con la importación masiva.
+# Los IDs (USR001, FAC001...) los asigna el repositorio al dar de alta,
+# dentro de la misma transacción, para que dos procesos no repitan número.
 
 # -----------------------------------------------------------
 # FUNCIONES DE NEGOCIO
 # -----------------------------------------------------------
-def registrar_usuario(usuarios, facturas):
+# Aquí solo se piden y se muestran los datos: las altas, búsquedas y
+# resúmenes están en proyecto/negocio.py, que también usa la API HTTP.
+def registrar_usuario(repo):
     print("=== REGISTRO DE NUEVO USUARIO ===")
     nombre = input("Ingrese nombre: ").strip()
     apellidos = input("Ingrese apellidos: ").strip()
@@ -72,40 +61,41 @@ def registrar_usuario(usuarios, facturas):
     if not email_valido(email):
         print("Error: formato de email inválido.")
         return
-    if email in usuarios:
+    if repo.obtener_usuario(email):
         print("Error: ya existe un usuario con ese email.")
         return
 
     telefono = input("Ingrese teléfono (opcional): ").strip()
     direccion = input("Ingrese dirección (opcional): ").strip()
-    fecha = datetime.date.today().strftime("%d/%m/%Y")
-    nuevo_id = generar_id_usuario(usuarios)
-
-    usuarios[email] = {
-        "id": nuevo_id,
-        "nombre": f"{nombre} {apellidos}",
-        "email": email,
-        "telefono": telefono if telefono else "No especificado",
-        "direccion": direccion if direccion else "No especificado",
-        "fecha_registro": fecha
-    }
 
-    guardar_datos(usuarios, facturas)
-    print(f"Usuario registrado con éxito. ID asignado: {nuevo_id}")
+    try:
+        usuario = negocio.registrar_usuario(repo, {
+            "nombre": nombre,
+            "apellidos": apellidos,
+            "email": email,
+            "telefono": telefono,
+            "direccion": direccion
+        })
+    except negocio.DatosNoValidos as e:
+        print(f"Error: {e}")
+        return
+    except UsuarioDuplicado:
+        print("Error: ya existe un usuario con ese email.")
+        return
+    print(f"Usuario registrado con éxito. ID asignado: {usuario['id']}")
 
-def buscar_usuario(usuarios):
+def buscar_usuario(repo):
     print("=== BUSCAR USUARIO ===")
     opcion = input("1. Buscar por email\n2. Buscar por nombre\nSeleccione opción: ")
     if opcion == "1":
-        email = input("Ingrese email: ").strip().lower()
-        usuario = usuarios.get(email)
-        if usuario:
-            imprimir_usuario(usuario)
-        else:
+        email = input("Ingrese email: ")
+        try:
+            imprimir_usuario(negocio.buscar_por_email(repo, email))
+        except UsuarioNoEncontrado:
             print("Usuario no encontrado.")
     elif opcion == "2":
-        nombre = input("Ingrese nombre: ").strip().lower()
-        encontrados = [u for u in usuarios.values() if nombre in u['nombre'].lower()]
+        nombre = input("Ingrese nombre: ")
+        encontrados = negocio.buscar_por_nombre(repo, nombre)
         if encontrados:
             for u in encontrados:
                 imprimir_usuario(u)
@@ -124,50 +114,41 @@ Dirección: {usuario['direccion']}
 Fecha de registro: {usuario['fecha_registro']}
 """)
 
-def crear_factura(usuarios, facturas):
+def crear_factura(repo):
     print("=== CREAR FACTURA ===")
     email = input("Ingrese email del cliente: ").strip().lower()
-    usuario = usuarios.get(email)
-    if not usuario:
+    if not repo.obtener_usuario(email):
         print("Error: usuario no registrado.")
         return
 
     descripcion = input("Descripción del servicio/producto: ").strip()
-    try:
-        monto = float(input("Monto total (€): "))
-        if monto <= 0:
-            raise ValueError
-    except ValueError:
-        print("Error: monto no válido.")
-        return
+    monto = input("Monto total (€): ")
 
-    estado_opc = {"1": "Pendiente", "2": "Pagada", "3": "Cancelada"}
+    estado_opc = {"1": Estado.PENDIENTE, "2": Estado.PAGADA, "3": Estado.CANCELADA}
     estado = input("Estado (1. Pendiente, 2. Pagada, 3. Cancelada): ").strip()
     estado_final = estado_opc.get(estado)
     if not estado_final:
         print("Estado inválido.")
         return
 
-    fecha = datetime.datetime.now().strftime("%d/%m/%Y %H:%M")
-    numero = generar_id_factura(facturas)
-
-    factura = {
-        "numero": numero,
-        "fecha": fecha,
-        "descripcion": descripcion,
-        "monto": monto,
-        "estado": estado_final,
-        "cliente": usuario['nombre'],
-        "email": email
-    }
-
-    facturas.append(factura)
-    guardar_datos(usuarios, facturas)
-    print(f"Factura {numero} registrada correctamente.")
+    try:
+        factura = negocio.crear_factura(repo, {
+            "descripcion": descripcion,
+            "monto": monto,
+            "estado": estado_final,
+            "email": email
+        })
+    except negocio.DatosNoValidos as e:
+        print(f"Error: {e}")
+        return
+    except UsuarioNoEncontrado:
+        print("Error: usuario no registrado.")
+        return
+    print(f"Factura {factura['numero']} registrada correctamente.")
 
-def listar_usuarios(usuarios):
+def listar_usuarios(repo):
     print("=== TODOS LOS USUARIOS ===")
-    for i, u in enumerate(usuarios.values(), 1):
+    for i, u in enumerate(repo.usuarios(), 1):
         print(f"""Usuario #{i}
 ID: {u['id']}
 Nombre: {u['nombre']}
@@ -176,67 +157,54 @@ Teléfono: {u['telefono']}
 Registro: {u['fecha_registro']}
 """)
 
-def mostrar_facturas_usuario(usuarios, facturas):
-    email = input("Email del usuario: ").strip().lower()
-    usuario = usuarios.get(email)
-    if not usuario:
+def mostrar_facturas_usuario(repo):
+    email = input("Email del usuario: ")
+    try:
+        usuario, user_facts, resumen = negocio.facturas_de_usuario(repo, email)
+    except UsuarioNoEncontrado:
         print("Usuario no encontrado.")
         return
 
-    user_facts = [f for f in facturas if f['email'] == email]
-    total = sum(f['monto'] for f in user_facts)
-    pendientes = sum(f['monto'] for f in user_facts if f['estado'] == "Pendiente")
-
     print(f"Facturas de {usuario['nombre']}:")
     for f in user_facts:
         print(f"""
 Factura: {f['numero']}
 Fecha: {f['fecha']}
 Descripción: {f['descripcion']}
-Monto: €{f['monto']}
-Estado: {f['estado']}
+Monto: €{f.monto}
+Estado: {f.estado}
 """)
-    print(f"Total: €{total} / Pendiente: €{pendientes}")
+    print(f"Total: €{resumen['total']} / Pendiente: €{resumen['pendiente']}")
 
-def resumen_financiero(usuarios, facturas):
+def resumen_financiero(repo):
     print("=== RESUMEN FINANCIERO ===")
-    total_facturas = 0
-    total_ingresos = 0
-    total_recibido = 0
-    total_pendiente = 0
-
-    for email, u in usuarios.items():
-        user_facts = [f for f in facturas if f['email'] == email]
-        total = sum(f['monto'] for f in user_facts)
-        pagadas = sum(f['monto'] for f in user_facts if f['estado'] == "Pagada")
-        pendientes = sum(f['monto'] for f in user_facts if f['estado'] == "Pendiente")
-
+    # El detalle por usuario sale del motor de pandas (ver analitica.py), que
+    # reparte el cálculo entre procesos cuando hay muchas facturas
+    for r in MotorAnalitico(repo).resumen_por_usuario().itertuples(index=False):
         print(f"""
-Usuario: {u['nombre']} ({email})
-- Facturas: {len(user_facts)}
-- Total facturado: €{total}
-- Pagado: €{pagadas}
-- Pendiente: €{pendientes}
+Usuario: {r.nombre} ({r.email})
+- Facturas: {r.facturas}
+- Total facturado: €{r.total}
+- Pagado: €{r.pagado}
+- Pendiente: €{r.pendiente}
 """)
-        total_facturas += len(user_facts)
-        total_ingresos += total
-        total_recibido += pagadas
-        total_pendiente += pendientes
+
+    general = negocio.resumen_general(repo)
 
     print(f"""
 --- RESUMEN GENERAL ---
-Usuarios: {len(usuarios)}
-Facturas emitidas: {total_facturas}
-Ingresos totales: €{total_ingresos}
-Recibido: €{total_recibido}
-Pendiente: €{total_pendiente}
+Usuarios: {general['usuarios']}
+Facturas emitidas: {general['facturas']}
+Ingresos totales: €{general['total']}
+Recibido: €{general['pagado']}
+Pendiente: €{general['pendiente']}
 """)
 
 # -----------------------------------------------------------
 # MENÚ PRINCIPAL
 # -----------------------------------------------------------
 def menu():
-    usuarios, facturas = cargar_datos()
+    repo = cargar_datos()
     while True:
         print("""
 === SISTEMA CRM ===
@@ -250,19 +218,20 @@ def menu():
 """)
         opcion = input("Seleccione una opción: ").strip()
         if opcion == "1":
-            registrar_usuario(usuarios, facturas)
+            registrar_usuario(repo)
         elif opcion == "2":
-            buscar_usuario(usuarios)
+            buscar_usuario(repo)
         elif opcion == "3":
-            crear_factura(usuarios, facturas)
+            crear_factura(repo)
         elif opcion == "4":
-            listar_usuarios(usuarios)
+            listar_usuarios(repo)
         elif opcion == "5":
-            mostrar_facturas_usuario(usuarios, facturas)
+            mostrar_facturas_usuario(repo)
         elif opcion == "6":
-            resumen_financiero(usuarios, facturas)
+            resumen_financiero(repo)
         elif opcion == "7":
             print("Saliendo del sistema...")
+            repo.cerrar()
             break
         else:
             print("Opción inválida.")
@@ -0,0 +1,509 @@
+# ============================================
+# -------- ALMACÉN DE FACTURAS BAJO DEMANDA --------
+# ============================================
+# La foto de las facturas se guarda en un único fichero binario que se
+# abre con mmap: arrancar solo lee la cola del fichero, y cada factura se
+# decodifica cuando de verdad hace falta (una página, un filtro, un
+# recorrido). La memoria ocupada depende de lo que se consulta, no de
+# todo el histórico.
+#
+# Estructura del fichero:
+#
+#     registros   cada factura codificada (JSON + salto de línea, o MessagePack)
+#     posiciones  n+1 enteros de 8 bytes: dónde empieza cada registro
+#     emails      n enteros de 4 bytes: número de email de cada factura
+#     grupos      n enteros de 4 bytes: números de factura agrupados por email
+#     centimos    n enteros de 8 bytes: importe de cada factura
+#     marcas      n enteros de 8 bytes: fecha de cada factura (ver modelo.marca_de_fecha)
+#     estados     n bytes: código de estado de cada factura (posición en modelo.ESTADOS)
+#     tabla       {"emails": [...], "agregados": [[facturas, total, pagado, pendiente], ...],
+#                  "meses": filas de estadisticas.ResumenMensual}
+#                 con los importes en céntimos
+#     cola        ver COLA
+#
+# Los enteros se guardan en little-endian. Las columnas de importes,
+# fechas y estados permiten calcular estadísticas de todas las facturas
+# sin decodificar ninguna (ver FotoFacturas.tabla).
+#
+# Las fotos de la versión anterior (CRMFAC01: sin columnas y con los
+# agregados en euros) se siguen pudiendo leer.
+#
+# Lo que cambia después de la foto (altas y bajas del diario) se guarda en
+# memoria en AlmacenFacturas, encima de la foto, hasta la siguiente
+# compactación.
+
+import collections
+import contextlib
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from estadisticas import ResumenMensual, mes_de_marca
+from indices import IndiceFacturas, en_euros, sumar
+from modelo import CODIGO_ESTADO, Factura, TablaFacturas, centimos, como_factura, tramos_de_lista
+from serializacion import codificar_json, codificar_msgpack, decodificar_json, decodificar_msgpack
+
+MAGIA = b"CRMFAC02"
+# magia, formato (b"j" o b"m"), facturas, y posición de posiciones, emails,
+# grupos, céntimos, marcas, estados y tabla, más el tamaño de la tabla
+COLA = struct.Struct("<8s1s7xQQQQQQQQQ")
+MAGIA_V1 = b"CRMFAC01"
+COLA_V1 = struct.Struct("<8s1s7xQQQQQQ")
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _vista_enteros(vista, inicio, cantidad, tipo):
+    """Enteros little-endian de la foto sin copiarlos (o copiados si la máquina es big-endian)."""
+    tam = array(tipo).itemsize
+    trozo = vista[inicio:inicio + cantidad * tam]
+    if LITTLE_ENDIAN:
+        return trozo.cast(tipo)
+    enteros = array(tipo, trozo.tobytes())
+    enteros.byteswap()
+    return enteros
+
+
+def _bytes_enteros(enteros):
+    if not LITTLE_ENDIAN:
+        enteros = array(enteros.typecode, enteros)
+        enteros.byteswap()
+    return enteros.tobytes()
+
+
+def _codificadores(formato):
+    if formato == "msgpack":
+        return codificar_msgpack, decodificar_msgpack
+    return (lambda datos: codificar_json(datos) + b"\n"), decodificar_json
+
+
+class FotoFacturas:
+    """Facturas de la foto guardada en disco, leídas bajo demanda con mmap.
+
+    `tabla` es la que devuelve escribir_foto_facturas: con ella no hace
+    falta volver a decodificar la tabla de emails que se acaba de escribir.
+    """
+
+    def __init__(self, ruta, tabla=None):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(self._mm)
+        if len(self._mm) >= COLA.size and self._mm[len(self._mm) - COLA.size:][:len(MAGIA)] == MAGIA:
+            (_, formato, total, p_posiciones, p_emails, p_grupos,
+             p_centimos, p_marcas, p_estados, p_tabla, l_tabla) = COLA.unpack_from(self._mm, len(self._mm) - COLA.size)
+            self.columnas = (
+                _vista_enteros(vista, p_centimos, total, "q"),
+                _vista_enteros(vista, p_marcas, total, "q"),
+                vista[p_estados:p_estados + total],
+            )
+        else:
+            magia, formato, total, p_posiciones, p_emails, p_grupos, p_tabla, l_tabla = COLA_V1.unpack_from(
+                self._mm, len(self._mm) - COLA_V1.size
+            )
+            if magia != MAGIA_V1:
+                raise ValueError(f"{ruta} no es una foto de facturas")
+            self.columnas = None
+        self.formato = "msgpack" if formato == b"m" else "json"
+        self.total = total
+        self.fin_registros = p_posiciones
+        self.posiciones = _vista_enteros(vista, p_posiciones, total + 1, "Q")
+        self.email_ids = _vista_enteros(vista, p_emails, total, "I")
+        self.grupos = _vista_enteros(vista, p_grupos, total, "I")
+        self._tabla = (p_tabla, l_tabla)
+        self._decodificar = _codificadores(self.formato)[1]
+        self._emails = self._acumulados = self._numero_email = self._inicios = None
+        self._resumen = self._meses = None
+        if tabla is not None:
+            self._poner_tabla(*tabla)
+
+    # La tabla de emails solo se decodifica la primera vez que se necesita
+    def _cargar_tabla(self):
+        if self._emails is not None:
+            return
+        inicio, largo = self._tabla
+        tabla = self._decodificar(self._mm[inicio:inicio + largo])
+        acumulados = tabla["agregados"]
+        if self.columnas is None:
+            acumulados = [[n, centimos(t), centimos(p), centimos(pe)] for n, t, p, pe in acumulados]
+        self._poner_tabla(tabla["emails"], acumulados, tabla.get("meses"))
+
+    def _poner_tabla(self, emails, acumulados, meses, numero_email=None):
+        inicios, acumulado = [], 0
+        for fila in acumulados:
+            inicios.append(acumulado)
+            acumulado += fila[0]
+        if numero_email is None:
+            numero_email = {email: i for i, email in enumerate(emails)}
+        self._numero_email = numero_email
+        self._meses = meses
+        self._inicios = inicios
+        self._acumulados = acumulados
+        self._emails = emails
+
+    @property
+    def emails(self):
+        self._cargar_tabla()
+        return self._emails
+
+    def numero_email(self, email):
+        self._cargar_tabla()
+        return self._numero_email.get(email)
+
+    def crudo(self, i):
+        return self._mm[self.posiciones[i]:self.posiciones[i + 1]]
+
+    def registro(self, i):
+        return Factura.desde_dict(self._decodificar(self.crudo(i)))
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        decodificar, mm, posiciones, desde_dict = self._decodificar, self._mm, self.posiciones, Factura.desde_dict
+        for i in range(self.total):
+            yield desde_dict(decodificar(mm[posiciones[i]:posiciones[i + 1]]))
+
+    def cantidad(self, email):
+        n = self.numero_email(email)
+        return 0 if n is None else self._acumulados[n][0]
+
+    def facturas_de(self, email, offset=0, limite=None):
+        n = self.numero_email(email)
+        if n is None:
+            return []
+        inicio, cantidad = self._inicios[n], self._acumulados[n][0]
+        fin = cantidad if limite is None else min(cantidad, offset + limite)
+        return [self.registro(self.grupos[inicio + i]) for i in range(offset, fin)]
+
+    def acumulados(self, email):
+        """[facturas, total, pagado, pendiente] del usuario, en céntimos."""
+        n = self.numero_email(email)
+        return [0, 0, 0, 0] if n is None else list(self._acumulados[n])
+
+    def columnas_de(self, email):
+        """(marca, céntimos, código de estado) de cada factura del usuario."""
+        n = self.numero_email(email)
+        if n is None:
+            return
+        inicio, cantidad = self._inicios[n], self._acumulados[n][0]
+        for j in range(inicio, inicio + cantidad):
+            i = self.grupos[j]
+            if self.columnas is None:
+                factura = self.registro(i)
+                yield factura.marca, factura.centimos, CODIGO_ESTADO[factura.estado]
+            else:
+                yield self.columnas[1][i], self.columnas[0][i], self.columnas[2][i]
+
+    def resumen(self):
+        """ResumenMensual de las facturas de la foto (las fotos antiguas sin él se recorren una vez)."""
+        if self._resumen is None:
+            self._cargar_tabla()
+            if self._meses is not None:
+                self._resumen = ResumenMensual.desde_filas(self._meses)
+            else:
+                tabla = self.tabla()
+                self._resumen = ResumenMensual.desde_columnas(tabla.marcas, tabla.centimos, tabla.estados)
+        return self._resumen
+
+    def tabla(self):
+        """TablaFacturas de solo lectura sobre las columnas del fichero."""
+        if self.columnas is None:
+            return TablaFacturas.desde_facturas(self)
+        return TablaFacturas(list(self.emails), self.email_ids, *self.columnas)
+
+
+# ============================================
+# -------- TRAMOS DE LA FOTO --------
+# ============================================
+# Otro proceso lee las facturas de un tramo abriendo la foto por su ruta
+# (ver paralelo.py). Mientras haya tramos de una foto en uso, la
+# compactación de este proceso no la borra.
+
+_fotos_en_uso = collections.Counter()
+_cerrojo_en_uso = threading.Lock()
+
+
+def foto_en_uso(ruta):
+    with _cerrojo_en_uso:
+        return _fotos_en_uso[ruta] > 0
+
+
+class TramoFoto:
+    """Facturas [inicio, fin) de la foto de `ruta`, sin las de los emails de `ocultos`."""
+
+    def __init__(self, ruta, inicio, fin, ocultos=frozenset()):
+        self.ruta = ruta
+        self.inicio = inicio
+        self.fin = fin
+        self.ocultos = ocultos
+
+    def __len__(self):
+        return self.fin - self.inicio
+
+    def _ocultos(self, foto):
+        return {foto.numero_email(email) for email in self.ocultos}
+
+    def facturas(self):
+        foto = FotoFacturas(self.ruta)
+        ocultos = self._ocultos(foto)
+        for i in range(self.inicio, self.fin):
+            if not ocultos or foto.email_ids[i] not in ocultos:
+                yield foto.registro(i)
+
+    def tabla(self):
+        foto = FotoFacturas(self.ruta)
+        if foto.columnas is None:
+            return TablaFacturas.desde_facturas(self.facturas())
+        tramo = slice(self.inicio, self.fin)
+        tabla = TablaFacturas(list(foto.emails), foto.email_ids[tramo], *(columna[tramo] for columna in foto.columnas))
+        return tabla.copia(self._ocultos(foto)) if self.ocultos else tabla
+
+    @contextlib.contextmanager
+    def en_uso(self):
+        with _cerrojo_en_uso:
+            _fotos_en_uso[self.ruta] += 1
+        try:
+            yield
+        finally:
+            with _cerrojo_en_uso:
+                _fotos_en_uso[self.ruta] -= 1
+
+
+class AlmacenFacturas:
+    """Facturas de la foto (si hay) más las altas y bajas posteriores, que se guardan en memoria.
+
+    Dar de baja un email oculta sus facturas de la foto sin tocar el fichero.
+    Los conjuntos y listas se sustituyen en lugar de modificarse para que un
+    recorrido en curso (una exportación en otro hilo) no se rompa.
+    """
+
+    def __init__(self, foto=None, facturas=()):
+        self.foto = foto
+        self.ocultos = frozenset()
+        self._ocultas = 0
+        self.nuevas = list(map(como_factura, facturas))
+        self._indice = IndiceFacturas(self.nuevas)
+        # Cambios sobre el resumen mensual de la foto (las bajas restan)
+        self._cambios = ResumenMensual()
+        for factura in self.nuevas:
+            self._cambios.agregar(factura)
+
+    def __len__(self):
+        return (len(self.foto) if self.foto else 0) - self._ocultas + len(self.nuevas)
+
+    def __iter__(self):
+        # El estado se toma ya, no al pedir el primer elemento
+        return self._recorrer(self.foto, self.ocultos, self.nuevas)
+
+    @staticmethod
+    def _recorrer(foto, ocultos, nuevas):
+        if foto is not None:
+            if not ocultos:
+                yield from foto
+            else:
+                ocultos = {foto.numero_email(email) for email in ocultos}
+                for i in range(foto.total):
+                    if foto.email_ids[i] not in ocultos:
+                        yield foto.registro(i)
+        yield from nuevas
+
+    def instantanea(self):
+        """Copia del estado actual que no cambia con las altas y bajas posteriores."""
+        copia = AlmacenFacturas(self.foto)
+        copia.ocultos, copia._ocultas = self.ocultos, self._ocultas
+        copia.nuevas = list(self.nuevas)
+        copia._indice = IndiceFacturas(copia.nuevas)
+        copia._cambios = ResumenMensual().combinado(self._cambios)
+        return copia
+
+    def _en_foto(self, email):
+        return 0 if self.foto is None or email in self.ocultos else self.foto.cantidad(email)
+
+    def agregar(self, factura):
+        factura = como_factura(factura)
+        self.nuevas.append(factura)
+        self._indice.agregar(factura)
+        self._cambios.agregar(factura)
+
+    def eliminar_email(self, email):
+        en_foto = self._en_foto(email)
+        if en_foto:
+            for marca, importe, codigo in self.foto.columnas_de(email):
+                self._cambios.sumar(mes_de_marca(marca), codigo, importe, -1)
+            self.ocultos = self.ocultos | {email}
+            self._ocultas += en_foto
+        if self._indice.acumulados(email)[0]:
+            for factura in self._indice.facturas_de(email):
+                self._cambios.quitar(factura)
+            self.nuevas = [f for f in self.nuevas if f.email != email]
+            self._indice.eliminar_email(email)
+
+    def facturas_de(self, email, offset=0, limite=None):
+        en_foto = self._en_foto(email)
+        facturas = self.foto.facturas_de(email, offset, limite) if offset < en_foto else []
+        if limite is None or len(facturas) < limite:
+            resto = None if limite is None else limite - len(facturas)
+            facturas += self._indice.facturas_de(email, max(0, offset - en_foto), resto)
+        return facturas
+
+    def agregados(self, email):
+        acumulados = self._indice.acumulados(email)
+        if self._en_foto(email):
+            acumulados = [a + b for a, b in zip(acumulados, self.foto.acumulados(email))]
+        return en_euros(acumulados)
+
+    def resumen(self):
+        """ResumenMensual de todas las facturas: el de la foto más los cambios posteriores."""
+        if self.foto is None:
+            return ResumenMensual().combinado(self._cambios)
+        return self.foto.resumen().combinado(self._cambios)
+
+    def tramos(self, tam):
+        """Las facturas en tramos de `tam` para leerlas desde otros procesos (ver paralelo.py)."""
+        foto, ocultos, nuevas = self.foto, self.ocultos, list(self.nuevas)
+        tramos = []
+        if foto is not None:
+            for inicio in range(0, foto.total, tam):
+                tramos.append(TramoFoto(foto.ruta, inicio, min(inicio + tam, foto.total), ocultos))
+        return tramos + tramos_de_lista(nuevas, tam)
+
+    def tabla(self):
+        """Todas las facturas como TablaFacturas; sin cambios desde la foto, sin copiar nada."""
+        foto, ocultos, nuevas = self.foto, self.ocultos, self.nuevas
+        tabla = foto.tabla() if foto is not None else TablaFacturas()
+        if not ocultos and not nuevas:
+            return tabla
+        if foto is not None:
+            tabla = tabla.copia({foto.numero_email(email) for email in ocultos})
+        for factura in nuevas:
+            tabla.agregar(factura)
+        return tabla
+
+
+# ============================================
+# -------- ESCRITURA DE LA FOTO --------
+# ============================================
+
+# Los índices por email se calculan sin sorted(): ordenar millones de
+# enteros es una sola llamada que no suelta el GIL y frenaría a los demás
+# hilos mientras se guarda en segundo plano.
+def _agrupar(email_ids, cuentas):
+    """Índices de las facturas agrupados por número de email (por conteo, conservando el orden)."""
+    cursores, inicio = [], 0
+    for cuenta in cuentas:
+        cursores.append(inicio)
+        inicio += cuenta
+    grupos = array("I", bytes(4 * len(email_ids)))
+    for i, n in enumerate(email_ids):
+        grupos[cursores[n]] = i
+        cursores[n] += 1
+    return grupos
+
+
+def _agrupar_tras(foto, email_ids):
+    """Como _agrupar cuando las primeras facturas son las de `foto`: intercala las nuevas en sus grupos."""
+    nuevas = {}
+    for i in range(foto.total, len(email_ids)):
+        nuevas.setdefault(email_ids[i], []).append(i)
+    grupos, posicion = array("I"), 0
+    for n in sorted(nuevas):
+        fin = foto._inicios[n] + foto._acumulados[n][0] if n < len(foto._inicios) else foto.total
+        grupos.frombytes(foto.grupos[posicion:fin].tobytes())
+        grupos.extend(nuevas[n])
+        posicion = fin
+    grupos.frombytes(foto.grupos[posicion:].tobytes())
+    return grupos
+
+
+def escribir_foto_facturas(ruta, almacen, formato="json"):
+    """Escribe en `ruta` la foto de todas las facturas del almacén.
+
+    Devuelve los bytes escritos y la tabla de emails ya decodificada, para
+    abrir la foto nueva con FotoFacturas(ruta, tabla).
+
+    Las facturas de la foto anterior se copian sin decodificarlas cuando el
+    formato no cambia; si además no hay bajas, se copian de un solo bloque.
+    """
+    codificar, _ = _codificadores(formato)
+    foto = almacen.foto
+    resumen = almacen.resumen()
+    copia_entera = False
+    emails, numero_email, acumulados = [], {}, []
+    propias = set()     # filas de `acumulados` ya copiadas (las de la foto anterior se comparten)
+    posiciones, email_ids = array("Q", [0]), array("I")
+    importes, marcas, estados = array("q"), array("q"), array("B")
+    tmp = f"{ruta}.tmp"
+    with open(tmp, "wb") as f:
+        if foto is not None and foto.formato == formato and foto.columnas is not None and foto.total:
+            emails = list(foto.emails)
+            numero_email = dict(foto._numero_email)
+            acumulados = list(foto._acumulados)
+            copia_entera = not almacen.ocultos
+            if copia_entera:
+                f.write(memoryview(foto._mm)[:foto.fin_registros])
+                posiciones = array("Q", foto.posiciones.tobytes())
+                email_ids = array("I", foto.email_ids.tobytes())
+                importes = array("q", foto.columnas[0].tobytes())
+                marcas = array("q", foto.columnas[1].tobytes())
+                estados = array("B", foto.columnas[2].tobytes())
+            else:
+                # Los emails dados de baja se quedan en la tabla con todo a cero
+                for email in almacen.ocultos:
+                    acumulados[numero_email[email]] = [0, 0, 0, 0]
+                ocultos = {numero_email[email] for email in almacen.ocultos}
+                for i in range(foto.total):
+                    n = foto.email_ids[i]
+                    if n in ocultos:
+                        continue
+                    crudo = foto.crudo(i)
+                    f.write(crudo)
+                    posiciones.append(posiciones[-1] + len(crudo))
+                    email_ids.append(n)
+                    importes.append(foto.columnas[0][i])
+                    marcas.append(foto.columnas[1][i])
+                    estados.append(foto.columnas[2][i])
+            nuevas = almacen.nuevas
+        else:
+            nuevas = almacen
+
+        for factura in nuevas:
+            crudo = codificar(factura.a_dict())
+            f.write(crudo)
+            posiciones.append(posiciones[-1] + len(crudo))
+            n = numero_email.get(factura.email)
+            if n is None:
+                n = numero_email[factura.email] = len(emails)
+                emails.append(factura.email)
+                acumulados.append([0, 0, 0, 0])
+            email_ids.append(n)
+            importes.append(factura.centimos)
+            marcas.append(factura.marca)
+            estados.append(CODIGO_ESTADO[factura.estado])
+            fila = acumulados[n]
+            if n not in propias:
+                fila = acumulados[n] = list(fila)
+                propias.add(n)
+            sumar(fila, factura)
+
+        total = len(email_ids)
+        if copia_entera:
+            grupos = _agrupar_tras(foto, email_ids)
+        else:
+            grupos = _agrupar(email_ids, [fila[0] for fila in acumulados])
+        secciones = []
+        for columna in (posiciones, email_ids, grupos, importes, marcas, estados):
+            secciones.append(f.tell())
+            f.write(_bytes_enteros(columna))
+        p_tabla = f.tell()
+        meses = resumen.filas()
+        tabla = codificar({"emails": emails, "agregados": acumulados, "meses": meses})
+        f.write(tabla)
+        f.write(COLA.pack(MAGIA, formato[0].encode(), total, *secciones, p_tabla, len(tabla)))
+        f.flush()
+        os.fsync(f.fileno())
+        escritos = f.tell()
+    os.replace(tmp, ruta)
+    return escritos, (emails, acumulados, meses, numero_email)
@@ -0,0 +1,115 @@
+# ============================================
+# -------- MOTOR ANALÍTICO --------
+# ============================================
+# Mantiene las facturas en un DataFrame con tipos fijos (email y estado
+# categóricos, importe en céntimos int64, fecha datetime64) y calcula a
+# partir de él el resumen financiero con operaciones vectorizadas (las
+# estadísticas por mes y estado salen de estadisticas.ResumenMensual).
+# Los importes se suman en céntimos enteros, como en indices.py, y solo
+# el resultado se pasa a euros: sumar euros en float64 arrastra errores
+# de redondeo (10 + 0.2 + 0.1 daría 10.299999999999999).
+# El DataFrame se construye directamente desde las columnas de la
+# TablaFacturas del repositorio (importes en céntimos, fechas ya
+# convertidas a marcas de tiempo), sin recorrer factura a factura.
+# Solo se reconstruye cuando cambia la versión del repositorio. Con los
+# datos repartidos en particiones, cada una calcula su parte en paralelo;
+# con muchas facturas, también se reparte por tramos entre procesos.
+
+import numpy as np
+import pandas as pd
+
+import metricas
+import paralelo
+from modelo import ESTADOS
+
+COLUMNAS_RESUMEN = ["email", "nombre", "facturas", "total", "pagado", "pendiente"]
+IMPORTES = ["total", "pagado", "pendiente"]
+
+
+def marco_facturas(tabla):
+    """Convierte una TablaFacturas en un DataFrame columnar tipado."""
+    return pd.DataFrame({
+        "email": pd.Categorical.from_codes(
+            np.frombuffer(tabla.email_ids, dtype=np.uint32).astype(np.int32), categories=tabla.emails
+        ),
+        "estado": pd.Categorical.from_codes(
+            np.frombuffer(tabla.estados, dtype=np.uint8).astype(np.int8), categories=ESTADOS
+        ),
+        "centimos": np.frombuffer(tabla.centimos, dtype=np.int64),
+        "fecha": pd.to_datetime(np.frombuffer(tabla.marcas, dtype=np.int64), unit="s"),
+    })
+
+
+def agregado_por_email(df):
+    """Facturas e importes total, pagado y pendiente (en céntimos) por email de un marco_facturas, en un solo groupby."""
+    centimos = df["centimos"]
+    agregado = pd.DataFrame({
+        "email": df["email"],
+        "facturas": np.ones(len(df), dtype="int64"),
+        "total": centimos,
+        "pagado": centimos.where(df["estado"] == "Pagada", 0),
+        "pendiente": centimos.where(df["estado"] == "Pendiente", 0),
+    }).groupby("email", observed=True).sum()
+    agregado.index = agregado.index.astype(object)
+    return agregado
+
+
+def agregado_de_tramo(tramo):
+    """agregado_por_email de un tramo de facturas (se ejecuta en otro proceso, ver paralelo.py)."""
+    return agregado_por_email(marco_facturas(tramo.tabla()))
+
+
+class MotorAnalitico:
+    """Resumen financiero de facturación sobre un repositorio.
+
+    Con más de paralelo.UMBRAL_PARALELO facturas, el groupby se hace por
+    tramos en `procesos` procesos (por defecto paralelo.PROCESOS) y aquí
+    solo se suman los parciales.
+    """
+
+    def __init__(self, repo, procesos=None):
+        self.repo = repo
+        self.procesos = procesos
+        self._version = None
+        self._marco = None
+
+    @property
+    def marco(self):
+        if self._version != self.repo.version:
+            with metricas.cronometro("marco_facturas"):
+                self._marco = marco_facturas(self.repo.tabla_facturas())
+            metricas.contar("filas", "marco_facturas", len(self._marco))
+            self._version = self.repo.version
+        return self._marco
+
+    def _agregado(self):
+        total = self.repo.contar_facturas()
+        if not paralelo.en_paralelo(total, self.procesos):
+            return agregado_por_email(self.marco)
+        tramos = self.repo.tramos_facturas(paralelo.tam_tramo(total, self.procesos))
+        parciales = paralelo.repartir(agregado_de_tramo, tramos, procesos=self.procesos)
+        # Un email puede tener facturas en varios tramos
+        return pd.concat(parciales).groupby(level=0).sum()
+
+    @metricas.medido("resumen_financiero")
+    def resumen_por_usuario(self):
+        """Facturas e importes total, pagado y pendiente de cada usuario."""
+        if hasattr(self.repo, "mapear"):
+            # Repositorio particionado: cada partición hace su groupby en su proceso
+            return pd.concat(self.repo.mapear(resumen_financiero_de), ignore_index=True)
+        agregado = self._agregado()
+        usuarios = pd.DataFrame(
+            [(u["email"], u["nombre"]) for u in self.repo.usuarios()],
+            columns=["email", "nombre"],
+        ).set_index("email")
+        resumen = usuarios.join(agregado).fillna(0)
+        resumen["facturas"] = resumen["facturas"].astype("int64")
+        for columna in IMPORTES:
+            resumen[columna] = resumen[columna].astype("int64") / 100
+        metricas.contar("filas", "resumen_financiero", len(resumen))
+        return resumen.reset_index()[COLUMNAS_RESUMEN]
+
+
+def resumen_financiero_de(repo):
+    """Resumen financiero de un repositorio (la parte de una partición en RepositorioParticionado.mapear)."""
+    return MotorAnalitico(repo).resumen_por_usuario()
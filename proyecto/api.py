@@ -0,0 +1,471 @@
+# ============================================
+# -------- API HTTP --------
+# ============================================
+# API JSON sobre las funciones de negocio (ver negocio.py) para
+# integraciones y altas masivas. Es una aplicación ASGI sin dependencias:
+# se sirve con uvicorn si está instalado o, si no, con el servidor asyncio
+# mínimo de este módulo (HTTP/1.1 con conexiones persistentes).
+#
+#     python proyecto/api.py [directorio] [--host 127.0.0.1] [--puerto 8000]
+#     CRM_DATA_DIR=data uvicorn --app-dir proyecto api:app
+#
+# Rutas:
+#   GET  /usuarios?despues=USR000100&limite=100     página de usuarios en orden de id
+#   POST /usuarios                                   alta de un usuario
+#   POST /usuarios/lote                              alta de una lista de usuarios
+#   GET  /usuarios/buscar?q=texto&limite=20          búsqueda por nombre, email, teléfono...
+#   GET  /usuarios/{email}                           un usuario
+#   GET  /usuarios/{email}/facturas?desde=0&limite=100   facturas y resumen del usuario
+#   POST /facturas                                   alta de una factura
+#   POST /facturas/lote                              alta de una lista de facturas
+#   GET  /resumen                                    resumen general
+#   GET  /resumen/usuarios?despues=USR000100&limite=100  resumen de una página de usuarios
+#
+# Los usuarios se paginan por clave (el id del último de la página, ver
+# Repositorio.usuarios_despues): la respuesta trae en "siguiente" el valor
+# de `despues` de la página siguiente, o null en la última. Las facturas
+# de un usuario solo se añaden al final, así que su posición ya es una
+# clave estable.
+#
+# Las respuestas de GET llevan un ETag calculado de su contenido y, si
+# la petición trae If-None-Match con ese valor, se contesta 304 sin cuerpo.
+# Además se guardan en caché por versión de los datos: mientras nadie
+# escriba, repetir una consulta no vuelve al repositorio. Los cambios de
+# otros procesos se incorporan como mucho cada CRM_API_SINCRONIZAR
+# segundos (0.2 por defecto).
+#
+# El repositorio bloquea (disco, cerrojos): cada petición se atiende en
+# un hilo con asyncio.to_thread para no parar el bucle de eventos.
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import http
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, unquote
+
+import metricas
+import negocio
+from repositorio import abrir_repositorio, UsuarioDuplicado, UsuarioNoEncontrado
+from serializacion import codificar_json, decodificar_json
+
+INTERVALO_SINCRONIZAR = float(os.environ.get("CRM_API_SINCRONIZAR", "0.2"))
+LIMITE_PAGINA = 100
+MAX_LIMITE = 1000
+MAX_LOTE = 10000
+MAX_CUERPO = 16 * 1024 * 1024
+MAX_CACHE = 1024
+
+log = logging.getLogger("crm.api")
+
+
+class ErrorPeticion(Exception):
+    """Petición mal formada: se contesta con `estado` y el mensaje."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class Peticion:
+    def __init__(self, metodo, ruta, consulta, cabeceras, cuerpo):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.consulta = consulta
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+
+    def parametro(self, nombre, defecto=None):
+        valores = self.consulta.get(nombre)
+        return valores[0] if valores else defecto
+
+    def entero(self, nombre, defecto, maximo=None):
+        valor = self.parametro(nombre)
+        if valor is None:
+            return defecto
+        try:
+            numero = int(valor)
+        except ValueError:
+            raise ErrorPeticion(400, f"El parámetro {nombre} debe ser un número entero.") from None
+        if numero < 0:
+            raise ErrorPeticion(400, f"El parámetro {nombre} no puede ser negativo.")
+        return min(numero, maximo) if maximo else numero
+
+    def limite(self):
+        return self.entero("limite", LIMITE_PAGINA, MAX_LIMITE) or LIMITE_PAGINA
+
+    def json(self):
+        try:
+            return decodificar_json(self.cuerpo)
+        except ValueError:
+            raise ErrorPeticion(400, "El cuerpo no es JSON válido.") from None
+
+    def objeto(self):
+        datos = self.json()
+        if not isinstance(datos, dict):
+            raise ErrorPeticion(400, "Se esperaba un objeto JSON.")
+        return datos
+
+    def lista(self):
+        datos = self.json()
+        if not isinstance(datos, list) or not all(isinstance(d, dict) for d in datos):
+            raise ErrorPeticion(400, "Se esperaba una lista de objetos JSON.")
+        if len(datos) > MAX_LOTE:
+            raise ErrorPeticion(413, f"Como mucho {MAX_LOTE} elementos por lote.")
+        return datos
+
+
+# ============================================
+# -------- RUTAS --------
+# ============================================
+# Cada ruta recibe el repositorio, la petición y los grupos de la
+# expresión de su ruta, y devuelve (estado HTTP, datos en JSON).
+
+def pagina(registros, limite, clave):
+    """Registros de la página y valor de `despues` para pedir la siguiente."""
+    siguiente = clave(registros[-1]) if len(registros) == limite else None
+    return {"datos": registros, "siguiente": siguiente}
+
+
+def listar_usuarios(repo, peticion):
+    limite = peticion.limite()
+    usuarios = repo.usuarios_despues(peticion.parametro("despues"), limite)
+    return 200, pagina([u.a_dict() for u in usuarios], limite, lambda u: u["id"])
+
+
+def alta_usuario(repo, peticion):
+    return 201, negocio.registrar_usuario(repo, peticion.objeto()).a_dict()
+
+
+def alta_usuarios(repo, peticion):
+    return 200, resultado_lote(negocio.registrar_usuarios(repo, peticion.lista()))
+
+
+def buscar_usuarios(repo, peticion):
+    consulta = peticion.parametro("q", "")
+    limite = peticion.entero("limite", 20, MAX_LIMITE)
+    return 200, {"datos": [u.a_dict() for u in negocio.buscar_por_nombre(repo, consulta, limite)]}
+
+
+def ver_usuario(repo, peticion, email):
+    return 200, negocio.buscar_por_email(repo, email).a_dict()
+
+
+def facturas_usuario(repo, peticion, email):
+    desde = peticion.entero("desde", 0)
+    limite = peticion.limite()
+    usuario, facturas, resumen = negocio.facturas_de_usuario(repo, email, desde, limite)
+    siguiente = desde + len(facturas) if len(facturas) == limite else None
+    return 200, {
+        "usuario": usuario.a_dict(),
+        "resumen": resumen,
+        "datos": [f.a_dict() for f in facturas],
+        "siguiente": siguiente,
+    }
+
+
+def alta_factura(repo, peticion):
+    return 201, negocio.crear_factura(repo, peticion.objeto()).a_dict()
+
+
+def alta_facturas(repo, peticion):
+    return 200, resultado_lote(negocio.crear_facturas(repo, peticion.lista()))
+
+
+def resumen(repo, peticion):
+    return 200, negocio.resumen_general(repo)
+
+
+def resumen_usuarios(repo, peticion):
+    filas, siguiente = negocio.resumen_usuarios(repo, peticion.parametro("despues"), peticion.limite())
+    return 200, {"datos": filas, "siguiente": siguiente}
+
+
+def resultado_lote(resultado):
+    return {
+        "recibidos": resultado.leidas,
+        "creados": resultado.importadas,
+        "rechazos": [{"posicion": posicion, "motivo": motivo} for posicion, motivo in resultado.rechazos],
+    }
+
+
+RUTAS = [
+    ("GET", r"/usuarios", listar_usuarios),
+    ("POST", r"/usuarios", alta_usuario),
+    ("POST", r"/usuarios/lote", alta_usuarios),
+    ("GET", r"/usuarios/buscar", buscar_usuarios),
+    ("GET", r"/usuarios/([^/]+)", ver_usuario),
+    ("GET", r"/usuarios/([^/]+)/facturas", facturas_usuario),
+    ("POST", r"/facturas", alta_factura),
+    ("POST", r"/facturas/lote", alta_facturas),
+    ("GET", r"/resumen", resumen),
+    ("GET", r"/resumen/usuarios", resumen_usuarios),
+]
+_RUTAS = [(metodo, re.compile(patron + "/?"), funcion) for metodo, patron, funcion in RUTAS]
+
+ERRORES = [
+    (negocio.DatosNoValidos, 400),
+    (UsuarioNoEncontrado, 404),
+    (UsuarioDuplicado, 409),
+]
+
+
+def buscar_ruta(metodo, ruta):
+    """(función, argumentos) de la ruta; ErrorPeticion 404 o 405 si no existe."""
+    metodos = []
+    for metodo_ruta, patron, funcion in _RUTAS:
+        encontrada = patron.fullmatch(ruta)
+        if encontrada:
+            if metodo_ruta == metodo:
+                return funcion, encontrada.groups()
+            metodos.append(metodo_ruta)
+    if metodos:
+        raise ErrorPeticion(405, f"Método no permitido: {metodo}.")
+    raise ErrorPeticion(404, f"Ruta no encontrada: {ruta}")
+
+
+# ============================================
+# -------- APLICACIÓN ASGI --------
+# ============================================
+
+def calcular_etag(cuerpo):
+    return '"' + hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + '"'
+
+
+def coincide_etag(cabecera, etag):
+    """Si el If-None-Match recibido incluye el ETag (también como ETag débil W/"...")."""
+    if not cabecera:
+        return False
+    candidatos = [c.strip().removeprefix("W/") for c in cabecera.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
+class ApiCRM:
+    """Aplicación ASGI de la API. Abre el repositorio de `directorio` con la primera petición."""
+
+    def __init__(self, repo=None, directorio=None):
+        self.directorio = directorio or os.environ.get("CRM_DATA_DIR", "data")
+        self._repo = repo
+        self._cerrojo = threading.Lock()
+        self._sincronizado = 0.0
+        self._cache = collections.OrderedDict()   # (ruta, consulta) -> (versión, etag, cuerpo)
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            with self._cerrojo:
+                if self._repo is None:
+                    self._repo = abrir_repositorio(self.directorio)
+        return self._repo
+
+    def cerrar(self):
+        if self._repo is not None:
+            self._repo.cerrar()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            cuerpo = await self._leer_cuerpo(receive)
+            peticion = Peticion(
+                scope["method"], scope["path"], parse_qs(scope.get("query_string", b"").decode("latin-1")),
+                {nombre.decode("latin-1").lower(): valor.decode("latin-1") for nombre, valor in scope["headers"]},
+                cuerpo,
+            )
+            estado, cabeceras, cuerpo = await asyncio.to_thread(self.atender, peticion)
+        except ErrorPeticion as e:
+            estado, cabeceras, cuerpo = e.estado, [], codificar_json({"error": str(e)})
+        except Exception:
+            log.exception("Error atendiendo %s %s", scope["method"], scope["path"])
+            estado, cabeceras, cuerpo = 500, [], codificar_json({"error": "Error interno."})
+        if cuerpo:
+            cabeceras = [(b"content-type", b"application/json"), *cabeceras]
+        await send({"type": "http.response.start", "status": estado, "headers": cabeceras})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                await asyncio.to_thread(self.cerrar)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _leer_cuerpo(receive):
+        partes = []
+        tamano = 0
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                raise ErrorPeticion(400, "Conexión cerrada por el cliente.")
+            parte = mensaje.get("body", b"")
+            tamano += len(parte)
+            if tamano > MAX_CUERPO:
+                raise ErrorPeticion(413, f"El cuerpo no puede pasar de {MAX_CUERPO} bytes.")
+            partes.append(parte)
+            if not mensaje.get("more_body"):
+                return b"".join(partes)
+
+    # -------- atención de una petición (en un hilo) --------
+    def atender(self, peticion):
+        """(estado, cabeceras, cuerpo) de la respuesta a la petición."""
+        funcion, argumentos = buscar_ruta(peticion.metodo, peticion.ruta)
+        repo = self.repo
+        self._sincronizar(repo)
+        if peticion.metodo != "GET":
+            estado, cuerpo = self._ejecutar(funcion, repo, peticion, argumentos)
+            return estado, [], cuerpo
+        clave = (peticion.ruta, tuple(sorted((k, tuple(v)) for k, v in peticion.consulta.items())))
+        version = repo.version
+        with self._cerrojo:
+            guardada = self._cache.get(clave)
+            if guardada is not None:
+                self._cache.move_to_end(clave)
+        if guardada is not None and guardada[0] == version:
+            estado, etag, cuerpo = 200, guardada[1], guardada[2]
+        else:
+            estado, cuerpo = self._ejecutar(funcion, repo, peticion, argumentos)
+            if estado != 200:
+                return estado, [], cuerpo
+            etag = calcular_etag(cuerpo)
+            with self._cerrojo:
+                self._cache[clave] = (version, etag, cuerpo)
+                self._cache.move_to_end(clave)
+                if len(self._cache) > MAX_CACHE:
+                    self._cache.popitem(last=False)
+        cabeceras = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if coincide_etag(peticion.cabeceras.get("if-none-match"), etag):
+            return 304, cabeceras, b""
+        return estado, cabeceras, cuerpo
+
+    def _sincronizar(self, repo):
+        ahora = time.monotonic()
+        if ahora - self._sincronizado >= INTERVALO_SINCRONIZAR:
+            self._sincronizado = ahora
+            repo.sincronizar()
+
+    @staticmethod
+    def _ejecutar(funcion, repo, peticion, argumentos):
+        try:
+            with metricas.cronometro(f"api_{funcion.__name__}"):
+                estado, datos = funcion(repo, peticion, *argumentos)
+        except tuple(tipo for tipo, _ in ERRORES) as e:
+            estado = next(estado for tipo, estado in ERRORES if isinstance(e, tipo))
+            datos = {"error": str(e)}
+        return estado, codificar_json(datos)
+
+
+app = ApiCRM()
+
+
+# ============================================
+# -------- SERVIDOR ASYNCIO --------
+# ============================================
+# Solo lo necesario para servir la app sin instalar nada: peticiones con
+# Content-Length (sin chunked), conexiones persistentes y una petición a
+# la vez por conexión.
+
+async def _atender_conexion(aplicacion, lector, escritor):
+    try:
+        while True:
+            linea = await lector.readline()
+            if not linea:
+                return
+            metodo, objetivo, version = linea.decode("latin-1").split()
+            cabeceras = []
+            while True:
+                linea = await lector.readline()
+                if linea in (b"\r\n", b"\n", b""):
+                    break
+                nombre, _, valor = linea.decode("latin-1").partition(":")
+                cabeceras.append((nombre.strip().lower().encode("latin-1"), valor.strip().encode("latin-1")))
+            valores = dict(cabeceras)
+            if b"chunked" in valores.get(b"transfer-encoding", b""):
+                await _responder(escritor, 411, [], b"")
+                return
+            longitud = int(valores.get(b"content-length", b"0"))
+            cuerpo = await lector.readexactly(longitud) if longitud else b""
+            ruta, _, consulta = objetivo.partition("?")
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": version[5:],
+                "method": metodo, "scheme": "http", "path": unquote(ruta), "raw_path": ruta.encode("latin-1"),
+                "query_string": consulta.encode("latin-1"), "root_path": "", "headers": cabeceras,
+            }
+            respuesta = {}
+            partes = []
+
+            async def receive():
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+            async def send(mensaje):
+                if mensaje["type"] == "http.response.start":
+                    respuesta.update(mensaje)
+                else:
+                    partes.append(mensaje.get("body", b""))
+
+            await aplicacion(scope, receive, send)
+            cerrar = version == "HTTP/1.0" or valores.get(b"connection", b"").lower() == b"close"
+            await _responder(escritor, respuesta["status"], respuesta.get("headers", []), b"".join(partes), cerrar)
+            if cerrar:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        escritor.close()
+
+
+async def _responder(escritor, estado, cabeceras, cuerpo, cerrar=True):
+    lineas = [f"HTTP/1.1 {estado} {http.HTTPStatus(estado).phrase}".encode("latin-1")]
+    lineas += [nombre + b": " + valor for nombre, valor in cabeceras]
+    lineas.append(b"content-length: %d" % len(cuerpo))
+    if cerrar:
+        lineas.append(b"connection: close")
+    escritor.write(b"\r\n".join(lineas) + b"\r\n\r\n" + cuerpo)
+    await escritor.drain()
+
+
+async def servir(aplicacion, host="127.0.0.1", puerto=8000, preparado=None):
+    """Sirve la aplicación ASGI hasta que se cancele; `preparado()` se llama al empezar a escuchar."""
+    servidor = await asyncio.start_server(
+        lambda lector, escritor: _atender_conexion(aplicacion, lector, escritor), host, puerto,
+    )
+    if preparado:
+        preparado()
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        await asyncio.to_thread(aplicacion.cerrar)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API HTTP del CRM.")
+    parser.add_argument("directorio", nargs="?", default=os.environ.get("CRM_DATA_DIR", "data"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    args = parser.parse_args()
+    app = ApiCRM(directorio=args.directorio)
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if uvicorn is not None:
+        uvicorn.run(app, host=args.host, port=args.puerto, log_level="warning")
+    else:
+        print(f"API del CRM en http://{args.host}:{args.puerto}", file=sys.stderr, flush=True)
+        try:
+            asyncio.run(servir(app, args.host, args.puerto))
+        except KeyboardInterrupt:
+            pass
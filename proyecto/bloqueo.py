@@ -0,0 +1,44 @@
+# ============================================
+# -------- BLOQUEO ENTRE PROCESOS --------
+# ============================================
+# Bloqueo exclusivo a nivel de sistema operativo sobre un fichero auxiliar,
+# para que varias instancias de la app (o la app y el CRM por consola)
+# no escriban a la vez en los mismos ficheros de datos.
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class BloqueoArchivo:
+    """Context manager que mantiene un bloqueo exclusivo sobre `ruta`."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._f = None
+
+    def adquirir(self):
+        self._f = open(self.ruta, "a+b")
+        if fcntl:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        else:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def liberar(self):
+        if fcntl:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        else:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
@@ -0,0 +1,123 @@
+# ============================================
+# -------- ÍNDICE DE BÚSQUEDA DE USUARIOS --------
+# ============================================
+# Índice invertido de palabras (sin tildes y en minúsculas) sacadas del
+# nombre, email, teléfono y dirección de cada usuario. Una búsqueda solo
+# mira las palabras que empiezan por lo que se ha escrito, en lugar de
+# recorrer todos los usuarios.
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+CAMPOS_BUSQUEDA = ["nombre", "email", "telefono", "direccion"]
+SIN_DATO = "No especificado"
+MAX_EXPANSION = 1000
+LIMITE_RESULTADOS = 20
+DIGITOS_TELEFONO = 9
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: "José Pérez" -> "jose perez"."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return re.findall(r"[a-z0-9]+", normalizar(texto))
+
+
+def tokens_usuario(usuario):
+    """Palabras por las que se puede encontrar a un usuario."""
+    tokens = set()
+    for campo in CAMPOS_BUSQUEDA:
+        valor = usuario.get(campo) or ""
+        if valor == SIN_DATO:
+            continue
+        tokens.update(tokenizar(valor))
+    # El teléfono también se indexa con todos los dígitos seguidos, con y
+    # sin prefijo internacional
+    digitos = re.sub(r"\D", "", usuario.get("telefono") or "")
+    if digitos:
+        tokens.add(digitos)
+        tokens.add(digitos[-DIGITOS_TELEFONO:])
+    return tokens
+
+
+class IndiceBusqueda:
+    """Índice invertido palabra -> emails con búsqueda por prefijo."""
+
+    def __init__(self, usuarios=()):
+        self._emails_por_token = {}
+        self._tokens_por_email = {}
+        for usuario in usuarios:
+            self._indexar(usuario)
+        # En la carga inicial el vocabulario se ordena una sola vez al final
+        self._vocabulario = sorted(self._emails_por_token)
+
+    def _indexar(self, usuario):
+        """Añade el usuario al índice y devuelve las palabras que no existían."""
+        email = usuario["email"]
+        tokens = tokens_usuario(usuario)
+        self._tokens_por_email[email] = tokens
+        nuevos = []
+        for token in tokens:
+            emails = self._emails_por_token.get(token)
+            if emails is None:
+                emails = self._emails_por_token[token] = set()
+                nuevos.append(token)
+            emails.add(email)
+        return nuevos
+
+    def agregar(self, usuario):
+        self.eliminar(usuario["email"])
+        for token in self._indexar(usuario):
+            insort(self._vocabulario, token)
+
+    def eliminar(self, email):
+        for token in self._tokens_por_email.pop(email, ()):
+            emails = self._emails_por_token[token]
+            emails.discard(email)
+            if not emails:
+                del self._emails_por_token[token]
+                del self._vocabulario[bisect_left(self._vocabulario, token)]
+
+    def _coincidencias(self, prefijo):
+        """Emails con alguna palabra que empieza por `prefijo`: 2 puntos si es exacta, 1 si no."""
+        puntos = {}
+        i = bisect_left(self._vocabulario, prefijo)
+        fin = min(len(self._vocabulario), i + MAX_EXPANSION)
+        while i < fin and self._vocabulario[i].startswith(prefijo):
+            token = self._vocabulario[i]
+            valor = 2 if token == prefijo else 1
+            for email in self._emails_por_token[token]:
+                if puntos.get(email, 0) < valor:
+                    puntos[email] = valor
+            i += 1
+        return puntos
+
+    def buscar(self, consulta, limite=LIMITE_RESULTADOS):
+        """Emails que contienen todas las palabras de la consulta, de más a menos relevante."""
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+        coincidencias = sorted((self._coincidencias(t) for t in set(tokens)), key=len)
+        puntos = dict(coincidencias[0])
+        for otra in coincidencias[1:]:
+            puntos = {email: p + otra[email] for email, p in puntos.items() if email in otra}
+            if not puntos:
+                return []
+        return heapq.nsmallest(limite, puntos, key=lambda email: (-puntos[email], email))
+
+    def autocompletar(self, prefijo, limite=10):
+        """Palabras del índice que empiezan por `prefijo`, para sugerir al escribir."""
+        prefijo = normalizar(prefijo).strip()
+        if not prefijo:
+            return []
+        i = bisect_left(self._vocabulario, prefijo)
+        sugerencias = []
+        while i < len(self._vocabulario) and len(sugerencias) < limite and self._vocabulario[i].startswith(prefijo):
+            sugerencias.append(self._vocabulario[i])
+            i += 1
+        return sugerencias
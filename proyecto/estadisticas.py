@@ -0,0 +1,165 @@
+# ============================================
+# -------- ESTADÍSTICAS MENSUALES MATERIALIZADAS --------
+# ============================================
+# Número de facturas, suma de importes y suma de sus cuadrados por mes y
+# estado. Se mantienen al dar de alta o de baja facturas (también en la
+# baja en cascada de un usuario) y se guardan junto a los datos, así que
+# "Ver Estadísticas" no recorre las facturas: cualquier filtro de meses y
+# estados cuesta lo que el número de meses que abarca.
+#
+# Con la suma de cuadrados se obtienen la media y la varianza de los
+# importes sin volver a las facturas. Los importes van en céntimos.
+
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from modelo import CODIGO_ESTADO, ESTADOS, Estado
+
+
+def indice_mes(anio, mes):
+    return anio * 12 + mes - 1
+
+
+def mes_de_indice(indice):
+    """(año, mes) de un índice de mes."""
+    return indice // 12, indice % 12 + 1
+
+
+def mes_de_fecha(fecha):
+    """Índice de mes de una fecha "dd/mm/YYYY HH:MM"."""
+    return int(fecha[6:10]) * 12 + int(fecha[3:5]) - 1
+
+
+def mes_de_marca(marca):
+    tiempo = time.gmtime(marca)
+    return tiempo.tm_year * 12 + tiempo.tm_mon - 1
+
+
+class ResumenMensual:
+    """[facturas, céntimos, céntimos²] por mes y estado.
+
+    Los meses se indican como (año, mes); `desde` y `hasta` son inclusivos
+    y None significa sin límite.
+    """
+
+    def __init__(self):
+        self._celdas = {}   # índice de mes -> una fila [facturas, céntimos, céntimos²] por estado
+        self._meses = []    # índices de mes ordenados
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """A partir de las filas [mes, código de estado, facturas, céntimos, céntimos²] de filas()."""
+        resumen = cls()
+        for mes, codigo, facturas, importe, cuadrados in filas:
+            celda = resumen._celda(mes)[codigo]
+            celda[0] += facturas
+            celda[1] += importe
+            celda[2] += cuadrados
+        return resumen
+
+    @classmethod
+    def desde_columnas(cls, marcas, centimos, estados):
+        """A partir de las columnas de una TablaFacturas (un recorrido completo)."""
+        resumen, meses_por_dia = cls(), {}
+        for marca, importe, codigo in zip(marcas, centimos, estados):
+            dia = marca // 86400
+            mes = meses_por_dia.get(dia)
+            if mes is None:
+                mes = meses_por_dia[dia] = mes_de_marca(marca)
+            resumen.sumar(mes, codigo, importe)
+        return resumen
+
+    def filas(self):
+        # Con cambios, una celda puede quedarse sin facturas netas y aun así
+        # tener importe (p. ej. una baja de 10 € y un alta de 25 € en el mismo
+        # mes y estado): solo se omiten las que están enteras a cero
+        return [
+            [mes, codigo, *celda]
+            for mes in self._meses
+            for codigo, celda in enumerate(self._celdas[mes])
+            if any(celda)
+        ]
+
+    def _celda(self, mes):
+        celda = self._celdas.get(mes)
+        if celda is None:
+            celda = self._celdas[mes] = [[0, 0, 0] for _ in ESTADOS]
+            insort(self._meses, mes)
+        return celda
+
+    # -------- mantenimiento --------
+    def sumar(self, mes, codigo, centimos, signo=1):
+        celda = self._celda(mes)[codigo]
+        celda[0] += signo
+        celda[1] += signo * centimos
+        celda[2] += signo * centimos * centimos
+
+    def agregar(self, factura):
+        self.sumar(mes_de_fecha(factura.fecha), CODIGO_ESTADO[factura.estado], factura.centimos)
+
+    def quitar(self, factura):
+        self.sumar(mes_de_fecha(factura.fecha), CODIGO_ESTADO[factura.estado], factura.centimos, -1)
+
+    def combinado(self, otro):
+        """Nuevo resumen con la suma de este y `otro` (que puede tener cantidades negativas)."""
+        resumen = ResumenMensual.desde_filas(self.filas())
+        for fila in otro.filas():
+            mes, codigo, *valores = fila
+            celda = resumen._celda(mes)[codigo]
+            for i, valor in enumerate(valores):
+                celda[i] += valor
+        return resumen
+
+    # -------- consultas --------
+    def _rango(self, desde, hasta):
+        inicio = 0 if desde is None else bisect_left(self._meses, indice_mes(*desde))
+        fin = len(self._meses) if hasta is None else bisect_right(self._meses, indice_mes(*hasta))
+        return self._meses[inicio:fin]
+
+    @staticmethod
+    def _codigos(estados):
+        return range(len(ESTADOS)) if estados is None else sorted(CODIGO_ESTADO[e] for e in estados)
+
+    def lista_meses(self):
+        """(año, mes) de los meses con alguna factura."""
+        return [mes_de_indice(mes) for mes in self._meses if any(c[0] for c in self._celdas[mes])]
+
+    def meses(self, desde=None, hasta=None, estados=None):
+        """[((año, mes), facturas, importe en euros)] de cada mes con facturas."""
+        codigos = self._codigos(estados)
+        resultado = []
+        for mes in self._rango(desde, hasta):
+            celdas = self._celdas[mes]
+            facturas = sum(celdas[c][0] for c in codigos)
+            if facturas:
+                resultado.append((mes_de_indice(mes), facturas, sum(celdas[c][1] for c in codigos) / 100))
+        return resultado
+
+    def por_estado(self, desde=None, hasta=None):
+        """{Estado: (facturas, importe en euros)} de todos los estados."""
+        totales = [[0, 0] for _ in ESTADOS]
+        for mes in self._rango(desde, hasta):
+            for total, celda in zip(totales, self._celdas[mes]):
+                total[0] += celda[0]
+                total[1] += celda[1]
+        return {estado: (facturas, importe / 100) for estado, (facturas, importe) in zip(Estado, totales)}
+
+    def totales(self, desde=None, hasta=None, estados=None):
+        """Facturas, importe, importe medio y varianza del importe (en euros)."""
+        codigos = self._codigos(estados)
+        facturas = importe = cuadrados = 0
+        for mes in self._rango(desde, hasta):
+            celdas = self._celdas[mes]
+            for c in codigos:
+                facturas += celdas[c][0]
+                importe += celdas[c][1]
+                cuadrados += celdas[c][2]
+        if not facturas:
+            return {"facturas": 0, "importe": 0.0, "media": 0.0, "varianza": 0.0}
+        # En enteros, la varianza no pierde precisión al restar dos cantidades grandes
+        return {
+            "facturas": facturas,
+            "importe": importe / 100,
+            "media": importe / facturas / 100,
+            "varianza": (cuadrados * facturas - importe * importe) / (facturas * facturas) / 10000,
+        }
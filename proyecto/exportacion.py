@@ -0,0 +1,111 @@
+# ============================================
+# -------- EXPORTACIÓN POR BLOQUES --------
+# ============================================
+# El CSV se genera fila a fila y se escribe en disco por bloques, sin
+# construir antes un DataFrame ni una cadena con todo el contenido.
+# Con muchas facturas, cada tramo se convierte a CSV en otro proceso y
+# aquí solo se escriben los trozos en orden (ver paralelo.py).
+
+import atexit
+import csv
+import glob
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+
+import metricas
+import paralelo
+from modelo import CAMPOS_FACTURA
+
+FILAS_POR_BLOQUE = 10000
+
+_directorio = None
+_cerrojo = threading.Lock()
+
+
+def csv_en_bloques(registros, campos, filas_por_bloque=FILAS_POR_BLOQUE, cabecera=True):
+    """Genera el CSV de los registros como trozos de texto de `filas_por_bloque` filas."""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos, extrasaction="ignore", lineterminator="\n")
+    if cabecera:
+        escritor.writeheader()
+    filas = total = 0
+    for registro in registros:
+        escritor.writerow(registro)
+        filas += 1
+        total += 1
+        if filas == filas_por_bloque:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            filas = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+    metricas.contar("filas", "exportar_csv", total)
+
+
+def _escribir_csv(bloques, ruta):
+    tmp = f"{ruta}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        for bloque in bloques:
+            f.write(bloque)
+    os.replace(tmp, ruta)
+    if metricas.ACTIVO:
+        metricas.contar("bytes_escritos", "exportar_csv", os.path.getsize(ruta))
+    return ruta
+
+
+@metricas.medido("exportar_csv")
+def exportar_csv(registros, campos, ruta):
+    """Escribe el CSV en `ruta` bloque a bloque y devuelve la ruta."""
+    return _escribir_csv(csv_en_bloques(registros, campos), ruta)
+
+
+def csv_de_tramo(tramo, campos):
+    """CSV sin cabecera de las facturas de un tramo (se ejecuta en otro proceso)."""
+    return "".join(csv_en_bloques(tramo.facturas(), campos, cabecera=False))
+
+
+@metricas.medido("exportar_csv")
+def exportar_csv_facturas(repo, ruta, procesos=None):
+    """CSV de todas las facturas del repositorio, repartido entre procesos si son muchas."""
+    if not paralelo.en_paralelo(repo.contar_facturas(), procesos):
+        return _escribir_csv(csv_en_bloques(repo.facturas(), CAMPOS_FACTURA), ruta)
+    tramos = repo.tramos_facturas(paralelo.TAM_TRAMO)
+    metricas.contar("filas", "exportar_csv", repo.contar_facturas())
+    cabecera = next(csv_en_bloques((), CAMPOS_FACTURA))
+    trozos = paralelo.en_orden(csv_de_tramo, tramos, CAMPOS_FACTURA, procesos=procesos)
+    return _escribir_csv(itertools.chain([cabecera], trozos), ruta)
+
+
+def directorio_exportaciones():
+    """Directorio temporal propio de este proceso, creado la primera vez y borrado al salir.
+
+    Lo crea mkdtemp (solo accesible para el usuario), así que otras
+    instancias de la app no pueden servir ni borrar estas exportaciones.
+    """
+    global _directorio
+    with _cerrojo:
+        if _directorio is None:
+            _directorio = tempfile.mkdtemp(prefix="crm_exportaciones_")
+            atexit.register(shutil.rmtree, _directorio, ignore_errors=True)
+        return _directorio
+
+
+def ruta_exportacion(nombre, version, extension):
+    """Ruta del fichero exportado para una versión de los datos.
+
+    Borra las exportaciones de versiones anteriores del mismo fichero.
+    """
+    directorio = directorio_exportaciones()
+    ruta = os.path.join(directorio, f"{nombre}_{version}.{extension}")
+    for vieja in glob.glob(os.path.join(directorio, f"{nombre}_*.{extension}")):
+        if vieja != ruta:
+            try:
+                os.remove(vieja)
+            except OSError:
+                pass
+    return ruta
@@ -0,0 +1,107 @@
+# ============================================
+# -------- GUARDADO EN SEGUNDO PLANO --------
+# ============================================
+# Cada alta o baja ya queda en disco al añadirse al diario (una línea con
+# fsync), así que lo único caro de guardar es compactar el diario en la
+# foto completa. Esa compactación la hace un hilo propio: quien escribe
+# solo la pide y sigue, y las peticiones que llegan seguidas (una
+# importación, varias sesiones dando altas a la vez) se agrupan en una
+# sola compactación.
+#
+# El hilo espera `ventana` segundos sin peticiones nuevas antes de
+# empezar, pero nunca más de `espera_maxima` desde la primera. vaciar()
+# hace ya lo pendiente y espera a que termine; detener() además para el
+# hilo (al cerrar el repositorio).
+
+import logging
+import threading
+import time
+
+import metricas
+
+VENTANA = 0.5
+ESPERA_MAXIMA = 5.0
+
+log = logging.getLogger("crm.guardado")
+
+
+class GuardadoEnSegundoPlano:
+    """Ejecuta `guardar` en un hilo propio, agrupando las peticiones que llegan juntas."""
+
+    def __init__(self, guardar, ventana=VENTANA, espera_maxima=ESPERA_MAXIMA):
+        self._guardar = guardar
+        self.ventana = ventana
+        self.espera_maxima = espera_maxima
+        self._condicion = threading.Condition()
+        self._pendientes = 0        # peticiones aún sin atender (profundidad de la cola)
+        self._primera = self._ultima = 0.0
+        self._en_curso = False
+        self._ya = False            # vaciar() pide no esperar a la ventana
+        self._parar = False
+        self._hilo = threading.Thread(target=self._bucle, name="guardado", daemon=True)
+        self._hilo.start()
+
+    @property
+    def pendientes(self):
+        return self._pendientes
+
+    def pedir(self):
+        """Pide una compactación; vuelve enseguida."""
+        with self._condicion:
+            ahora = time.monotonic()
+            if not self._pendientes:
+                self._primera = ahora
+            self._ultima = ahora
+            self._pendientes += 1
+            metricas.nivel("cola_guardado", self._pendientes)
+            self._condicion.notify_all()
+
+    def _esperar_ventana(self):
+        while not (self._ya or self._parar):
+            limite = min(self._ultima + self.ventana, self._primera + self.espera_maxima)
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return
+            self._condicion.wait(restante)
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while not self._pendientes and not self._parar:
+                    self._condicion.wait()
+                if not self._pendientes:
+                    return
+                self._esperar_ventana()
+                agrupadas = self._pendientes
+                self._pendientes = 0
+                self._ya = False
+                self._en_curso = True
+                metricas.nivel("cola_guardado", 0)
+            try:
+                with metricas.cronometro("guardado_segundo_plano"):
+                    self._guardar()
+                metricas.nivel("peticiones_agrupadas", agrupadas)
+            except Exception:
+                # El diario sigue teniendo los cambios: se reintentará en la siguiente petición
+                log.exception("Error al guardar en segundo plano")
+            finally:
+                with self._condicion:
+                    self._en_curso = False
+                    self._condicion.notify_all()
+
+    def vaciar(self, timeout=None):
+        """Hace ya la compactación pendiente y espera a que termine; False si se agota `timeout`."""
+        with self._condicion:
+            if self._pendientes:
+                self._ya = True
+                self._condicion.notify_all()
+            return self._condicion.wait_for(
+                lambda: not self._hilo.is_alive() or (not self._pendientes and not self._en_curso), timeout
+            )
+
+    def detener(self):
+        """Termina lo pendiente y para el hilo."""
+        with self._condicion:
+            self._parar = True
+            self._condicion.notify_all()
+        self._hilo.join()
@@ -0,0 +1,190 @@
+# ============================================
+# -------- IMPORTACIÓN MASIVA --------
+# ============================================
+# Carga usuarios o facturas desde CSV o JSON-lines sin pasar registro a
+# registro por los formularios. El fichero se lee en streaming y se
+# procesa por lotes: cada lote se valida con las mismas reglas que los
+# formularios, se da de alta en una sola transacción y al terminar se
+# guarda la copia completa una única vez.
+#
+#     python proyecto/importacion.py usuarios clientes.csv [directorio] [filas_por_lote]
+#
+# Columnas de usuarios: nombre, apellidos, email y, opcionales, telefono,
+# direccion y fecha_registro (dd/mm/YYYY).
+# Columnas de facturas: email, monto, estado y, opcionales, descripcion y
+# fecha (dd/mm/YYYY HH:MM). El cliente debe existir ya.
+
+import csv
+import itertools
+import os
+import sys
+import time
+
+import metricas
+from repositorio import abrir_repositorio, PREFIJO_USUARIO, PREFIJO_FACTURA
+from serializacion import decodificar_json
+from validaciones import validar_usuario, validar_factura
+
+TAM_LOTE = 5000
+TIPOS = ["usuarios", "facturas"]
+
+
+class ResultadoImportacion:
+    """Filas leídas e importadas, rechazos (línea, motivo) y tiempo empleado."""
+
+    def __init__(self):
+        self.leidas = 0
+        self.importadas = 0
+        self.rechazos = []
+        self.segundos = 0.0
+
+    @property
+    def filas_por_segundo(self):
+        return self.leidas / self.segundos if self.segundos else 0.0
+
+
+# -------- lectura --------
+def detectar_formato(nombre):
+    """"csv" o "jsonl" según la extensión del fichero."""
+    extension = os.path.splitext(nombre)[1].lower()
+    return "jsonl" if extension in (".jsonl", ".ndjson", ".json") else "csv"
+
+
+def leer_filas(fichero, formato):
+    """Recorre un fichero de texto abierto y devuelve pares (número de línea, fila).
+
+    Las líneas JSON ilegibles se devuelven con fila None para que cuenten
+    como rechazo en lugar de parar la importación.
+    """
+    if formato == "csv":
+        lector = csv.DictReader(fichero)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+    for numero, linea in enumerate(fichero, 1):
+        if not linea.strip():
+            continue
+        try:
+            fila = decodificar_json(linea)
+        except ValueError:
+            fila = None
+        yield numero, fila if isinstance(fila, dict) else None
+
+
+def lotes(filas, tamano):
+    iterador = iter(filas)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+# -------- alta por lotes --------
+# Los IDs se reservan de una vez antes de abrir la transacción (ver
+# Repositorio.crear_usuario); los de filas que luego se rechazan por
+# duplicadas solo dejan huecos en la numeración.
+def _alta_usuarios(repo, validas, resultado):
+    ids = repo.ids.reservar(PREFIJO_USUARIO, len(validas))
+    nuevos = []
+    with repo.transaccion():
+        existentes = repo.obtener_usuarios([datos["email"] for _, datos in validas])
+        vistos = set()
+        for (linea, datos), id_usuario in zip(validas, ids):
+            email = datos["email"]
+            if email in existentes or email in vistos:
+                resultado.rechazos.append((linea, f"Ya existe un usuario con el email {email}."))
+                continue
+            vistos.add(email)
+            nuevos.append({"id": id_usuario, **datos})
+        repo.agregar_lote(usuarios=nuevos)
+    return len(nuevos)
+
+
+def _alta_facturas(repo, validas, resultado):
+    numeros = repo.ids.reservar(PREFIJO_FACTURA, len(validas))
+    nuevas = []
+    with repo.transaccion():
+        clientes = repo.obtener_usuarios({datos["email"] for _, datos in validas})
+        for (linea, datos), numero in zip(validas, numeros):
+            cliente = clientes.get(datos["email"])
+            if not cliente:
+                resultado.rechazos.append((linea, f"No existe ningún usuario con el email {datos['email']}."))
+                continue
+            nuevas.append({
+                "numero": numero,
+                "fecha": datos["fecha"],
+                "descripcion": datos["descripcion"],
+                "monto": datos["monto"],
+                "estado": datos["estado"],
+                "cliente": cliente["nombre"],
+                "email": datos["email"],
+            })
+        repo.agregar_lote(facturas=nuevas)
+    return len(nuevas)
+
+
+@metricas.medido("importar")
+def importar(repo, tipo, filas, tam_lote=TAM_LOTE, progreso=None, guardar=True):
+    """Importa las filas (número de línea, datos) de usuarios o facturas.
+
+    `progreso(resultado)` se llama tras cada lote. Devuelve un
+    ResultadoImportacion con los rechazos ordenados por línea. Con
+    `guardar` False no se guarda la copia completa al terminar (los lotes
+    ya quedan en disco con el diario).
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de importación desconocido: {tipo}")
+    validar, alta = (validar_usuario, _alta_usuarios) if tipo == "usuarios" else (validar_factura, _alta_facturas)
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    for lote in lotes(filas, tam_lote):
+        validas = []
+        for linea, fila in lote:
+            datos, motivo = validar(fila) if fila is not None else (None, "Línea JSON no válida.")
+            if motivo:
+                resultado.rechazos.append((linea, motivo))
+            else:
+                validas.append((linea, datos))
+        if validas:
+            resultado.importadas += alta(repo, validas, resultado)
+        resultado.leidas += len(lote)
+        resultado.segundos = time.perf_counter() - inicio
+        if progreso:
+            progreso(resultado)
+    if guardar:
+        repo.guardar()
+    resultado.segundos = time.perf_counter() - inicio
+    resultado.rechazos.sort()
+    metricas.contar("filas", "importar", resultado.leidas)
+    return resultado
+
+
+def importar_fichero(repo, tipo, ruta, tam_lote=TAM_LOTE, progreso=None):
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as fichero:
+        return importar(repo, tipo, leer_filas(fichero, detectar_formato(ruta)), tam_lote, progreso)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in TIPOS:
+        sys.exit("Uso: python proyecto/importacion.py usuarios|facturas FICHERO [directorio] [filas_por_lote]")
+    tipo, ruta = sys.argv[1], sys.argv[2]
+    directorio = sys.argv[3] if len(sys.argv) > 3 else "data"
+    tam_lote = int(sys.argv[4]) if len(sys.argv) > 4 else TAM_LOTE
+
+    def mostrar_progreso(resultado):
+        print(f"\r{resultado.leidas} filas leídas, {resultado.filas_por_segundo:,.0f} filas/s", end="", flush=True)
+
+    repo = abrir_repositorio(directorio)
+    try:
+        resultado = importar_fichero(repo, tipo, ruta, tam_lote, mostrar_progreso)
+    finally:
+        repo.cerrar()
+    print()
+    for linea, motivo in resultado.rechazos:
+        print(f"Línea {linea}: {motivo}")
+    print(
+        f"Importados {resultado.importadas} {tipo} de {resultado.leidas} filas "
+        f"({len(resultado.rechazos)} rechazadas) en {resultado.segundos:.2f} s "
+        f"({resultado.filas_por_segundo:,.0f} filas/s)"
+    )
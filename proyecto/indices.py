@@ -0,0 +1,70 @@
+# ============================================
+# -------- ÍNDICE DE FACTURAS POR USUARIO --------
+# ============================================
+# Agrupa las facturas por email y mantiene los importes acumulados de
+# cada usuario, de modo que el resumen financiero no tenga que recorrer
+# todas las facturas una vez por usuario. Los importes se suman en
+# céntimos y se devuelven en euros.
+
+from modelo import Estado, como_factura
+
+
+def en_euros(acumulados):
+    """[facturas, total, pagado, pendiente] en céntimos a los agregados en euros."""
+    facturas, total, pagado, pendiente = acumulados
+    return {"facturas": facturas, "total": total / 100, "pagado": pagado / 100, "pendiente": pendiente / 100}
+
+
+def sumar(acumulados, factura):
+    acumulados[0] += 1
+    acumulados[1] += factura.centimos
+    if factura.estado is Estado.PAGADA:
+        acumulados[2] += factura.centimos
+    elif factura.estado is Estado.PENDIENTE:
+        acumulados[3] += factura.centimos
+
+
+class IndiceFacturas:
+    """Facturas agrupadas por email con número e importes acumulados."""
+
+    def __init__(self, facturas=()):
+        self._facturas = {}
+        self._acumulados = {}
+        # Carga inicial: primero se agrupa y luego se suman los importes de
+        # cada usuario, que es bastante más rápido que agregar una a una
+        for factura in map(como_factura, facturas):
+            lista = self._facturas.get(factura.email)
+            if lista is None:
+                self._facturas[factura.email] = [factura]
+            else:
+                lista.append(factura)
+        for email, lista in self._facturas.items():
+            acumulados = self._acumulados[email] = [0, 0, 0, 0]
+            for factura in lista:
+                sumar(acumulados, factura)
+
+    def agregar(self, factura):
+        factura = como_factura(factura)
+        if factura.email not in self._facturas:
+            self._facturas[factura.email] = []
+            self._acumulados[factura.email] = [0, 0, 0, 0]
+        self._facturas[factura.email].append(factura)
+        sumar(self._acumulados[factura.email], factura)
+
+    def eliminar_email(self, email):
+        """Quita del índice todas las facturas de un usuario."""
+        self._facturas.pop(email, None)
+        self._acumulados.pop(email, None)
+
+    def facturas_de(self, email, offset=0, limite=None):
+        facturas = self._facturas.get(email, [])
+        fin = None if limite is None else offset + limite
+        return facturas[offset:fin]
+
+    def acumulados(self, email):
+        """[facturas, total, pagado, pendiente] del usuario, en céntimos."""
+        return list(self._acumulados.get(email) or [0, 0, 0, 0])
+
+    def agregados(self, email):
+        """Número de facturas e importes total, pagado y pendiente del usuario."""
+        return en_euros(self.acumulados(email))
@@ -0,0 +1,194 @@
+# ============================================
+# -------- INFORMES PDF --------
+# ============================================
+# Los informes se generan fila a fila a partir de un iterador, con la
+# cabecera de la tabla repetida en cada página, y se escriben en un
+# fichero en disco. FPDF guarda todas las páginas en memoria hasta
+# output(), así que cada PDF lleva como mucho FILAS_POR_PDF filas: con más,
+# el informe se parte en varios PDF que se escriben según se llenan y se
+# entregan juntos en un ZIP. La generación se lanza en un hilo aparte para
+# que la app pueda mostrar el progreso mientras tanto. Con muchas facturas,
+# sus filas se preparan en varios procesos (ver paralelo.py).
+
+import itertools
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from fpdf import FPDF
+
+import metricas
+import paralelo
+
+ALTO_FILA = 8
+AVISAR_CADA = 1000
+# Unas 280 páginas; más allá, FPDF también se vuelve más lento por fila
+FILAS_POR_PDF = 10_000
+
+COLUMNAS_USUARIOS = ["Nombre", "Email", "Teléfono", "Registro"]
+ANCHOS_USUARIOS = [40, 50, 40, 40]
+COLUMNAS_FACTURAS = ["Cliente", "Email", "Fecha", "Monto"]
+ANCHOS_FACTURAS = [40, 50, 40, 30]
+
+
+def texto_pdf(valor):
+    """Las fuentes básicas de FPDF solo admiten latin-1."""
+    return str(valor).encode("latin-1", "replace").decode("latin-1")
+
+
+class InformePDF(FPDF):
+    """PDF con un título y una tabla cuya cabecera se repite en cada página."""
+
+    def __init__(self, titulo, columnas, anchos):
+        super().__init__()
+        self.titulo = titulo
+        self.columnas = columnas
+        self.anchos = anchos
+        self.set_auto_page_break(True, margin=15)
+
+    def header(self):
+        self.set_font("Arial", "B", 12)
+        self.cell(0, 10, texto_pdf(self.titulo), ln=True, align="C")
+        self.ln(5)
+        self.set_font("Arial", "B", 10)
+        for columna, ancho in zip(self.columnas, self.anchos):
+            self.cell(ancho, ALTO_FILA, texto_pdf(columna), border=1)
+        self.ln()
+
+    def escribir_filas(self, filas, progreso=None):
+        """Escribe las filas (ya pasadas por texto_pdf) según van llegando; FPDF salta de página solo."""
+        self.add_page()
+        self.set_font("Arial", "", 9)
+        hechas = 0
+        for fila in filas:
+            for valor, ancho in zip(fila, self.anchos):
+                self.cell(ancho, ALTO_FILA, valor, border=1)
+            self.ln()
+            hechas += 1
+            if progreso and hechas % AVISAR_CADA == 0:
+                progreso(hechas)
+        if progreso:
+            progreso(hechas)
+        return hechas
+
+
+def juntar_partes(partes, ruta):
+    """Deja una sola parte en `ruta` o, si hay varias, las mete en un ZIP junto a ella."""
+    if len(partes) == 1:
+        os.replace(partes[0], ruta)
+        return ruta
+    base = os.path.splitext(ruta)[0]
+    nombre = os.path.basename(base)
+    ruta_zip = base + ".zip"
+    # Las páginas de los PDF ya van comprimidas
+    with zipfile.ZipFile(ruta_zip, "w", zipfile.ZIP_STORED) as zip_:
+        for numero, parte in enumerate(partes, 1):
+            zip_.write(parte, f"{nombre}_{numero}.pdf")
+            os.remove(parte)
+    return ruta_zip
+
+
+def generar_informe(titulo, columnas, anchos, filas, ruta, progreso=None, operacion="generar_pdf"):
+    """Escribe el informe en `ruta` y devuelve la ruta del PDF, o la del ZIP si hizo falta partirlo."""
+    filas = iter(filas)
+    base = os.path.splitext(ruta)[0]
+    partes = []
+    hechas = 0
+    with metricas.cronometro(operacion):
+        while True:
+            primera = next(filas, None)
+            if primera is None and partes:
+                break
+            tramo = [] if primera is None else itertools.islice(itertools.chain([primera], filas), FILAS_POR_PDF)
+            avance = (lambda n, antes=hechas: progreso(antes + n)) if progreso else None
+            pdf = InformePDF(titulo, columnas, anchos)
+            escritas = pdf.escribir_filas(tramo, avance)
+            partes.append(f"{base}.parte{len(partes) + 1}.pdf")
+            pdf.output(partes[-1])
+            del pdf
+            hechas += escritas
+            if escritas < FILAS_POR_PDF:
+                break
+        ruta = juntar_partes(partes, ruta)
+    if metricas.ACTIVO:
+        metricas.contar("filas", operacion, hechas)
+        metricas.contar("bytes_escritos", operacion, os.path.getsize(ruta))
+    return ruta
+
+
+def generar_pdf_usuarios(usuarios, ruta, progreso=None):
+    filas = (tuple(map(texto_pdf, (u["nombre"], u["email"], u["telefono"], u["fecha_registro"]))) for u in usuarios)
+    return generar_informe("Listado de Usuarios", COLUMNAS_USUARIOS, ANCHOS_USUARIOS, filas, ruta, progreso,
+                           operacion="generar_pdf_usuarios")
+
+
+def filas_facturas(facturas):
+    return (tuple(map(texto_pdf, (f["cliente"], f["email"], f["fecha"], f["monto"]))) for f in facturas)
+
+
+def filas_de_tramo(tramo):
+    """Filas del informe de facturas de un tramo (se ejecuta en otro proceso)."""
+    return list(filas_facturas(tramo.facturas()))
+
+
+def generar_pdf_facturas(facturas, ruta, progreso=None):
+    return generar_informe("Listado de Facturas", COLUMNAS_FACTURAS, ANCHOS_FACTURAS, filas_facturas(facturas),
+                           ruta, progreso, operacion="generar_pdf_facturas")
+
+
+def generar_pdf_facturas_de(repo, ruta, progreso=None, procesos=None):
+    """Como generar_pdf_facturas, pero con muchas facturas las filas se preparan en otros procesos.
+
+    Los PDF se siguen escribiendo aquí, en orden.
+    """
+    if not paralelo.en_paralelo(repo.contar_facturas(), procesos):
+        return generar_pdf_facturas(repo.facturas(), ruta, progreso)
+    tramos = paralelo.en_orden(filas_de_tramo, repo.tramos_facturas(paralelo.TAM_TRAMO), procesos=procesos)
+    return generar_informe("Listado de Facturas", COLUMNAS_FACTURAS, ANCHOS_FACTURAS,
+                           itertools.chain.from_iterable(tramos), ruta, progreso, operacion="generar_pdf_facturas")
+
+
+# ============================================
+# -------- GENERACIÓN EN SEGUNDO PLANO --------
+# ============================================
+
+_ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="informes")
+
+
+class TareaInforme:
+    """Informe que se está generando en segundo plano."""
+
+    def __init__(self, generar, datos, total, ruta):
+        self.total = total
+        self.ruta = ruta
+        self.hechas = 0
+        self._cerrojo = threading.Lock()
+        self.futuro = _ejecutor.submit(generar, datos, ruta, self._avanzar)
+
+    def _avanzar(self, hechas):
+        with self._cerrojo:
+            self.hechas = hechas
+
+    @property
+    def progreso(self):
+        """Fracción de filas escritas, entre 0 y 1."""
+        if self.terminada():
+            return 1.0
+        with self._cerrojo:
+            return min(1.0, self.hechas / self.total) if self.total else 0.0
+
+    def terminada(self):
+        return self.futuro.done()
+
+    def resultado(self, timeout=None):
+        """Ruta del PDF (o del ZIP) generado; relanza el error si la generación falló."""
+        return self.futuro.result(timeout)
+
+
+def lanzar_pdf_usuarios(usuarios, total, ruta):
+    return TareaInforme(generar_pdf_usuarios, usuarios, total, ruta)
+
+
+def lanzar_pdf_facturas(repo, ruta):
+    return TareaInforme(generar_pdf_facturas_de, repo, repo.contar_facturas(), ruta)
@@ -0,0 +1,205 @@
+# ============================================
+# -------- MÉTRICAS DE RENDIMIENTO --------
+# ============================================
+# Tiempos y contadores (filas procesadas, bytes leídos y escritos) de las
+# operaciones costosas: cargar y guardar datos, resumen, búsqueda,
+# exportación, informes e importación. Los niveles guardan el último valor
+# de una magnitud que sube y baja, como los cambios pendientes de guardar.
+#
+# Desactivadas por defecto. Se activan con CRM_METRICAS=1, y entonces:
+# - la app muestra la página "Rendimiento" en el menú,
+# - cada operación medida deja una línea JSON en el logger "crm.metricas",
+# - con CRM_METRICAS_PUERTO=9100 se sirven en formato Prometheus en
+#   http://localhost:9100/metrics. Solo se escucha en 127.0.0.1: para
+#   exponerlas en otra interfaz, CRM_METRICAS_HOST=0.0.0.0 (o su IP).
+#
+# Desactivadas, cada punto de medida solo comprueba ACTIVO: los
+# decoradores llaman directamente a la función y cronometro() devuelve un
+# contexto vacío compartido.
+
+import contextlib
+import functools
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+ACTIVO = os.environ.get("CRM_METRICAS", "") not in ("", "0")
+HOST = os.environ.get("CRM_METRICAS_HOST", "127.0.0.1")
+
+log = logging.getLogger("crm.metricas")
+
+_cerrojo = threading.Lock()
+_tiempos = {}       # operación -> [llamadas, segundos totales, segundos máximo]
+_contadores = {}    # (magnitud, operación) -> total
+_niveles = {}       # nombre -> último valor
+_NULO = contextlib.nullcontext()
+
+MAGNITUDES = {
+    "filas": "Filas procesadas",
+    "bytes_leidos": "Bytes leídos de disco",
+    "bytes_escritos": "Bytes escritos en disco",
+}
+
+
+def activar(valor=True):
+    global ACTIVO
+    ACTIVO = valor
+
+
+def reiniciar():
+    with _cerrojo:
+        _tiempos.clear()
+        _contadores.clear()
+        _niveles.clear()
+
+
+# -------- registro --------
+def anotar_tiempo(operacion, segundos):
+    with _cerrojo:
+        tiempo = _tiempos.get(operacion)
+        if tiempo is None:
+            _tiempos[operacion] = [1, segundos, segundos]
+        else:
+            tiempo[0] += 1
+            tiempo[1] += segundos
+            tiempo[2] = max(tiempo[2], segundos)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps({"operacion": operacion, "segundos": round(segundos, 6)}))
+
+
+def contar(magnitud, operacion, cantidad=1):
+    """Suma `cantidad` a un contador (magnitud: filas, bytes_leidos o bytes_escritos)."""
+    if not ACTIVO:
+        return
+    with _cerrojo:
+        clave = (magnitud, operacion)
+        _contadores[clave] = _contadores.get(clave, 0) + cantidad
+
+
+def nivel(nombre, valor):
+    """Anota el valor actual de un nivel (p. ej. la cola de guardado)."""
+    if not ACTIVO:
+        return
+    with _cerrojo:
+        _niveles[nombre] = valor
+
+
+@contextlib.contextmanager
+def _cronometro(operacion):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        anotar_tiempo(operacion, time.perf_counter() - inicio)
+
+
+def cronometro(operacion):
+    """`with cronometro("guardar_datos"):` mide el bloque si las métricas están activas."""
+    return _cronometro(operacion) if ACTIVO else _NULO
+
+
+def medido(operacion):
+    """Decorador que mide cada llamada a la función con el nombre `operacion`."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not ACTIVO:
+                return funcion(*args, **kwargs)
+            with _cronometro(operacion):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# -------- consulta --------
+def instantanea():
+    """Copia de las métricas: {"tiempos": {op: {...}}, "contadores": {magnitud: {op: total}}, "niveles": {...}}."""
+    with _cerrojo:
+        tiempos = {
+            operacion: {"llamadas": n, "segundos": total, "media": total / n, "maximo": maximo}
+            for operacion, (n, total, maximo) in _tiempos.items()
+        }
+        contadores = {}
+        for (magnitud, operacion), total in _contadores.items():
+            contadores.setdefault(magnitud, {})[operacion] = total
+        niveles = dict(_niveles)
+    return {"tiempos": tiempos, "contadores": contadores, "niveles": niveles}
+
+
+def _etiqueta(operacion):
+    return operacion.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def texto_prometheus():
+    """Métricas en el formato de texto de Prometheus."""
+    datos = instantanea()
+    lineas = [
+        "# HELP crm_operacion_segundos Tiempo de las operaciones del CRM.",
+        "# TYPE crm_operacion_segundos summary",
+    ]
+    for operacion, t in sorted(datos["tiempos"].items()):
+        lineas.append(f'crm_operacion_segundos_count{{operacion="{_etiqueta(operacion)}"}} {t["llamadas"]}')
+        lineas.append(f'crm_operacion_segundos_sum{{operacion="{_etiqueta(operacion)}"}} {t["segundos"]:.6f}')
+    lineas += [
+        "# HELP crm_operacion_segundos_max Tiempo máximo de una llamada.",
+        "# TYPE crm_operacion_segundos_max gauge",
+    ]
+    for operacion, t in sorted(datos["tiempos"].items()):
+        lineas.append(f'crm_operacion_segundos_max{{operacion="{_etiqueta(operacion)}"}} {t["maximo"]:.6f}')
+    for magnitud, ayuda in MAGNITUDES.items():
+        lineas += [f"# HELP crm_{magnitud}_total {ayuda}.", f"# TYPE crm_{magnitud}_total counter"]
+        for operacion, total in sorted(datos["contadores"].get(magnitud, {}).items()):
+            lineas.append(f'crm_{magnitud}_total{{operacion="{_etiqueta(operacion)}"}} {total}')
+    lineas += ["# HELP crm_nivel Valor actual de colas y pendientes.", "# TYPE crm_nivel gauge"]
+    for nombre, valor in sorted(datos["niveles"].items()):
+        lineas.append(f'crm_nivel{{nombre="{_etiqueta(nombre)}"}} {valor}')
+    return "\n".join(lineas) + "\n"
+
+
+# -------- endpoint para Prometheus --------
+# http.server, cProfile y pstats se importan al usarlos: entre los tres
+# suman más tiempo de importación que el resto de la capa de datos.
+def iniciar_servidor(puerto, host=None):
+    """Sirve /metrics en un hilo en segundo plano y devuelve el servidor (en HOST si no se indica `host`)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host or HOST, puerto), ManejadorMetricas)
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+# -------- perfilado --------
+def iniciar_perfil():
+    import cProfile
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    return perfil
+
+
+def terminar_perfil(perfil, limite=40):
+    """Para el perfil y devuelve las `limite` funciones con más tiempo acumulado."""
+    import pstats
+
+    perfil.disable()
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(limite)
+    return salida.getvalue()
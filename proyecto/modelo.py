@@ -0,0 +1,290 @@
+# ============================================
+# -------- MODELO DE DATOS --------
+# ============================================
+# Usuarios y facturas como registros con __slots__ en lugar de
+# diccionarios: ocupan varias veces menos memoria y no repiten las
+# claves en cada registro.
+#
+# - El estado de la factura es un Estado (enum de texto): compara igual
+#   que su texto ("Pagada") y solo existe una copia de cada valor.
+# - Los importes se guardan en céntimos enteros; `monto` los devuelve en
+#   euros, así que las sumas no acumulan errores de coma flotante.
+# - La fecha de la factura se convierte una sola vez en una marca de
+#   tiempo (segundos desde 1970, sin zona horaria) para ordenar y agrupar;
+#   en la foto de facturas ya se guarda convertida (ver almacen.py).
+#
+# En disco todo se sigue guardando con el mismo JSON de siempre
+# (a_dict / desde_dict). Los registros también se leen como un dict
+# (factura["monto"], usuario.get("telefono")), de modo que el código que
+# trabajaba con diccionarios sigue funcionando.
+#
+# TablaFacturas guarda las facturas por columnas (arrays de importes,
+# marcas de tiempo, estados y emails) para los cálculos sobre todas ellas.
+
+import calendar
+import contextlib
+import enum
+import sys
+from array import array
+
+CAMPOS_USUARIO = ["id", "nombre", "email", "telefono", "direccion", "fecha_registro"]
+CAMPOS_FACTURA = ["numero", "fecha", "descripcion", "monto", "estado", "cliente", "email"]
+FORMATO_FECHA_REGISTRO = "%d/%m/%Y"
+FORMATO_FECHA_FACTURA = "%d/%m/%Y %H:%M"
+
+
+class Estado(str, enum.Enum):
+    PENDIENTE = "Pendiente"
+    PAGADA = "Pagada"
+    CANCELADA = "Cancelada"
+
+    __str__ = str.__str__
+
+
+ESTADOS = [estado.value for estado in Estado]
+# Estado -> posición en ESTADOS (también vale con el texto, que tiene el mismo hash)
+CODIGO_ESTADO = {estado: i for i, estado in enumerate(Estado)}
+_ESTADO_POR_TEXTO = {estado.value: estado for estado in Estado}
+
+
+def centimos(monto):
+    """Importe en euros (float) a céntimos enteros."""
+    return round(monto * 100)
+
+
+_SEGUNDOS_DIA = {}
+
+
+def marca_de_fecha(fecha):
+    """"dd/mm/YYYY HH:MM" a segundos desde 1970 (sin strptime, que es mucho más lento)."""
+    dia = fecha[:10]
+    segundos = _SEGUNDOS_DIA.get(dia)
+    if segundos is None:
+        segundos = _SEGUNDOS_DIA[dia] = calendar.timegm((int(dia[6:10]), int(dia[3:5]), int(dia[0:2]), 0, 0, 0))
+    if len(fecha) < 16:
+        return segundos
+    return segundos + int(fecha[11:13]) * 3600 + int(fecha[14:16]) * 60
+
+
+# ============================================
+# -------- REGISTROS --------
+# ============================================
+
+class _Registro:
+    """Acceso de solo lectura como dict a los campos de CAMPOS."""
+
+    __slots__ = ()
+    CAMPOS = []
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo, defecto)
+
+    def keys(self):
+        return list(self.CAMPOS)
+
+    def __contains__(self, campo):
+        return campo in self.CAMPOS
+
+    def __eq__(self, otro):
+        if isinstance(otro, (_Registro, dict)):
+            return self.a_dict() == dict(otro)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.a_dict()!r})"
+
+
+class Usuario(_Registro):
+    __slots__ = tuple(CAMPOS_USUARIO)
+    CAMPOS = CAMPOS_USUARIO
+
+    def __init__(self, id, nombre, email, telefono="", direccion="", fecha_registro=""):
+        self.id = id
+        self.nombre = nombre
+        self.email = email
+        self.telefono = telefono
+        self.direccion = direccion
+        self.fecha_registro = fecha_registro
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(
+            datos["id"], datos["nombre"], datos["email"],
+            datos.get("telefono", ""), datos.get("direccion", ""), datos.get("fecha_registro", ""),
+        )
+
+    def a_dict(self):
+        return {
+            "id": self.id,
+            "nombre": self.nombre,
+            "email": self.email,
+            "telefono": self.telefono,
+            "direccion": self.direccion,
+            "fecha_registro": self.fecha_registro,
+        }
+
+
+class Factura(_Registro):
+    __slots__ = ("numero", "fecha", "descripcion", "centimos", "estado", "cliente", "email", "_marca")
+    CAMPOS = CAMPOS_FACTURA
+
+    def __init__(self, numero, fecha, descripcion, centimos, estado, cliente, email, marca=None):
+        self.numero = numero
+        self.fecha = fecha
+        self.descripcion = descripcion
+        self.centimos = centimos
+        self.estado = estado
+        self.cliente = cliente
+        self.email = email
+        self._marca = marca
+
+    @property
+    def monto(self):
+        return self.centimos / 100
+
+    @property
+    def marca(self):
+        """Fecha en segundos desde 1970; se calcula la primera vez que se pide."""
+        if self._marca is None:
+            self._marca = marca_de_fecha(self.fecha)
+        return self._marca
+
+    @classmethod
+    def desde_dict(cls, datos):
+        # El email y el cliente se repiten en muchas facturas: se comparte una sola copia.
+        # (round en línea en vez de centimos(): se llama una vez por factura leída)
+        return cls(
+            datos["numero"], datos["fecha"], datos.get("descripcion", ""),
+            round(datos["monto"] * 100), _ESTADO_POR_TEXTO[datos["estado"]],
+            sys.intern(datos.get("cliente", "")), sys.intern(datos["email"]),
+        )
+
+    def a_dict(self):
+        return {
+            "numero": self.numero,
+            "fecha": self.fecha,
+            "descripcion": self.descripcion,
+            "monto": self.centimos / 100,
+            "estado": self.estado.value,
+            "cliente": self.cliente,
+            "email": self.email,
+        }
+
+
+def como_usuario(registro):
+    return registro if isinstance(registro, Usuario) else Usuario.desde_dict(registro)
+
+
+def como_factura(registro):
+    return registro if isinstance(registro, Factura) else Factura.desde_dict(registro)
+
+
+# ============================================
+# -------- FACTURAS POR COLUMNAS --------
+# ============================================
+
+class TablaFacturas:
+    """Facturas por columnas: email (número en `emails`), céntimos, marca de tiempo y código de estado.
+
+    Las columnas pueden ser arrays propios o vistas de solo lectura de la
+    foto en disco (ver almacen.py); en ese caso la tabla no se puede ampliar.
+    """
+
+    def __init__(self, emails=None, email_ids=None, centimos=None, marcas=None, estados=None):
+        self.emails = [] if emails is None else emails
+        self.email_ids = array("I") if email_ids is None else email_ids
+        self.centimos = array("q") if centimos is None else centimos
+        self.marcas = array("q") if marcas is None else marcas
+        self.estados = array("B") if estados is None else estados
+        self._numero_email = None
+
+    @classmethod
+    def desde_facturas(cls, facturas):
+        tabla = cls()
+        for factura in facturas:
+            tabla.agregar(factura)
+        return tabla
+
+    def __len__(self):
+        return len(self.centimos)
+
+    def numero_email(self, email):
+        if self._numero_email is None:
+            self._numero_email = {e: i for i, e in enumerate(self.emails)}
+        numero = self._numero_email.get(email)
+        if numero is None:
+            numero = self._numero_email[email] = len(self.emails)
+            self.emails.append(email)
+        return numero
+
+    def agregar(self, factura):
+        factura = como_factura(factura)
+        self.email_ids.append(self.numero_email(factura.email))
+        self.centimos.append(factura.centimos)
+        self.marcas.append(factura.marca)
+        self.estados.append(CODIGO_ESTADO[factura.estado])
+
+    @classmethod
+    def unir(cls, tablas):
+        """Una sola tabla con las filas de varias seguidas; sus emails no deben repetirse entre ellas."""
+        tabla = cls()
+        for otra in tablas:
+            desplazamiento = len(tabla.emails)
+            tabla.emails.extend(otra.emails)
+            if desplazamiento:
+                tabla.email_ids.extend(i + desplazamiento for i in otra.email_ids)
+            else:
+                tabla.email_ids.frombytes(otra.email_ids.tobytes())
+            tabla.centimos.frombytes(otra.centimos.tobytes())
+            tabla.marcas.frombytes(otra.marcas.tobytes())
+            tabla.estados.frombytes(otra.estados.tobytes())
+        return tabla
+
+    def copia(self, excluir=()):
+        """Tabla ampliable con las mismas filas, sin las de los números de email de `excluir`."""
+        if not excluir:
+            filas = None
+        else:
+            ids = self.email_ids
+            filas = [i for i in range(len(ids)) if ids[i] not in excluir]
+
+        def columna(tipo, valores):
+            if filas is None:
+                return array(tipo, valores.tobytes())
+            return array(tipo, [valores[i] for i in filas])
+
+        return TablaFacturas(
+            list(self.emails), columna("I", self.email_ids), columna("q", self.centimos),
+            columna("q", self.marcas), columna("B", self.estados),
+        )
+
+
+class TramoFacturas:
+    """Tramo de facturas que viaja completo a otro proceso (ver paralelo.py)."""
+
+    def __init__(self, facturas):
+        self._facturas = list(facturas)
+
+    def __len__(self):
+        return len(self._facturas)
+
+    def facturas(self):
+        return iter(self._facturas)
+
+    def tabla(self):
+        return TablaFacturas.desde_facturas(self._facturas)
+
+    def en_uso(self):
+        return contextlib.nullcontext()
+
+
+def tramos_de_lista(facturas, tam):
+    return [TramoFacturas(facturas[i:i + tam]) for i in range(0, len(facturas), tam)]
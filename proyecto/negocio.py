@@ -0,0 +1,107 @@
+# ============================================
+# -------- FUNCIONES DE NEGOCIO --------
+# ============================================
+# Registrar usuarios y facturas, buscar, consultar las facturas de un
+# usuario y el resumen financiero, sin pedir ni mostrar nada: reciben los
+# datos ya leídos y devuelven registros y diccionarios. Las usan el CRM
+# por consola y la API HTTP (ver api.py).
+#
+# Los errores se señalan con excepciones: DatosNoValidos si los datos no
+# pasan las validaciones (ver validaciones.py), y UsuarioDuplicado o
+# UsuarioNoEncontrado (de repositorio.py) si chocan con lo ya guardado.
+
+from busqueda import LIMITE_RESULTADOS
+from importacion import importar
+from modelo import Estado
+from repositorio import UsuarioNoEncontrado
+from validaciones import validar_factura, validar_usuario
+
+
+class DatosNoValidos(ValueError):
+    """Los datos recibidos no cumplen las reglas de validación."""
+
+
+# -------- altas --------
+def registrar_usuario(repo, datos):
+    """Da de alta un usuario a partir de nombre, apellidos, email y, opcionales, teléfono y dirección."""
+    usuario, motivo = validar_usuario(datos)
+    if motivo:
+        raise DatosNoValidos(motivo)
+    return repo.crear_usuario(usuario)
+
+
+def crear_factura(repo, datos):
+    """Registra una factura (email, monto, estado y, opcionales, descripción y fecha) de un usuario existente."""
+    factura, motivo = validar_factura(datos)
+    if motivo:
+        raise DatosNoValidos(motivo)
+    usuario = repo.obtener_usuario(factura["email"])
+    if not usuario:
+        raise UsuarioNoEncontrado(factura["email"])
+    return repo.crear_factura({**factura, "cliente": usuario["nombre"]})
+
+
+def registrar_usuarios(repo, lista):
+    """Alta en bloque: devuelve un ResultadoImportacion, con las posiciones de la lista (desde 0) rechazadas."""
+    return importar(repo, "usuarios", enumerate(lista), guardar=False)
+
+
+def crear_facturas(repo, lista):
+    """Como registrar_usuarios, para facturas."""
+    return importar(repo, "facturas", enumerate(lista), guardar=False)
+
+
+# -------- consultas --------
+def buscar_por_email(repo, email):
+    usuario = repo.obtener_usuario(email.strip().lower())
+    if not usuario:
+        raise UsuarioNoEncontrado(email)
+    return usuario
+
+
+def buscar_por_nombre(repo, consulta, limite=LIMITE_RESULTADOS):
+    return repo.buscar_usuarios(consulta.strip(), limite)
+
+
+def facturas_de_usuario(repo, email, desde=0, limite=None):
+    """(usuario, facturas a partir de la posición `desde`, resumen de todas sus facturas)."""
+    usuario = buscar_por_email(repo, email)
+    return usuario, repo.facturas_de(usuario.email, desde, limite), repo.resumen_de(usuario.email)
+
+
+def resumen_general(repo):
+    """Usuarios, facturas e importes total, pagado y pendiente de todo el CRM.
+
+    Sale del resumen mensual ya materializado, sin recorrer las facturas.
+    """
+    por_estado = repo.resumen_mensual().por_estado()
+    return {
+        "usuarios": repo.contar_usuarios(),
+        "facturas": sum(facturas for facturas, _ in por_estado.values()),
+        "total": round(sum(importe for _, importe in por_estado.values()), 2),
+        "pagado": por_estado[Estado.PAGADA][1],
+        "pendiente": por_estado[Estado.PENDIENTE][1],
+    }
+
+
+def resumen_financiero(repo):
+    """(resumen de cada usuario, resumen general)."""
+    return repo.resumen_por_usuario(), resumen_general(repo)
+
+
+def resumen_usuarios(repo, despues=None, limite=100):
+    """Resumen de una página de usuarios en orden de id (ver Repositorio.usuarios_despues).
+
+    Devuelve (filas, id a partir del que sigue la página siguiente o None si es la última).
+    """
+    usuarios = repo.usuarios_despues(despues, limite)
+    filas = []
+    for usuario in usuarios:
+        # Se salta a quien se haya dado de baja entre leer la página y su resumen
+        try:
+            fila = repo.resumen_de(usuario.email)
+        except KeyError:
+            fila = None
+        if fila:
+            filas.append(fila)
+    return filas, usuarios[-1].id if len(usuarios) == limite else None
@@ -0,0 +1,7 @@
+# ============================================
+# -------- PÁGINAS DE LA APP --------
+# ============================================
+# Una página del menú por módulo, con una función mostrar(repo, version).
+# app.py solo importa la página elegida, así que las dependencias pesadas
+# (pandas, fpdf) se cargan la primera vez que se abre una página que las
+# necesita y no al arrancar. Lo compartido entre páginas está en comun.py.
@@ -0,0 +1,35 @@
+import streamlit as st
+
+import negocio
+from repositorio import UsuarioNoEncontrado
+
+def mostrar(repo, version):
+    st.subheader("🔍 Buscar Usuario")
+    criterio = st.radio("Buscar por:", ["Email", "Nombre"])
+    consulta = st.text_input("Introduce tu búsqueda")
+    if criterio == "Nombre":
+        st.caption("También encuentra por teléfono o dirección, y por el principio de cada palabra.")
+        palabras = consulta.split()
+        if palabras:
+            sugerencias = repo.autocompletar(palabras[-1])
+            if sugerencias:
+                st.caption("Sugerencias: " + ", ".join(sugerencias))
+        limite = st.number_input("Máximo de resultados", min_value=1, max_value=500, value=20)
+
+    if st.button("Buscar"):
+        resultados = []
+        if criterio == "Email":
+            try:
+                resultados.append(negocio.buscar_por_email(repo, consulta))
+            except UsuarioNoEncontrado:
+                pass
+        else:
+            resultados = negocio.buscar_por_nombre(repo, consulta, limite)
+        if resultados:
+            for u in resultados:
+                st.write(f"**{u['nombre']}** ({u['email']})")
+                st.write(f"- Teléfono: {u['telefono']}")
+                st.write(f"- Dirección: {u['direccion']}")
+                st.write(f"- Fecha de registro: {u['fecha_registro']}")
+        else:
+            st.warning("⚠️ No se encontraron coincidencias.")
@@ -0,0 +1,56 @@
+# ============================================
+# -------- CARGA DE DATOS Y UTILIDADES COMUNES --------
+# ============================================
+
+import atexit
+import os
+
+import streamlit as st
+
+from repositorio import abrir_repositorio
+
+# El backend (JSON o SQLite) se elige con la variable CRM_BACKEND
+DATA_DIR = os.environ.get("CRM_DATA_DIR", "data")
+
+# El repositorio se abre una sola vez por proceso: los reruns de Streamlit
+# reutilizan los datos ya cargados en lugar de volver a leer los JSON.
+# Todas las sesiones comparten el mismo repositorio, que serializa las
+# escrituras (ver Repositorio.transaccion). Cada alta queda en disco al
+# momento; la compactación del diario se hace en segundo plano y se
+# termina al salir del proceso.
+@st.cache_resource
+def cargar_datos():
+    repo = abrir_repositorio(DATA_DIR)
+    atexit.register(repo.cerrar)
+    return repo
+
+# ============================================
+# -------- CACHÉ DE DATOS DERIVADOS --------
+# ============================================
+# Resúmenes, series y ficheros exportados se guardan en caché por versión
+# de los datos: mientras nadie escriba, un rerun no recalcula nada. Cada
+# página registra sus cachés con @cache_derivada al importarse.
+
+_caches_derivadas = []
+
+def cache_derivada(funcion):
+    _caches_derivadas.append(funcion)
+    return funcion
+
+def limpiar_cache_derivada():
+    for funcion in _caches_derivadas:
+        funcion.clear()
+
+# ============================================
+# -------- PAGINACIÓN --------
+# ============================================
+
+TAMANOS_PAGINA = [25, 50, 100, 500]
+
+def paginador(total, clave):
+    """Selector de filas por página y número de página; devuelve (offset, limite)."""
+    col_limite, col_pagina = st.columns(2)
+    limite = col_limite.selectbox("Filas por página", TAMANOS_PAGINA, key=f"{clave}_limite")
+    paginas = max(1, -(-total // limite))
+    pagina = col_pagina.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1, key=f"{clave}_pagina")
+    return (pagina - 1) * limite, limite
@@ -0,0 +1,28 @@
+import streamlit as st
+
+import negocio
+from modelo import ESTADOS
+from repositorio import UsuarioNoEncontrado
+
+def mostrar(repo, version):
+    st.subheader("🧾 Crear Factura")
+    if repo.contar_usuarios():
+        selected_email = st.selectbox("Seleccionar Usuario", repo.emails())
+        descripcion = st.text_input("Descripción del servicio/producto")
+        monto = st.number_input("Monto total (€)", min_value=0.01)
+        estado = st.selectbox("Estado", ESTADOS)
+        if st.button("Emitir Factura"):
+            try:
+                negocio.crear_factura(repo, {
+                    "descripcion": descripcion,
+                    "monto": monto,
+                    "estado": estado,
+                    "email": selected_email
+                })
+                st.success("✅ Factura registrada correctamente.")
+            except negocio.DatosNoValidos as e:
+                st.warning(f"❗ {e}")
+            except UsuarioNoEncontrado:
+                st.error("⚠️ El usuario ya no existe.")
+    else:
+        st.info("ℹ️ No hay usuarios registrados.")
@@ -0,0 +1,21 @@
+import streamlit as st
+
+from repositorio import UsuarioNoEncontrado
+
+def mostrar(repo, version):
+    st.subheader("🗑️ Eliminar Usuario Registrado")
+    if repo.contar_usuarios():
+        selected_email = st.selectbox("Selecciona un usuario para eliminar", repo.emails())
+        usuario = repo.obtener_usuario(selected_email)
+        st.write(f"**Nombre:** {usuario['nombre']}")
+        st.write(f"**Email:** {usuario['email']}")
+        confirm = st.checkbox("✅ Confirmar eliminación")
+
+        if confirm and st.button("Eliminar"):
+            try:
+                repo.eliminar_usuario(selected_email)
+                st.success("✅ Usuario y facturas eliminados correctamente.")
+            except UsuarioNoEncontrado:
+                st.warning("⚠️ El usuario ya había sido eliminado.")
+    else:
+        st.info("ℹ️ No hay usuarios para eliminar.")
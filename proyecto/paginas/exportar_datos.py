@@ -0,0 +1,93 @@
+import time
+
+import streamlit as st
+
+from exportacion import exportar_csv, exportar_csv_facturas, ruta_exportacion
+from modelo import CAMPOS_USUARIO
+from paginas.comun import cache_derivada, cargar_datos
+
+# Los CSV se escriben por bloques en un fichero temporal y la caché
+# guarda solo su ruta.
+@cache_derivada
+@st.cache_data(max_entries=1)
+def csv_usuarios_en_cache(version):
+    ruta = ruta_exportacion("usuarios", version, "csv")
+    return exportar_csv(cargar_datos().usuarios(), CAMPOS_USUARIO, ruta)
+
+@cache_derivada
+@st.cache_data(max_entries=1)
+def csv_facturas_en_cache(version):
+    ruta = ruta_exportacion("facturas", version, "csv")
+    return exportar_csv_facturas(cargar_datos(), ruta)
+
+# ============================================
+# -------- INFORMES PDF --------
+# ============================================
+# Los PDF se generan en segundo plano (ver informes.py). Las tareas se
+# guardan en caché por versión de los datos, así que varias sesiones que
+# piden el mismo informe comparten una única generación. informes.py
+# (y con él fpdf) se importa al pedir el primer PDF.
+
+@cache_derivada
+@st.cache_resource(max_entries=2)
+def informe_usuarios(version):
+    from informes import lanzar_pdf_usuarios
+    repo = cargar_datos()
+    return lanzar_pdf_usuarios(repo.usuarios(), repo.contar_usuarios(), ruta_exportacion("usuarios", version, "pdf"))
+
+@cache_derivada
+@st.cache_resource(max_entries=2)
+def informe_facturas(version):
+    from informes import lanzar_pdf_facturas
+    repo = cargar_datos()
+    return lanzar_pdf_facturas(repo, ruta_exportacion("facturas", version, "pdf"))
+
+def mostrar_descarga_pdf(tarea, filename):
+    """Muestra el progreso de la tarea y, al terminar, el botón de descarga."""
+    barra = st.progress(0.0, text=f"Generando {filename}...")
+    while not tarea.terminada():
+        barra.progress(tarea.progreso, text=f"Generando {filename}...")
+        time.sleep(0.2)
+    barra.empty()
+    try:
+        ruta = tarea.resultado()
+    except Exception as e:
+        st.error(f"❌ No se pudo generar {filename}: {e}")
+        return
+    # Los informes muy largos llegan partidos en varios PDF dentro de un ZIP
+    if ruta.endswith(".zip"):
+        filename, mime = filename.replace(".pdf", ".zip"), "application/zip"
+    else:
+        mime = "application/pdf"
+    with open(ruta, "rb") as f:
+        st.download_button(f"📄 Descargar {filename}", data=f, file_name=filename, mime=mime)
+
+def mostrar(repo, version):
+    st.header("⬇️ Exportar datos como CSV o PDF")
+
+    # CSV
+    st.markdown("### 📥 Exportar como CSV")
+    # Los CSV solo se generan cuando se piden, no al abrir la página
+    if st.button("⚙️ Preparar CSV de Usuarios"):
+        st.session_state["csv_usuarios"] = True
+    if st.session_state.get("csv_usuarios"):
+        with open(csv_usuarios_en_cache(version), "rb") as f:
+            st.download_button("📥 Descargar CSV de Usuarios", data=f, file_name="usuarios.csv", mime="text/csv")
+
+    if st.button("⚙️ Preparar CSV de Facturas"):
+        st.session_state["csv_facturas"] = True
+    if st.session_state.get("csv_facturas"):
+        with open(csv_facturas_en_cache(version), "rb") as f:
+            st.download_button("📥 Descargar CSV de Facturas", data=f, file_name="facturas.csv", mime="text/csv")
+
+    # PDF
+    st.markdown("### 🧾 Exportar como PDF")
+    if st.button("📤 Exportar Usuarios en PDF"):
+        st.session_state["pdf_usuarios"] = True
+    if st.session_state.get("pdf_usuarios"):
+        mostrar_descarga_pdf(informe_usuarios(version), "usuarios.pdf")
+
+    if st.button("📤 Exportar Facturas en PDF"):
+        st.session_state["pdf_facturas"] = True
+    if st.session_state.get("pdf_facturas"):
+        mostrar_descarga_pdf(informe_facturas(version), "facturas.pdf")
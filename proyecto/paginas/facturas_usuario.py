@@ -0,0 +1,17 @@
+import streamlit as st
+
+from paginas.comun import paginador
+
+def mostrar(repo, version):
+    st.subheader("📑 Facturas por Usuario")
+    if repo.contar_usuarios():
+        selected_email = st.selectbox("Seleccionar Usuario", repo.emails())
+        total_facturas = repo.resumen_de(selected_email)["facturas"]
+        if total_facturas:
+            st.write(f"📄 Facturas de {repo.obtener_usuario(selected_email)['nombre']}:")
+            offset, limite = paginador(total_facturas, "facturas_usuario")
+            st.table([f.a_dict() for f in repo.facturas_de(selected_email, offset, limite)])
+        else:
+            st.info("ℹ️ Este usuario no tiene facturas registradas.")
+    else:
+        st.info("ℹ️ No hay usuarios en el sistema.")
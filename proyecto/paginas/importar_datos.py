@@ -0,0 +1,40 @@
+import io
+
+import pandas as pd
+import streamlit as st
+
+from importacion import importar, detectar_formato, leer_filas
+from paginas.comun import limpiar_cache_derivada
+
+def mostrar(repo, version):
+    st.header("⬆️ Importar usuarios o facturas desde CSV o JSONL")
+    st.caption(
+        "Usuarios: nombre, apellidos, email y, opcionales, telefono, direccion y fecha_registro (dd/mm/YYYY). "
+        "Facturas: email, monto, estado y, opcionales, descripcion y fecha (dd/mm/YYYY HH:MM)."
+    )
+    tipo = st.radio("Tipo de datos", ["usuarios", "facturas"], horizontal=True)
+    archivo = st.file_uploader("Archivo", type=["csv", "jsonl", "ndjson", "json"])
+
+    if archivo and st.button("Importar"):
+        barra = st.progress(0.0, text="Importando...")
+
+        def mostrar_progreso(resultado):
+            barra.progress(
+                min(archivo.tell() / max(archivo.size, 1), 1.0),
+                text=f"{resultado.leidas} filas leídas ({resultado.filas_por_segundo:,.0f} filas/s)",
+            )
+
+        # El archivo se lee en streaming, sin cargarlo entero en memoria
+        texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+        resultado = importar(repo, tipo, leer_filas(texto, detectar_formato(archivo.name)), progreso=mostrar_progreso)
+        barra.empty()
+        limpiar_cache_derivada()
+
+        col_importadas, col_rechazadas, col_velocidad = st.columns(3)
+        col_importadas.metric("Importadas", resultado.importadas)
+        col_rechazadas.metric("Rechazadas", len(resultado.rechazos))
+        col_velocidad.metric("Filas por segundo", f"{resultado.filas_por_segundo:,.0f}")
+        st.success(f"✅ {resultado.leidas} filas procesadas en {resultado.segundos:.2f} s.")
+        if resultado.rechazos:
+            st.warning("⚠️ Filas rechazadas:")
+            st.dataframe(pd.DataFrame(resultado.rechazos, columns=["Línea", "Motivo"]), hide_index=True)
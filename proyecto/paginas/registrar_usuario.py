@@ -0,0 +1,27 @@
+import streamlit as st
+
+import negocio
+from repositorio import UsuarioDuplicado
+
+def mostrar(repo, version):
+    st.subheader("➕ Registrar Nuevo Usuario")
+    nombre = st.text_input("Nombre")
+    apellidos = st.text_input("Apellidos")
+    email = st.text_input("Email")
+    telefono = st.text_input("Teléfono (opcional)")
+    direccion = st.text_input("Dirección (opcional)")
+
+    if st.button("Registrar"):
+        try:
+            usuario = negocio.registrar_usuario(repo, {
+                "nombre": nombre,
+                "apellidos": apellidos,
+                "email": email,
+                "telefono": telefono,
+                "direccion": direccion
+            })
+            st.success(f"✅ Usuario registrado con ID {usuario['id']}")
+        except negocio.DatosNoValidos as e:
+            st.warning(f"❗ {e}")
+        except UsuarioDuplicado:
+            st.error("⚠️ Este email ya está registrado.")
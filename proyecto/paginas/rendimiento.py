@@ -0,0 +1,33 @@
+import pandas as pd
+import streamlit as st
+
+import metricas
+
+def mostrar(repo, version):
+    st.header("⏱️ Rendimiento")
+    datos = metricas.instantanea()
+    st.markdown("### Tiempos por operación (s)")
+    if datos["tiempos"]:
+        tiempos = pd.DataFrame.from_dict(datos["tiempos"], orient="index")
+        st.dataframe(tiempos.sort_values("segundos", ascending=False))
+    else:
+        st.info("ℹ️ Todavía no hay medidas.")
+    if datos["contadores"]:
+        st.markdown("### Filas y bytes")
+        st.dataframe(pd.DataFrame(datos["contadores"]).fillna(0).astype("int64"))
+    if datos["niveles"]:
+        st.markdown("### Colas y pendientes")
+        st.dataframe(pd.Series(datos["niveles"], name="valor"))
+
+    col_reiniciar, col_perfilar = st.columns(2)
+    if col_reiniciar.button("🔄 Reiniciar métricas"):
+        metricas.reiniciar()
+        st.success("✅ Métricas reiniciadas.")
+    if col_perfilar.button("🔬 Perfilar el siguiente rerun"):
+        st.session_state["perfilar"] = True
+        st.info("ℹ️ Cambia de página o interactúa con la app; el perfil aparecerá aquí.")
+    st.download_button("📥 Descargar métricas (Prometheus)", data=metricas.texto_prometheus(),
+                       file_name="metricas.prom", mime="text/plain")
+    if st.session_state.get("perfil"):
+        st.markdown("### Perfil del último rerun perfilado")
+        st.code(st.session_state["perfil"])
@@ -0,0 +1,32 @@
+import streamlit as st
+
+from analitica import MotorAnalitico
+from paginas.comun import cache_derivada, cargar_datos
+
+@st.cache_resource
+def cargar_motor():
+    return MotorAnalitico(cargar_datos())
+
+def resumen_financiero(motor):
+    resumen = motor.resumen_por_usuario()
+    return resumen.rename(columns={
+        "nombre": "Usuario",
+        "email": "Email",
+        "facturas": "Facturas",
+        "total": "Total (€)",
+        "pagado": "Pagado (€)",
+        "pendiente": "Pendiente (€)"
+    })[["Usuario", "Email", "Facturas", "Total (€)", "Pagado (€)", "Pendiente (€)"]]
+
+@cache_derivada
+@st.cache_data(max_entries=1)
+def resumen_en_cache(version):
+    return resumen_financiero(cargar_motor())
+
+def mostrar(repo, version):
+    st.subheader("📊 Resumen Financiero por Usuario")
+    resumen = resumen_en_cache(version)
+    if not resumen.empty:
+        st.dataframe(resumen)
+    else:
+        st.info("ℹ️ No hay datos suficientes para mostrar el resumen.")
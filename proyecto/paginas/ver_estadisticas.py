@@ -0,0 +1,49 @@
+import pandas as pd
+import streamlit as st
+
+import metricas
+from modelo import ESTADOS
+from paginas.comun import cache_derivada, cargar_datos
+
+# Las estadísticas salen del resumen por mes y estado que mantiene el
+# repositorio (ver estadisticas.py); filtrar por fechas o estados no
+# vuelve a recorrer las facturas.
+@cache_derivada
+@st.cache_data(max_entries=1)
+def resumen_mensual_en_cache(version):
+    with metricas.cronometro("estadisticas"):
+        return cargar_datos().resumen_mensual()
+
+def mostrar(repo, version):
+    st.header("📈 Estadísticas del Sistema")
+    resumen_mensual = resumen_mensual_en_cache(version)
+    meses = resumen_mensual.lista_meses()
+    if meses:
+        etiquetas = [f"{anio}-{mes:02d}" for anio, mes in meses]
+        col_meses, col_estados = st.columns(2)
+        desde, hasta = col_meses.select_slider("Meses", etiquetas, value=(etiquetas[0], etiquetas[-1]))
+        estados = col_estados.multiselect("Estados", ESTADOS, default=ESTADOS)
+        desde, hasta = meses[etiquetas.index(desde)], meses[etiquetas.index(hasta)]
+
+        totales = resumen_mensual.totales(desde, hasta, estados)
+        col_facturas, col_media, col_desviacion = st.columns(3)
+        col_facturas.metric("Facturas", totales["facturas"])
+        col_media.metric("Importe medio (€)", round(totales["media"], 2))
+        col_desviacion.metric("Desviación típica (€)", round(totales["varianza"] ** 0.5, 2))
+
+        por_mes = pd.DataFrame(
+            [(f"{anio}-{mes:02d}", facturas, ingresos)
+             for (anio, mes), facturas, ingresos in resumen_mensual.meses(desde, hasta, estados)],
+            columns=["mes", "facturas", "ingresos"],
+        ).set_index("mes")
+        st.bar_chart(por_mes["facturas"])
+        st.markdown("#### Ingresos por mes (€)")
+        st.bar_chart(por_mes["ingresos"])
+        st.markdown("#### Importes por estado")
+        st.dataframe(pd.DataFrame(
+            [(estado.value, facturas, importe)
+             for estado, (facturas, importe) in resumen_mensual.por_estado(desde, hasta).items()],
+            columns=["estado", "facturas", "importe"],
+        ).set_index("estado"))
+    else:
+        st.info("No hay datos de facturación disponibles.")
@@ -0,0 +1,21 @@
+import streamlit as st
+
+from paginas.comun import paginador
+
+def mostrar(repo, version):
+    st.subheader("📄 Lista de Usuarios Registrados")
+    total_usuarios = repo.contar_usuarios()
+    if total_usuarios:
+        offset, limite = paginador(total_usuarios, "ver_usuarios")
+        df = []
+        for u in repo.pagina_usuarios(offset, limite):
+            df.append({
+                "ID": u["id"],
+                "Nombre": u["nombre"],
+                "Email": u["email"],
+                "Teléfono": u["telefono"],
+                "Fecha de registro": u["fecha_registro"]
+            })
+        st.dataframe(df)
+    else:
+        st.info("ℹ️ Aún no hay usuarios registrados.")
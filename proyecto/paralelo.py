@@ -0,0 +1,102 @@
+# ============================================
+# -------- CÁLCULO EN VARIOS PROCESOS --------
+# ============================================
+# El resumen financiero, la exportación CSV de facturas y la preparación
+# de las filas del informe PDF de facturas se pueden repartir entre
+# varios procesos. Las facturas se dividen en tramos
+# (Repositorio.tramos_facturas), cada proceso lee los suyos directamente
+# de disco y el proceso principal junta los resultados parciales.
+#
+# CRM_PROCESOS fija el número de procesos (por defecto, uno por núcleo) y
+# CRM_UMBRAL_PARALELO el número de facturas a partir del cual se reparte:
+# por debajo, enviar el trabajo y recoger los resultados cuesta más de lo
+# que se gana, y se hace todo en el proceso principal.
+#
+# Un tramo tiene facturas() y tabla() (sus facturas como registros o por
+# columnas) y en_uso(), que mientras dura impide borrar lo que el tramo
+# necesita leer de disco.
+
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import threading
+
+PROCESOS = int(os.environ.get("CRM_PROCESOS", "0")) or os.cpu_count() or 1
+UMBRAL_PARALELO = int(os.environ.get("CRM_UMBRAL_PARALELO", "500000"))
+TAM_TRAMO = 100_000
+
+_ejecutores = {}
+_cerrojo = threading.Lock()
+
+
+def procesos_de(procesos=None):
+    return PROCESOS if procesos is None else procesos
+
+
+def en_paralelo(facturas, procesos=None):
+    """Si compensa repartir entre procesos un trabajo sobre `facturas` facturas."""
+    return procesos_de(procesos) > 1 and facturas >= UMBRAL_PARALELO
+
+
+def tam_tramo(facturas, procesos=None):
+    """Tamaño de tramo para repartir `facturas` facturas en un tramo por proceso."""
+    procesos = procesos_de(procesos)
+    return max(1, -(-facturas // procesos))
+
+
+def ejecutor(procesos=None):
+    """Grupo de procesos compartido (uno por número de procesos pedido).
+
+    Se arrancan con "spawn": hacer fork de un proceso con hilos (guardado
+    en segundo plano, sesiones de la app) puede heredar bloqueos tomados.
+    """
+    procesos = procesos_de(procesos)
+    with _cerrojo:
+        grupo = _ejecutores.get(procesos)
+        if grupo is None:
+            grupo = _ejecutores[procesos] = concurrent.futures.ProcessPoolExecutor(
+                procesos, mp_context=multiprocessing.get_context("spawn")
+            )
+        return grupo
+
+
+def en_orden(funcion, tramos, *argumentos, procesos=None):
+    """Resultados de funcion(tramo, *argumentos) de cada tramo, en orden, calculados en otros procesos.
+
+    Como mucho hay dos tramos por proceso en marcha: si los resultados se
+    consumen según llegan, no se acumulan en memoria.
+    """
+    tramos = list(tramos)
+    grupo = ejecutor(procesos)
+    limite = 2 * procesos_de(procesos)
+    pendientes = collections.deque()
+    with contextlib.ExitStack() as pila:
+        for tramo in tramos:
+            pila.enter_context(tramo.en_uso())
+        try:
+            for tramo in tramos:
+                pendientes.append(grupo.submit(funcion, tramo, *argumentos))
+                if len(pendientes) >= limite:
+                    yield pendientes.popleft().result()
+            while pendientes:
+                yield pendientes.popleft().result()
+        finally:
+            for futuro in pendientes:
+                futuro.cancel()
+
+
+def repartir(funcion, tramos, *argumentos, procesos=None):
+    """Lista con los resultados de en_orden()."""
+    return list(en_orden(funcion, tramos, *argumentos, procesos=procesos))
+
+
+@atexit.register
+def cerrar():
+    with _cerrojo:
+        ejecutores = list(_ejecutores.values())
+        _ejecutores.clear()
+    for grupo in ejecutores:
+        grupo.shutdown(cancel_futures=True)
@@ -0,0 +1,471 @@
+# ============================================
+# -------- DATOS REPARTIDOS EN PARTICIONES --------
+# ============================================
+# Los usuarios se reparten por un hash de su email en N particiones, y
+# cada factura va a la partición de su usuario. Cada partición es un
+# repositorio JSON o SQLite completo en su propio directorio:
+#
+#     data/particiones.json           {"generacion": 3, "particiones": 8, "backend": "json"}
+#     data/particiones.3/000/ ... 007/
+#
+# RepositorioParticionado encamina cada operación de un usuario (alta,
+# baja, sus facturas, su resumen) a su partición, que es la única que se
+# bloquea: varias instancias de la app escriben a la vez en particiones
+# distintas. Los IDs salen de una secuencia común en data/secuencias.json.
+# Los resúmenes globales se calculan en cada partición en paralelo, cada
+# una en un proceso propio, y se combinan al final (mapear()).
+#
+# Para repartir (o cambiar el número de particiones) con la app en marcha:
+#
+#     python proyecto/particiones.py data 8
+#
+# Se copia partición a partición a una generación nueva y al final se
+# cambia particiones.json de una vez; las instancias abiertas lo detectan
+# y pasan a la distribución nueva. Mientras dura la copia, las altas en
+# las particiones ya copiadas esperan. La primera vez (de un directorio
+# sin particiones a particiones) hay que hacerlo con la app parada.
+
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import operator
+import os
+import shutil
+import sys
+import threading
+import zlib
+
+import metricas
+from estadisticas import ResumenMensual
+from modelo import Factura, TablaFacturas, Usuario, como_factura, como_usuario
+from persistencia import escribir_atomico
+from repositorio import (
+    DISTRIBUCION_FILE, PREFIJO_FACTURA, PREFIJO_USUARIO, SECUENCIAS_FILE,
+    Repositorio, UsuarioDuplicado, UsuarioNoEncontrado, abrir_backend, orden_id,
+)
+from secuencias import AsignadorIds, SecuenciasArchivo
+
+LOTE_REPARTO = 50_000
+
+
+# -------- distribución --------
+def particion_de(email, particiones):
+    """Número de partición de un email (el mismo en todos los procesos, a diferencia de hash())."""
+    return zlib.crc32(email.encode("utf-8")) % particiones
+
+
+def leer_distribucion(directorio):
+    """Contenido de particiones.json, o None si el directorio no está particionado."""
+    ruta = os.path.join(directorio, DISTRIBUCION_FILE)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def firma_distribucion(directorio):
+    """Cambia cada vez que se reescribe particiones.json (sin tener que leerlo)."""
+    estado = os.stat(os.path.join(directorio, DISTRIBUCION_FILE))
+    return estado.st_ino, estado.st_mtime_ns
+
+
+def directorio_generacion(directorio, generacion):
+    return os.path.join(directorio, f"particiones.{generacion}")
+
+
+def directorio_particion(directorio, generacion, numero):
+    return os.path.join(directorio_generacion(directorio, generacion), f"{numero:03d}")
+
+
+def abrir_particion(ruta, backend):
+    os.makedirs(ruta, exist_ok=True)
+    return abrir_backend(ruta, backend)
+
+
+# -------- procesos de las particiones --------
+# Cada partición tiene un proceso propio que mantiene abierto su
+# repositorio entre una llamada y otra y lo pone al día antes de cada una.
+# Se arrancan con "spawn": hacer fork de un proceso con hilos (guardado en
+# segundo plano, sesiones de la app) puede heredar bloqueos tomados.
+_abiertas = {}
+
+
+def _en_proceso(ruta, backend, funcion):
+    repo = _abiertas.get(ruta)
+    if repo is None:
+        repo = _abiertas[ruta] = abrir_backend(ruta, backend)
+    repo.sincronizar()
+    return funcion(repo)
+
+
+class RepositorioParticionado(Repositorio):
+    """Usuarios y facturas repartidos por email en varios repositorios (ver arriba).
+
+    Las operaciones de un usuario solo bloquean su partición; transaccion()
+    bloquea todas (la usa, por ejemplo, la importación masiva). Un lote
+    se aplica como un único cambio en cada partición, pero no entre ellas.
+    """
+
+    def __init__(self, directorio):
+        super().__init__()
+        self.directorio = directorio
+        self._particiones = []
+        self._retiradas = []
+        self._procesos = None
+        self._pila = None
+        self._cerrojo_versiones = threading.Lock()
+        self._abrir()
+        self.ids = AsignadorIds(SecuenciasArchivo(os.path.join(directorio, SECUENCIAS_FILE)), self._siguiente_numero)
+
+    # -------- distribución --------
+    def _abrir(self):
+        firma = firma_distribucion(self.directorio)
+        distribucion = leer_distribucion(self.directorio)
+        self.generacion = distribucion["generacion"]
+        self.backend = distribucion["backend"]
+        self._rutas = [
+            directorio_particion(self.directorio, self.generacion, i) for i in range(distribucion["particiones"])
+        ]
+        anteriores = self._particiones
+        self._particiones = [abrir_particion(ruta, self.backend) for ruta in self._rutas]
+        self._firma = firma
+        # Las particiones anteriores pueden seguir en uso en otro hilo: se cierran en el siguiente cambio
+        for particion in self._retiradas:
+            particion.cerrar()
+        self._retiradas = anteriores
+        self._cerrar_procesos()
+        self._versiones = self._suma_versiones()
+        self._indice_busqueda = None
+        metricas.nivel("particiones", len(self._particiones))
+        if anteriores:
+            self.version += 1
+
+    def _comprobar_distribucion(self):
+        """Pasa a la distribución nueva si alguien ha repartido los datos otra vez."""
+        if firma_distribucion(self.directorio) != self._firma:
+            with self.cerrojo:
+                if firma_distribucion(self.directorio) != self._firma:
+                    self._abrir()
+
+    def particion(self, email):
+        """Repositorio de la partición donde está (o estaría) el usuario `email`."""
+        particiones = self._particiones
+        return particiones[particion_de(email, len(particiones))]
+
+    def _suma_versiones(self):
+        return sum(particion.version for particion in self._particiones)
+
+    # -------- transacciones --------
+    def _en_particion(self, email, operacion):
+        """Ejecuta operacion(partición) con solo la partición de `email` bloqueada."""
+        while True:
+            self._comprobar_distribucion()
+            firma = self._firma
+            particion = self.particion(email)
+            with particion.transaccion():
+                # Si se repartió mientras se esperaba el bloqueo, esta partición ya no vale
+                if firma_distribucion(self.directorio) != firma:
+                    continue
+                antes = particion.version
+                resultado = operacion(particion)
+                self._anotar_cambio(particion.version - antes)
+                return resultado
+
+    def _anotar_cambio(self, cambios):
+        # Solo se suman los cambios propios: los de otros procesos los detecta sincronizar().
+        # Con un cerrojo aparte: quien tiene `cerrojo` puede estar esperando a esta partición.
+        with self._cerrojo_versiones:
+            self._versiones += cambios
+            self.version += 1
+
+    def _empezar(self):
+        # Las particiones se bloquean siempre en el mismo orden (también al repartir)
+        while True:
+            self._comprobar_distribucion()
+            firma = self._firma
+            pila = contextlib.ExitStack()
+            try:
+                for particion in self._particiones:
+                    pila.enter_context(particion.transaccion())
+            except BaseException:
+                pila.close()
+                raise
+            if firma_distribucion(self.directorio) == firma:
+                self._pila = pila
+                return
+            pila.close()
+
+    def _terminar(self, ok):
+        pila, self._pila = self._pila, None
+        if ok:
+            pila.close()
+        else:
+            # Con la excepción en curso, cada partición deshace su parte
+            pila.__exit__(*sys.exc_info())
+
+    def sincronizar(self):
+        self._comprobar_distribucion()
+        for particion in self._particiones:
+            particion.sincronizar()
+        with self._cerrojo_versiones:
+            suma = self._suma_versiones()
+            if suma != self._versiones:
+                self._versiones = suma
+                self._indice_busqueda = None
+                self.version += 1
+
+    def _siguiente_numero(self, prefijo):
+        return max(particion._siguiente_numero(prefijo) for particion in self._particiones)
+
+    # -------- lectura de un usuario --------
+    def obtener_usuario(self, email):
+        return self.particion(email).obtener_usuario(email)
+
+    def obtener_usuarios(self, emails):
+        particiones = self._particiones
+        grupos = {}
+        for email in emails:
+            grupos.setdefault(particion_de(email, len(particiones)), []).append(email)
+        encontrados = {}
+        for numero, grupo in grupos.items():
+            encontrados.update(particiones[numero].obtener_usuarios(grupo))
+        return encontrados
+
+    def facturas_de(self, email, offset=0, limite=None):
+        return self.particion(email).facturas_de(email, offset, limite)
+
+    def resumen_de(self, email):
+        return self.particion(email).resumen_de(email)
+
+    # -------- lectura global --------
+    def usuarios(self):
+        return itertools.chain.from_iterable(p.usuarios() for p in self._particiones)
+
+    def pagina_usuarios(self, offset, limite):
+        pagina = []
+        for particion in self._particiones:
+            if len(pagina) >= limite:
+                break
+            total = particion.contar_usuarios()
+            if offset >= total:
+                offset -= total
+                continue
+            pagina.extend(particion.pagina_usuarios(offset, limite - len(pagina)))
+            offset = 0
+        return pagina
+
+    def usuarios_despues(self, despues, limite):
+        # Cada partición ya los da en orden de id: basta con mezclar sus primeras páginas
+        paginas = [particion.usuarios_despues(despues, limite) for particion in self._particiones]
+        return list(itertools.islice(heapq.merge(*paginas, key=lambda u: orden_id(u.id)), limite))
+
+    def emails(self):
+        return [email for particion in self._particiones for email in particion.emails()]
+
+    def contar_usuarios(self):
+        return sum(particion.contar_usuarios() for particion in self._particiones)
+
+    def facturas(self):
+        return itertools.chain.from_iterable(p.facturas() for p in self._particiones)
+
+    def contar_facturas(self):
+        return sum(particion.contar_facturas() for particion in self._particiones)
+
+    def tabla_facturas(self):
+        return TablaFacturas.unir([particion.tabla_facturas() for particion in self._particiones])
+
+    def tramos_facturas(self, tam):
+        return [tramo for particion in self._particiones for tramo in particion.tramos_facturas(tam)]
+
+    def resumen_mensual(self):
+        # Ya está materializado en cada partición: basta con sumarlos
+        resumen = ResumenMensual()
+        for particion in self._particiones:
+            resumen = resumen.combinado(particion.resumen_mensual())
+        return resumen
+
+    def resumen_por_usuario(self):
+        return [fila for filas in self.mapear(operator.methodcaller("resumen_por_usuario")) for fila in filas]
+
+    # -------- map/reduce --------
+    def _procesos_particiones(self):
+        if self._procesos is None:
+            contexto = multiprocessing.get_context("spawn")
+            self._procesos = [
+                concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=contexto) for _ in self._particiones
+            ]
+        return self._procesos
+
+    def _cerrar_procesos(self):
+        procesos, self._procesos = self._procesos, None
+        for proceso in procesos or ():
+            proceso.shutdown(wait=False)
+
+    @metricas.medido("mapear_particiones")
+    def mapear(self, funcion):
+        """Lista con funcion(repositorio) de cada partición, calculadas en paralelo.
+
+        `funcion` se ejecuta en el proceso de cada partición, así que tiene
+        que poder serializarse con pickle (una función de módulo, un
+        operator.methodcaller...), igual que lo que devuelva.
+        """
+        with self.cerrojo:
+            if len(self._particiones) == 1:
+                particion = self._particiones[0]
+                futuros = None
+            else:
+                futuros = [
+                    proceso.submit(_en_proceso, ruta, self.backend, funcion)
+                    for proceso, ruta in zip(self._procesos_particiones(), self._rutas)
+                ]
+        if futuros is None:
+            return [funcion(particion)]
+        return [futuro.result() for futuro in futuros]
+
+    # -------- escritura --------
+    def crear_usuario(self, datos):
+        usuario = Usuario.desde_dict({"id": self.ids.siguiente(PREFIJO_USUARIO), **datos})
+
+        def alta(particion):
+            if particion.obtener_usuario(usuario.email):
+                raise UsuarioDuplicado(usuario.email)
+            particion.agregar_usuario(usuario)
+
+        self._en_particion(usuario.email, alta)
+        self._indexar([usuario])
+        return usuario
+
+    def crear_factura(self, datos):
+        factura = Factura.desde_dict({"numero": self.ids.siguiente(PREFIJO_FACTURA), **datos})
+
+        def alta(particion):
+            if not particion.obtener_usuario(factura.email):
+                raise UsuarioNoEncontrado(factura.email)
+            particion.agregar_factura(factura)
+
+        self._en_particion(factura.email, alta)
+        return factura
+
+    def agregar_usuario(self, usuario):
+        usuario = como_usuario(usuario)
+        self._en_particion(usuario.email, lambda particion: particion.agregar_usuario(usuario))
+        self._indexar([usuario])
+
+    def eliminar_usuario(self, email):
+        self._en_particion(email, lambda particion: particion.eliminar_usuario(email))
+        with self.cerrojo:
+            if self._indice_busqueda is not None:
+                self._indice_busqueda.eliminar(email)
+
+    def agregar_factura(self, factura):
+        factura = como_factura(factura)
+        self._en_particion(factura.email, lambda particion: particion.agregar_factura(factura))
+
+    def agregar_lote(self, usuarios=(), facturas=()):
+        usuarios = list(map(como_usuario, usuarios))
+        facturas = list(map(como_factura, facturas))
+        with self.transaccion():
+            particiones = self._particiones
+            grupos = [([], []) for _ in particiones]
+            for usuario in usuarios:
+                grupos[particion_de(usuario.email, len(particiones))][0].append(usuario)
+            for factura in facturas:
+                grupos[particion_de(factura.email, len(particiones))][1].append(factura)
+            for particion, (suyos, suyas) in zip(particiones, grupos):
+                if suyos or suyas:
+                    antes = particion.version
+                    particion.agregar_lote(suyos, suyas)
+                    self._anotar_cambio(particion.version - antes)
+        self._indexar(usuarios)
+
+    def _indexar(self, usuarios):
+        with self.cerrojo:
+            if self._indice_busqueda is not None:
+                for usuario in usuarios:
+                    self._indice_busqueda.agregar(usuario)
+
+    def guardar(self):
+        for particion in self._particiones:
+            particion.guardar()
+
+    def vaciar(self):
+        for particion in self._particiones:
+            particion.vaciar()
+
+    def cerrar(self):
+        self._cerrar_procesos()
+        for particion in self._retiradas + self._particiones:
+            particion.cerrar()
+
+
+# ============================================
+# -------- REPARTO --------
+# ============================================
+
+def repartir(directorio, particiones, backend=None):
+    """Reparte los datos del directorio en `particiones` particiones nuevas.
+
+    Copia cada partición actual (o el directorio sin particionar) a una
+    generación nueva con su bloqueo tomado, y lo mantiene hasta cambiar
+    particiones.json, para que ningún alta se quede en la distribución
+    vieja. Se borran las generaciones anteriores a la que se sustituye
+    (esta se conserva para las instancias que aún no hayan cambiado).
+    Devuelve (usuarios, facturas) copiados.
+    """
+    if particiones < 1:
+        raise ValueError("Hace falta al menos una partición")
+    distribucion = leer_distribucion(directorio)
+    if distribucion is None:
+        backend = backend or os.environ.get("CRM_BACKEND", "json")
+        origenes = [abrir_backend(directorio, backend)]
+        generacion = 1
+    else:
+        backend = backend or distribucion["backend"]
+        origenes = [
+            abrir_particion(directorio_particion(directorio, distribucion["generacion"], i), distribucion["backend"])
+            for i in range(distribucion["particiones"])
+        ]
+        generacion = distribucion["generacion"] + 1
+
+    # Restos de un reparto anterior que no llegó a terminar
+    shutil.rmtree(directorio_generacion(directorio, generacion), ignore_errors=True)
+    destinos = [abrir_particion(directorio_particion(directorio, generacion, i), backend) for i in range(particiones)]
+    usuarios = facturas = 0
+    with contextlib.ExitStack() as bloqueos:
+        for origen in origenes:
+            bloqueos.enter_context(origen.transaccion())
+            grupos = [([], []) for _ in destinos]
+            for usuario in origen.usuarios():
+                grupos[particion_de(usuario.email, particiones)][0].append(usuario)
+            for factura in origen.facturas():
+                grupos[particion_de(factura.email, particiones)][1].append(factura)
+            for destino, (suyos, suyas) in zip(destinos, grupos):
+                usuarios += len(suyos)
+                facturas += len(suyas)
+                # Por trozos, para no dejar una sola línea enorme en el diario
+                for i in range(0, max(len(suyos), len(suyas)), LOTE_REPARTO):
+                    destino.agregar_lote(suyos[i:i + LOTE_REPARTO], suyas[i:i + LOTE_REPARTO])
+        for destino in destinos:
+            destino.guardar()
+            destino.cerrar()
+        escribir_atomico(
+            os.path.join(directorio, DISTRIBUCION_FILE),
+            json.dumps({"generacion": generacion, "particiones": particiones, "backend": backend}),
+        )
+    for origen in origenes:
+        origen.cerrar()
+    if distribucion is not None:
+        for anterior in range(1, distribucion["generacion"]):
+            shutil.rmtree(directorio_generacion(directorio, anterior), ignore_errors=True)
+    return usuarios, facturas
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("Uso: python proyecto/particiones.py <directorio> <particiones> [json|sqlite]")
+    directorio, numero = sys.argv[1], int(sys.argv[2])
+    n_usuarios, n_facturas = repartir(directorio, numero, sys.argv[3] if len(sys.argv) > 3 else None)
+    print(f"Repartidos {n_usuarios} usuarios y {n_facturas} facturas en {numero} particiones")
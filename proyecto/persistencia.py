@@ -0,0 +1,489 @@
+# ============================================
+# -------- PERSISTENCIA CON DIARIO DE CAMBIOS --------
+# ============================================
+# Los datos se guardan como una "foto" completa (usuarios.json y
+# facturas.<generación>.dat) más un diario de cambios en formato JSON-lines.
+# Cada alta o baja solo añade una línea al diario, así que el coste de
+# guardar depende del tamaño del cambio y no del total de datos.
+# Cada cierto número de cambios el diario se compacta en la foto.
+#
+# La primera línea del diario indica la "generación" de la foto a la que
+# se refiere. Así otro proceso que comparta los ficheros puede saber si
+# solo tiene que leer las líneas nuevas o si hubo una compactación y debe
+# recargarlo todo.
+#
+# La foto se escribe en JSON compacto o en MessagePack (ver
+# serializacion.py); al leerla el formato se detecta solo. Las facturas no
+# se cargan enteras: su foto se abre con mmap y se lee bajo demanda (ver
+# almacen.py). Cada compactación escribe la foto de facturas de la
+# generación siguiente en un fichero nuevo y solo borra la anterior cuando
+# el diario ya apunta a la nueva; así un corte a medias nunca deja el
+# diario sin su foto. El facturas.json de versiones anteriores se lee
+# (entero) mientras no haya foto de facturas; la compactación no lo borra
+# ni lo actualiza. Para volver a escribir los datos en ese formato (que
+# pueden leer las versiones anteriores) está exportar_json().
+#
+# La compactación se hace en tres pasos para no bloquear las escrituras
+# mientras se vuelca la foto (ver Compactacion): con el bloqueo puesto se
+# toma una copia del estado; sin él se escriben los ficheros nuevos con
+# nombres provisionales; y de nuevo con el bloqueo se renombran y el
+# diario nuevo empieza con los cambios que llegaron entretanto. Solo se
+# reescriben las partes que cambiaron: la cabecera del diario indica la
+# generación de la foto de facturas vigente, que puede ser anterior.
+
+import contextlib
+import gc
+import glob
+import json
+import os
+import threading
+
+import metricas
+from almacen import AlmacenFacturas, FotoFacturas, escribir_foto_facturas, foto_en_uso
+from modelo import Usuario, como_factura
+from serializacion import (
+    codificar_foto, codificar_json, decodificar_foto, decodificar_json,
+    facturas_de_columnas, formato_por_defecto,
+)
+
+MAX_ENTRADAS_DIARIO = 500
+
+# Ficheros provisionales que están escribiendo las compactaciones de este proceso
+_provisionales_en_curso = set()
+_cerrojo_provisionales = threading.Lock()
+
+
+@contextlib.contextmanager
+def sin_recolector():
+    """Pausa el recolector de ciclos mientras se crean millones de objetos que no forman ciclos."""
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo:
+            gc.enable()
+
+
+def leer_foto(ruta, por_defecto):
+    """Lee un fichero de la foto (JSON o MessagePack) o devuelve el valor por defecto si no existe."""
+    if not os.path.exists(ruta):
+        return por_defecto
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    metricas.contar("bytes_leidos", "cargar_datos", len(contenido))
+    return decodificar_foto(contenido)
+
+
+def escribir_atomico(ruta, contenido):
+    """Escribe en un temporal y lo renombra para no dejar nunca un fichero a medias.
+
+    `contenido` puede ser texto o bytes.
+    """
+    tmp = f"{ruta}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(contenido.encode("utf-8") if isinstance(contenido, str) else contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def escribir_foto_atomico(ruta, datos, formato="json"):
+    contenido = codificar_foto(datos, formato)
+    escribir_atomico(ruta, contenido)
+    return len(contenido)
+
+
+def exportar_json(usuarios, facturas, usuarios_file, facturas_file):
+    """Escribe usuarios y facturas en el formato JSON de las versiones anteriores.
+
+    usuarios.json es un objeto {email: usuario} y facturas.json una lista,
+    con una factura por línea y sin escapar los acentos. Devuelve
+    (usuarios, facturas) escritos.
+    """
+    usuarios = {usuario.email: usuario.a_dict() for usuario in usuarios}
+    escribir_atomico(usuarios_file, json.dumps(usuarios, indent=4, ensure_ascii=False))
+    n_facturas = 0
+    tmp = f"{facturas_file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for factura in facturas:
+            f.write(",\n" if n_facturas else "\n")
+            f.write(json.dumps(como_factura(factura).a_dict(), ensure_ascii=False))
+            n_facturas += 1
+        f.write("\n]\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, facturas_file)
+    return len(usuarios), n_facturas
+
+
+def proceso_vivo(pid):
+    """Si sigue en marcha el proceso `pid`. En Windows se supone que sí: allí os.kill lo terminaría."""
+    if pid == os.getpid() or os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # existe, pero es de otro usuario
+        return True
+    return True
+
+
+def provisional_abandonado(ruta):
+    """Si un fichero provisional de compactación (o su .tmp) ya no lo va a confirmar nadie.
+
+    Lo es si el proceso que lo escribía ha terminado, o si es de este
+    proceso y ninguna de sus compactaciones lo está escribiendo. Los de
+    otros procesos en marcha no se tocan: ellos mismos los renombran o los
+    descartan.
+    """
+    base = ruta[:-len(".tmp")] if ruta.endswith(".tmp") else ruta
+    try:
+        pid = int(base.rsplit(".pendiente-", 1)[1].split("-")[1])
+    except (IndexError, ValueError):
+        return False
+    if pid != os.getpid():
+        return not proceso_vivo(pid)
+    with _cerrojo_provisionales:
+        return base not in _provisionales_en_curso
+
+
+def linea_diario(operacion, **datos):
+    return codificar_json({"op": operacion, **datos}) + b"\n"
+
+
+def clave_factura(factura):
+    """Identifica una factura por su contenido completo."""
+    return tuple(sorted(como_factura(factura).a_dict().items()))
+
+
+def _poner_factura(facturas, factura, claves):
+    if claves is None:
+        facturas.agregar(factura)
+        return
+    clave = clave_factura(factura)
+    if clave not in claves:
+        facturas.agregar(factura)
+        claves.add(clave)
+
+
+def colecciones_de(entrada):
+    """Qué partes de la foto ("usuarios", "facturas") cambia una entrada del diario."""
+    operacion = entrada["op"]
+    if operacion == "alta_usuario":
+        return {"usuarios"}
+    if operacion == "alta_factura":
+        return {"facturas"}
+    if operacion == "baja_usuario":
+        return {"usuarios", "facturas"}
+    if operacion == "lote":
+        return {nombre for nombre in ("usuarios", "facturas") if entrada[nombre]}
+    return set()
+
+
+def aplicar_cambio(usuarios, facturas, entrada, claves=None):
+    """Aplica una entrada del diario sobre los usuarios y el AlmacenFacturas.
+
+    Con `claves` (las de las facturas ya presentes), reaplicar una entrada
+    ya incluida en la foto no tiene efecto: las altas de usuario
+    sobrescriben y las facturas ya presentes se ignoran. Solo hace falta
+    con las fotos de versiones anteriores.
+    """
+    operacion = entrada["op"]
+    if operacion == "inicio":
+        return
+    if operacion == "alta_usuario":
+        usuario = Usuario.desde_dict(entrada["usuario"])
+        usuarios[usuario.email] = usuario
+    elif operacion == "baja_usuario":
+        email = entrada["email"]
+        usuarios.pop(email, None)
+        facturas.eliminar_email(email)
+        if claves is not None:
+            claves.clear()
+            claves.update(map(clave_factura, facturas))
+    elif operacion == "alta_factura":
+        _poner_factura(facturas, entrada["factura"], claves)
+    elif operacion == "lote":
+        for usuario in map(Usuario.desde_dict, entrada["usuarios"]):
+            usuarios[usuario.email] = usuario
+        for factura in entrada["facturas"]:
+            _poner_factura(facturas, factura, claves)
+    else:
+        raise ValueError(f"Operación desconocida en el diario: {operacion}")
+
+
+class Diario:
+    """Foto de usuarios y facturas más un diario de cambios incremental.
+
+    `generacion` y `posicion` indican hasta dónde se ha leído el diario, para
+    poder incorporar después solo lo que hayan añadido otros procesos.
+    Quien comparta los ficheros entre procesos debe usar un bloqueo externo.
+    """
+
+    def __init__(self, usuarios_file, facturas_file, diario_file, max_entradas=MAX_ENTRADAS_DIARIO, formato=None):
+        self.usuarios_file = usuarios_file
+        self.facturas_file = facturas_file
+        self.diario_file = diario_file
+        self.max_entradas = max_entradas
+        self.formato = formato or formato_por_defecto()
+        self.entradas = 0
+        self.generacion = 0
+        self.foto_facturas = 0      # generación de la foto de facturas vigente
+        self.posicion = 0
+        self.sucias = set()         # partes de la foto con cambios en el diario
+
+    def ruta_facturas(self, generacion):
+        """Foto de facturas de una generación: facturas.<generación>.dat junto a facturas.json."""
+        return f"{os.path.splitext(self.facturas_file)[0]}.{generacion}.dat"
+
+    def cargar(self):
+        """Carga los usuarios, abre la foto de facturas y reproduce encima los cambios pendientes del diario.
+
+        Devuelve ({email: Usuario}, AlmacenFacturas).
+        """
+        with sin_recolector():
+            usuarios = {email: Usuario.desde_dict(datos) for email, datos in leer_foto(self.usuarios_file, {}).items()}
+        self.generacion, self.foto_facturas = self._leer_cabecera()
+        self.posicion = 0
+        self.entradas = 0
+        self.sucias = set()
+        ruta = self.ruta_facturas(self.foto_facturas)
+        legado = not os.path.exists(ruta)
+        if legado:
+            with sin_recolector():
+                facturas = leer_foto(self.facturas_file, [])
+                if isinstance(facturas, dict):
+                    facturas = facturas_de_columnas(facturas)
+                facturas = AlmacenFacturas(facturas=facturas)
+        else:
+            facturas = AlmacenFacturas(FotoFacturas(ruta))
+            metricas.contar("bytes_leidos", "cargar_datos", os.path.getsize(ruta))
+        claves = None
+        for entrada in self._leer_desde(0):
+            if entrada["op"] == "inicio":
+                continue
+            # Con la foto antigua (que no sabe a qué generación pertenece) las
+            # facturas se deduplican por contenido, y las claves solo hacen
+            # falta si hay cambios que reproducir
+            if legado and claves is None:
+                claves = set(map(clave_factura, facturas))
+            aplicar_cambio(usuarios, facturas, entrada, claves)
+            self.sucias |= colecciones_de(entrada)
+            self.entradas += 1
+        metricas.contar("bytes_leidos", "cargar_datos", self.posicion)
+        if os.path.exists(self.diario_file) and self.posicion < os.path.getsize(self.diario_file):
+            with open(self.diario_file, "r+b") as f:
+                f.truncate(self.posicion)
+        return usuarios, facturas
+
+    def _leer_cabecera(self):
+        """(generación del diario, generación de la foto de facturas)."""
+        if not os.path.exists(self.diario_file):
+            return 0, 0
+        with open(self.diario_file, "rb") as f:
+            primera = f.readline()
+        try:
+            entrada = decodificar_json(primera)
+        except ValueError:
+            return 0, 0
+        if entrada.get("op") != "inicio":
+            return 0, 0
+        generacion = entrada.get("generacion", 0)
+        return generacion, entrada.get("facturas", generacion)
+
+    def _leer_generacion(self):
+        return self._leer_cabecera()[0]
+
+    def _leer_desde(self, posicion):
+        """Entradas completas del diario a partir de `posicion`; avanza self.posicion."""
+        if not os.path.exists(self.diario_file):
+            return
+        with open(self.diario_file, "rb") as f:
+            f.seek(posicion)
+            for linea in f:
+                # Una línea sin salto final o ilegible es una escritura que
+                # se cortó a medias: se descarta junto con lo que venga detrás.
+                if not linea.endswith(b"\n"):
+                    break
+                try:
+                    entrada = decodificar_json(linea)
+                except ValueError:
+                    break
+                posicion += len(linea)
+                self.posicion = posicion
+                yield entrada
+
+    def leer_nuevas(self):
+        """Entradas añadidas por otros procesos desde la última lectura.
+
+        Devuelve None si entretanto se compactó el diario, en cuyo caso hay
+        que volver a cargarlo todo.
+        """
+        if self._leer_generacion() != self.generacion:
+            return None
+        if os.path.exists(self.diario_file) and os.path.getsize(self.diario_file) < self.posicion:
+            return None
+        nuevas = [e for e in self._leer_desde(self.posicion) if e["op"] != "inicio"]
+        self.entradas += len(nuevas)
+        for entrada in nuevas:
+            self.sucias |= colecciones_de(entrada)
+        return nuevas
+
+    @metricas.medido("anotar_diario")
+    def anotar(self, operacion, **datos):
+        """Añade un cambio al final del diario y lo fuerza a disco."""
+        linea = linea_diario(operacion, **datos)
+        with open(self.diario_file, "ab") as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+        self.posicion += len(linea)
+        self.entradas += 1
+        self.sucias |= colecciones_de({"op": operacion, **datos})
+        metricas.contar("bytes_escritos", "diario", len(linea))
+
+    def necesita_compactar(self):
+        return self.entradas >= self.max_entradas
+
+    @metricas.medido("guardar_datos_bloqueo")
+    def preparar(self, usuarios, facturas):
+        """Primer paso de la compactación, con el bloqueo puesto: copia lo que haya que escribir.
+
+        Devuelve None si la foto ya está al día.
+        """
+        sucias = set(self.sucias)
+        if not os.path.exists(self.ruta_facturas(self.foto_facturas)):
+            sucias.add("facturas")
+        if not sucias:
+            return None
+        return Compactacion(self, usuarios, facturas, sucias)
+
+    @metricas.medido("guardar_datos_bloqueo")
+    def confirmar(self, compactacion, usuarios, facturas):
+        """Último paso, con el bloqueo puesto: pone en uso los ficheros escritos.
+
+        Los cambios anotados desde preparar() pasan al diario nuevo. Si
+        entretanto otro proceso (u otro hilo) ya compactó, se descarta lo
+        escrito. Devuelve el AlmacenFacturas que hay que usar a partir de ahora.
+        """
+        if compactacion.generacion != self.generacion:
+            compactacion.descartar()
+            return facturas
+        cola = b""
+        if self.posicion > compactacion.posicion:
+            with open(self.diario_file, "rb") as f:
+                f.seek(compactacion.posicion)
+                cola = f.read(self.posicion - compactacion.posicion)
+        generacion = self.generacion + 1
+        foto = generacion if compactacion.facturas is not None else self.foto_facturas
+        ruta = self.ruta_facturas(foto)
+        if compactacion.facturas is not None:
+            os.replace(compactacion.ruta_facturas, ruta)
+        if compactacion.usuarios is not None:
+            os.replace(compactacion.ruta_usuarios, self.usuarios_file)
+        compactacion.terminar()
+        cabecera = linea_diario("inicio", generacion=generacion, facturas=foto)
+        escribir_atomico(self.diario_file, cabecera + cola)
+        entradas = [decodificar_json(linea) for linea in cola.splitlines()]
+        self.generacion = generacion
+        self.foto_facturas = foto
+        self.posicion = len(cabecera) + len(cola)
+        self.entradas = len(entradas)
+        self.sucias = set()
+        for entrada in entradas:
+            self.sucias |= colecciones_de(entrada)
+        self._borrar_fotos_antiguas(ruta)
+        if compactacion.facturas is None:
+            return facturas
+        nuevas = AlmacenFacturas(FotoFacturas(ruta, compactacion.tabla_facturas))
+        for entrada in entradas:
+            aplicar_cambio({}, nuevas, entrada)
+        return nuevas
+
+    def _borrar_fotos_antiguas(self, actual):
+        # Quien aún recorra una foto antigua la sigue leyendo por su mmap.
+        # En Windows no se puede borrar un fichero abierto con mmap: se
+        # queda y se vuelve a intentar en la siguiente compactación.
+        base = glob.escape(os.path.splitext(self.facturas_file)[0])
+        antiguas = glob.glob(base + ".*.dat")
+        # Ficheros provisionales que ya no se van a confirmar (p. ej. los
+        # dejó un proceso que se cortó a medias)
+        provisionales = glob.glob(base + ".*.dat.pendiente-*") + glob.glob(glob.escape(self.usuarios_file) + ".pendiente-*")
+        antiguas += filter(provisional_abandonado, provisionales)
+        # El facturas.json de versiones anteriores no se borra nunca (ver exportar_json)
+        for ruta in antiguas:
+            # Las que aún leen otros procesos de este (paralelo.py) se borran en la siguiente
+            if ruta != actual and os.path.exists(ruta) and not foto_en_uso(ruta):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+
+class Compactacion:
+    """Copia del estado tomada en Diario.preparar, que se escribe sin el bloqueo puesto.
+
+    Los ficheros se escriben con nombres provisionales (propios de la
+    generación, el proceso y el hilo) que Diario.confirmar renombra a los
+    definitivos.
+    """
+
+    def __init__(self, diario, usuarios, facturas, sucias):
+        self.diario = diario
+        self.generacion = diario.generacion
+        self.posicion = diario.posicion
+        # Los Usuario no se modifican (se sustituyen), así que basta con copiar el dict
+        self.usuarios = dict(usuarios) if "usuarios" in sucias else None
+        self.facturas = facturas.instantanea() if "facturas" in sucias else None
+        sufijo = f"pendiente-{self.generacion + 1}-{os.getpid()}-{threading.get_ident()}"
+        self.ruta_usuarios = f"{diario.usuarios_file}.{sufijo}"
+        self.ruta_facturas = f"{diario.ruta_facturas(self.generacion + 1)}.{sufijo}"
+        self.tabla_facturas = None
+        with _cerrojo_provisionales:
+            _provisionales_en_curso.update((self.ruta_usuarios, self.ruta_facturas))
+
+    def terminar(self):
+        """Los provisionales ya se han renombrado o borrado."""
+        with _cerrojo_provisionales:
+            _provisionales_en_curso.difference_update((self.ruta_usuarios, self.ruta_facturas))
+
+    @metricas.medido("guardar_datos")
+    def escribir(self):
+        # Sin recolector: con millones de objetos vivos, cada pasada completa
+        # retiene el GIL y frenaría a los hilos que atienden a los usuarios
+        try:
+            with sin_recolector():
+                escritos, filas = self._escribir()
+        except BaseException:
+            self.descartar()
+            raise
+        metricas.contar("bytes_escritos", "guardar_datos", escritos)
+        metricas.contar("filas", "guardar_datos", filas)
+
+    def _escribir(self):
+        escritos = filas = 0
+        if self.facturas is not None:
+            escritos_facturas, self.tabla_facturas = escribir_foto_facturas(
+                self.ruta_facturas, self.facturas, self.diario.formato
+            )
+            escritos += escritos_facturas
+            filas += len(self.facturas)
+        if self.usuarios is not None:
+            escritos += escribir_foto_atomico(
+                self.ruta_usuarios,
+                {email: usuario.a_dict() for email, usuario in self.usuarios.items()},
+                self.diario.formato,
+            )
+            filas += len(self.usuarios)
+        return escritos, filas
+
+    def descartar(self):
+        for ruta in (self.ruta_usuarios, self.ruta_facturas):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        self.terminar()
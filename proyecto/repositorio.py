@@ -0,0 +1,904 @@
+# ============================================
+# -------- CAPA DE ALMACENAMIENTO --------
+# ============================================
+# La app de Streamlit y el CRM por consola acceden a los datos a través
+# de un mismo "repositorio", de forma que se puede cambiar dónde se
+# guardan (JSON o SQLite) sin tocar las pantallas.
+#
+# Backend por defecto: JSON con diario de cambios (ver persistencia.py).
+# Para usar SQLite: CRM_BACKEND=sqlite y, la primera vez, migrar los
+# JSON existentes con:
+#
+#     python proyecto/repositorio.py data
+#
+# Para volver a escribir usuarios.json y facturas.json en el formato de
+# versiones anteriores (con cualquier backend):
+#
+#     python proyecto/repositorio.py data --json
+
+import bisect
+import contextlib
+import datetime
+import heapq
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+
+import metricas
+from bloqueo import BloqueoArchivo
+from busqueda import IndiceBusqueda, LIMITE_RESULTADOS
+from estadisticas import ResumenMensual
+from guardado import GuardadoEnSegundoPlano
+from indices import en_euros
+from modelo import (
+    CAMPOS_USUARIO, CAMPOS_FACTURA, CODIGO_ESTADO, Factura, TablaFacturas, Usuario, como_factura, como_usuario,
+    tramos_de_lista,
+)
+from persistencia import Diario, exportar_json, sin_recolector
+from secuencias import AsignadorIds, SecuenciasArchivo, SecuenciasSQLite, numero_de_id
+
+USUARIOS_FILE = "usuarios.json"
+FACTURAS_FILE = "facturas.json"
+DIARIO_FILE = "diario.jsonl"
+DB_FILE = "crm.db"
+SECUENCIAS_FILE = "secuencias.json"
+DISTRIBUCION_FILE = "particiones.json"
+
+PREFIJO_USUARIO = "USR"
+PREFIJO_FACTURA = "FAC"
+
+
+def orden_id(identificador):
+    """Clave para ordenar usuarios por id: por su número ("USR000010" va después de "USR000009")."""
+    return numero_de_id(identificador, PREFIJO_USUARIO), identificador
+
+
+def _orden_usuario(usuario):
+    return orden_id(usuario.id)
+
+
+class ErrorRepositorio(Exception):
+    """Operación rechazada por el estado actual de los datos."""
+
+
+class UsuarioDuplicado(ErrorRepositorio):
+    pass
+
+
+class UsuarioNoEncontrado(ErrorRepositorio):
+    pass
+
+
+class Repositorio:
+    """Interfaz común de acceso a usuarios y facturas.
+
+    Los usuarios y facturas se devuelven como registros Usuario y Factura
+    (ver modelo.py); las escrituras aceptan registros o diccionarios.
+    Las escrituras pasan siempre por los métodos públicos, que incrementan
+    `version` para que quien tenga datos derivados sepa cuándo recalcular.
+    Un mismo repositorio se comparte entre todas las sesiones de la app:
+    las escrituras se hacen dentro de `transaccion()`, que las serializa
+    entre hilos y, según el backend, también entre procesos.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._indice_busqueda = None
+        self.cerrojo = threading.RLock()
+        self._profundidad = 0
+        self.ids = None
+
+    # -------- transacciones --------
+    @contextlib.contextmanager
+    def transaccion(self):
+        """Ejecuta el bloque en exclusiva y con los datos al día; se puede anidar."""
+        with self.cerrojo:
+            externa = self._profundidad == 0
+            if externa:
+                self._empezar()
+            self._profundidad += 1
+            try:
+                yield
+            except BaseException:
+                self._profundidad -= 1
+                if externa:
+                    self._terminar(ok=False)
+                raise
+            self._profundidad -= 1
+            if externa:
+                self._terminar(ok=True)
+
+    def _empezar(self):
+        pass
+
+    def _terminar(self, ok):
+        pass
+
+    def sincronizar(self):
+        """Incorpora los cambios que hayan hecho otros procesos."""
+
+    def _siguiente_numero(self, prefijo):
+        """Primer número libre según los IDs ya guardados (solo para iniciar la secuencia)."""
+        raise NotImplementedError
+
+    # -------- lectura --------
+    def obtener_usuario(self, email):
+        raise NotImplementedError
+
+    def usuarios(self):
+        raise NotImplementedError
+
+    def obtener_usuarios(self, emails):
+        """Diccionario email -> usuario de los emails indicados que existen."""
+        encontrados = {}
+        for email in emails:
+            usuario = self.obtener_usuario(email)
+            if usuario:
+                encontrados[email] = usuario
+        return encontrados
+
+    def pagina_usuarios(self, offset, limite):
+        """Lista de como mucho `limite` usuarios a partir de la posición `offset`."""
+        return list(itertools.islice(self.usuarios(), offset, offset + limite))
+
+    def usuarios_despues(self, despues, limite):
+        """Como mucho `limite` usuarios en orden de id, empezando por el siguiente al id `despues`.
+
+        Paginación por clave: cada página cuesta lo mismo esté donde esté, y
+        las altas y bajas entre dos páginas no repiten ni saltan usuarios.
+        Con `despues` None se empieza por el primero.
+        """
+        usuarios = self.usuarios()
+        if despues is not None:
+            desde = orden_id(despues)
+            usuarios = (u for u in usuarios if _orden_usuario(u) > desde)
+        return heapq.nsmallest(limite, usuarios, key=_orden_usuario)
+
+    def emails(self):
+        return [u["email"] for u in self.usuarios()]
+
+    def contar_usuarios(self):
+        raise NotImplementedError
+
+    def facturas(self):
+        raise NotImplementedError
+
+    def facturas_de(self, email, offset=0, limite=None):
+        """Facturas del usuario; con `limite` devuelve solo esa página."""
+        raise NotImplementedError
+
+    def contar_facturas(self):
+        raise NotImplementedError
+
+    def tabla_facturas(self):
+        """Todas las facturas por columnas (TablaFacturas), para estadísticas."""
+        return TablaFacturas.desde_facturas(self.facturas())
+
+    def tramos_facturas(self, tam):
+        """Las facturas en tramos de como mucho `tam` que se pueden leer desde otro proceso (ver paralelo.py)."""
+        return tramos_de_lista(list(self.facturas()), tam)
+
+    def resumen_mensual(self):
+        """Facturas, importe y suma de cuadrados por mes y estado (estadisticas.ResumenMensual)."""
+        tabla = self.tabla_facturas()
+        return ResumenMensual.desde_columnas(tabla.marcas, tabla.centimos, tabla.estados)
+
+    def resumen_por_usuario(self):
+        """Número de facturas e importes total, pagado y pendiente de cada usuario."""
+        raise NotImplementedError
+
+    def resumen_de(self, email):
+        """Como resumen_por_usuario, pero solo para un usuario."""
+        raise NotImplementedError
+
+    # -------- búsqueda --------
+    @property
+    def indice_busqueda(self):
+        """Índice de búsqueda, construido la primera vez que se usa."""
+        if self._indice_busqueda is None:
+            with self.cerrojo:
+                if self._indice_busqueda is None:
+                    with metricas.cronometro("indice_busqueda"):
+                        self._indice_busqueda = IndiceBusqueda(self.usuarios())
+        return self._indice_busqueda
+
+    @metricas.medido("buscar_usuarios")
+    def buscar_usuarios(self, consulta, limite=LIMITE_RESULTADOS):
+        """Usuarios con palabras en nombre, email, teléfono o dirección que empiezan por las de la consulta."""
+        with self.cerrojo:
+            emails = self.indice_busqueda.buscar(consulta, limite)
+        return [u for u in map(self.obtener_usuario, emails) if u]
+
+    def autocompletar(self, prefijo, limite=10):
+        with self.cerrojo:
+            return self.indice_busqueda.autocompletar(prefijo, limite)
+
+    # -------- escritura --------
+    # El id se pide antes de abrir la transacción: la secuencia tiene su
+    # propio bloqueo y, si el alta falla, solo queda un hueco en la numeración.
+    def crear_usuario(self, datos):
+        """Asigna un id al usuario y lo da de alta; falla si el email ya existe."""
+        usuario = Usuario.desde_dict({"id": self.ids.siguiente(PREFIJO_USUARIO), **datos})
+        with self.transaccion():
+            if self.obtener_usuario(datos["email"]):
+                raise UsuarioDuplicado(datos["email"])
+            self.agregar_usuario(usuario)
+        return usuario
+
+    def crear_factura(self, datos):
+        """Asigna un número a la factura y la registra; falla si el cliente no existe."""
+        factura = Factura.desde_dict({"numero": self.ids.siguiente(PREFIJO_FACTURA), **datos})
+        with self.transaccion():
+            if not self.obtener_usuario(datos["email"]):
+                raise UsuarioNoEncontrado(datos["email"])
+            self.agregar_factura(factura)
+        return factura
+
+    def agregar_usuario(self, usuario):
+        usuario = como_usuario(usuario)
+        with self.transaccion():
+            self._agregar_usuario(usuario)
+            if self._indice_busqueda is not None:
+                self._indice_busqueda.agregar(usuario)
+            self.version += 1
+
+    def eliminar_usuario(self, email):
+        """Elimina el usuario y todas sus facturas."""
+        with self.transaccion():
+            if not self.obtener_usuario(email):
+                raise UsuarioNoEncontrado(email)
+            self._eliminar_usuario(email)
+            if self._indice_busqueda is not None:
+                self._indice_busqueda.eliminar(email)
+            self.version += 1
+
+    def agregar_factura(self, factura):
+        factura = como_factura(factura)
+        with self.transaccion():
+            self._agregar_factura(factura)
+            self.version += 1
+
+    def agregar_lote(self, usuarios=(), facturas=()):
+        """Alta de muchos usuarios y facturas ya validados como un único cambio."""
+        usuarios = list(map(como_usuario, usuarios))
+        facturas = list(map(como_factura, facturas))
+        with self.transaccion():
+            self._agregar_lote(usuarios, facturas)
+            if self._indice_busqueda is not None:
+                for usuario in usuarios:
+                    self._indice_busqueda.agregar(usuario)
+            self.version += 1
+
+    def guardar(self):
+        """Deja en disco una copia completa y consistente de los datos."""
+
+    def vaciar(self):
+        """Espera a que terminen los guardados en segundo plano pendientes."""
+
+    def cerrar(self):
+        pass
+
+
+# ============================================
+# -------- BACKEND JSON --------
+# ============================================
+
+class RepositorioJSON(Repositorio):
+    """Usuarios en memoria y facturas leídas bajo demanda de la foto, más un diario de cambios.
+
+    Cada escritura bloquea el diario a nivel de sistema operativo e
+    incorpora antes lo que hayan anotado otros procesos, de modo que no se
+    pisan cambios aunque varias instancias compartan el directorio.
+    Cuando el diario crece, la compactación se hace en segundo plano (ver
+    guardado.py) y el bloqueo solo se toma al principio y al final de ella.
+    """
+
+    def __init__(self, directorio):
+        super().__init__()
+        self.diario = Diario(
+            os.path.join(directorio, USUARIOS_FILE),
+            os.path.join(directorio, FACTURAS_FILE),
+            os.path.join(directorio, DIARIO_FILE),
+        )
+        self.bloqueo = BloqueoArchivo(self.diario.diario_file + ".lock")
+        self._cambios_en_memoria = False
+        with self.bloqueo:
+            self._cargar()
+        self.ids = AsignadorIds(SecuenciasArchivo(os.path.join(directorio, SECUENCIAS_FILE)), self._siguiente_numero)
+        self.guardado = GuardadoEnSegundoPlano(self.guardar)
+
+    def _cargar(self):
+        # Las facturas quedan en un AlmacenFacturas que las lee de disco bajo demanda
+        with sin_recolector():
+            self._usuarios, self._facturas = self.diario.cargar()
+        self._indice_busqueda = None
+        self._por_id = None
+
+    # -------- sincronización entre procesos --------
+    def _empezar(self):
+        self.bloqueo.adquirir()
+        self._cambios_en_memoria = False
+        try:
+            self._ponerse_al_dia()
+        except BaseException:
+            self.bloqueo.liberar()
+            raise
+
+    def _terminar(self, ok):
+        try:
+            if not ok and self._cambios_en_memoria:
+                # Una escritura falló a medias: se vuelve a lo que hay en disco,
+                # que tiene el cambio entero o no lo tiene
+                self._cargar()
+                self.version += 1
+        finally:
+            self._cambios_en_memoria = False
+            self.bloqueo.liberar()
+
+    def sincronizar(self):
+        with self.transaccion():
+            pass
+
+    def _ponerse_al_dia(self):
+        nuevas = self.diario.leer_nuevas()
+        if nuevas is None:
+            self._cargar()
+            self.version += 1
+        elif nuevas:
+            for entrada in nuevas:
+                self._aplicar(entrada)
+            self.version += 1
+
+    def _aplicar(self, entrada):
+        """Aplica en memoria un cambio anotado por otro proceso."""
+        operacion = entrada["op"]
+        if operacion == "alta_usuario":
+            usuario = Usuario.desde_dict(entrada["usuario"])
+            self._poner_usuario(usuario)
+            if self._indice_busqueda is not None:
+                self._indice_busqueda.agregar(usuario)
+        elif operacion == "baja_usuario":
+            self._quitar_usuario(entrada["email"])
+            if self._indice_busqueda is not None:
+                self._indice_busqueda.eliminar(entrada["email"])
+        elif operacion == "alta_factura":
+            self._poner_factura(entrada["factura"])
+        elif operacion == "lote":
+            for usuario in map(Usuario.desde_dict, entrada["usuarios"]):
+                self._poner_usuario(usuario)
+                if self._indice_busqueda is not None:
+                    self._indice_busqueda.agregar(usuario)
+            for factura in entrada["facturas"]:
+                self._poner_factura(factura)
+
+    def _siguiente_numero(self, prefijo):
+        with self.transaccion():
+            if prefijo == PREFIJO_USUARIO:
+                ids = (u["id"] for u in self._usuarios.values())
+            else:
+                ids = (f["numero"] for f in self._facturas)
+            return max((numero_de_id(i, prefijo) for i in ids), default=0) + 1
+
+    # -------- lectura --------
+    def obtener_usuario(self, email):
+        return self._usuarios.get(email)
+
+    def usuarios(self):
+        # Se recorre una copia para que un alta o baja en otra sesión no
+        # rompa una iteración en curso (exportaciones en segundo plano).
+        return iter(list(self._usuarios.values()))
+
+    def usuarios_despues(self, despues, limite):
+        # Lista de usuarios ordenada por id, creada la primera vez y mantenida en cada alta y baja
+        with self.cerrojo:
+            if self._por_id is None:
+                self._por_id = sorted(self._usuarios.values(), key=_orden_usuario)
+            inicio = 0 if despues is None else bisect.bisect_right(self._por_id, orden_id(despues), key=_orden_usuario)
+            return self._por_id[inicio:inicio + limite]
+
+    def emails(self):
+        return list(self._usuarios.keys())
+
+    def contar_usuarios(self):
+        return len(self._usuarios)
+
+    def facturas(self):
+        return iter(self._facturas)
+
+    def facturas_de(self, email, offset=0, limite=None):
+        return self._facturas.facturas_de(email, offset, limite)
+
+    def contar_facturas(self):
+        return len(self._facturas)
+
+    def tabla_facturas(self):
+        return self._facturas.tabla()
+
+    def tramos_facturas(self, tam):
+        return self._facturas.tramos(tam)
+
+    def resumen_mensual(self):
+        return self._facturas.resumen()
+
+    def resumen_por_usuario(self):
+        return [self.resumen_de(email) for email in self.emails()]
+
+    def resumen_de(self, email):
+        return {"email": email, "nombre": self._usuarios[email]["nombre"], **self._facturas.agregados(email)}
+
+    # -------- escritura --------
+    def _poner_usuario(self, usuario):
+        anterior = self._usuarios.get(usuario.email)
+        self._usuarios[usuario.email] = usuario
+        if self._por_id is not None:
+            if anterior is not None:
+                self._quitar_por_id(anterior)
+            bisect.insort(self._por_id, usuario, key=_orden_usuario)
+
+    def _quitar_usuario(self, email):
+        anterior = self._usuarios.pop(email, None)
+        self._facturas.eliminar_email(email)
+        if anterior is not None and self._por_id is not None:
+            self._quitar_por_id(anterior)
+
+    def _quitar_por_id(self, usuario):
+        posicion = bisect.bisect_left(self._por_id, _orden_usuario(usuario), key=_orden_usuario)
+        while posicion < len(self._por_id) and self._por_id[posicion] is not usuario:
+            posicion += 1
+        if posicion < len(self._por_id):
+            del self._por_id[posicion]
+
+    def _poner_factura(self, factura):
+        self._facturas.agregar(factura)
+
+    # Los cambios se hacen en memoria antes de anotarlos; si algo falla,
+    # _terminar los deshace
+    def _agregar_usuario(self, usuario):
+        self._cambios_en_memoria = True
+        self._poner_usuario(usuario)
+        self._anotar("alta_usuario", usuario=usuario.a_dict())
+
+    def _eliminar_usuario(self, email):
+        self._cambios_en_memoria = True
+        self._quitar_usuario(email)
+        self._anotar("baja_usuario", email=email)
+
+    def _agregar_factura(self, factura):
+        self._cambios_en_memoria = True
+        self._poner_factura(factura)
+        self._anotar("alta_factura", factura=factura.a_dict())
+
+    def _agregar_lote(self, usuarios, facturas):
+        # Todo el lote va en una sola línea del diario: se aplica entero o nada
+        self._cambios_en_memoria = True
+        for usuario in usuarios:
+            self._poner_usuario(usuario)
+        for factura in facturas:
+            self._poner_factura(factura)
+        self._anotar("lote", usuarios=[u.a_dict() for u in usuarios], facturas=[f.a_dict() for f in facturas])
+
+    def _anotar(self, operacion, **datos):
+        # El cambio ya queda en disco con la línea del diario; compactar lo hace otro hilo
+        self.diario.anotar(operacion, **datos)
+        metricas.nivel("cambios_sin_compactar", self.diario.entradas)
+        if self.diario.necesita_compactar():
+            self.guardado.pedir()
+
+    def guardar(self):
+        # Sin el bloqueo mientras se escriben los ficheros: las altas pueden seguir
+        with self.transaccion():
+            compactacion = self.diario.preparar(self._usuarios, self._facturas)
+        if compactacion is None:
+            return
+        compactacion.escribir()
+        with self.transaccion():
+            self._facturas = self.diario.confirmar(compactacion, self._usuarios, self._facturas)
+        metricas.nivel("cambios_sin_compactar", self.diario.entradas)
+
+    def vaciar(self):
+        self.guardado.vaciar()
+
+    def cerrar(self):
+        self.guardado.detener()
+
+
+# ============================================
+# -------- BACKEND SQLITE --------
+# ============================================
+
+# Número del id de usuario, con su índice para paginar por id (ver Repositorio.usuarios_despues)
+NUMERO_USUARIO_SQLITE = f"CAST(SUBSTR(id, {len(PREFIJO_USUARIO) + 1}) AS INTEGER)"
+
+ESQUEMA_SQLITE = f"""
+CREATE TABLE IF NOT EXISTS usuarios (
+    email TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    telefono TEXT,
+    direccion TEXT,
+    fecha_registro TEXT
+);
+CREATE TABLE IF NOT EXISTS facturas (
+    numero TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    fecha_iso TEXT NOT NULL,
+    descripcion TEXT,
+    monto REAL NOT NULL,
+    estado TEXT NOT NULL,
+    cliente TEXT,
+    email TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usuarios_numero ON usuarios({NUMERO_USUARIO_SQLITE}, id);
+CREATE INDEX IF NOT EXISTS idx_facturas_email ON facturas(email);
+CREATE INDEX IF NOT EXISTS idx_facturas_estado ON facturas(estado);
+CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas(fecha_iso);
+"""
+
+# Resumen por mes y estado que mantienen los triggers en cada alta y baja
+# de factura (ver estadisticas.py). Si la tabla es nueva se rellena con las
+# facturas que ya hubiera; todo en una transacción para que otro proceso
+# no escriba facturas entre medias.
+MES_SQLITE = "(CAST(SUBSTR({f}.fecha_iso, 1, 4) AS INTEGER) * 12 + CAST(SUBSTR({f}.fecha_iso, 6, 2) AS INTEGER) - 1)"
+CENTIMOS_SQLITE = "CAST(ROUND({f}.monto * 100) AS INTEGER)"
+
+ESQUEMA_RESUMEN_SQLITE = f"""
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS resumen_mensual (
+    mes INTEGER NOT NULL,
+    estado TEXT NOT NULL,
+    facturas INTEGER NOT NULL,
+    centimos INTEGER NOT NULL,
+    centimos_cuadrado INTEGER NOT NULL,
+    PRIMARY KEY (mes, estado)
+);
+CREATE TRIGGER IF NOT EXISTS resumen_alta AFTER INSERT ON facturas BEGIN
+    INSERT INTO resumen_mensual VALUES (
+        {MES_SQLITE.format(f="new")}, new.estado, 1,
+        {CENTIMOS_SQLITE.format(f="new")}, {CENTIMOS_SQLITE.format(f="new")} * {CENTIMOS_SQLITE.format(f="new")}
+    )
+    ON CONFLICT (mes, estado) DO UPDATE SET
+        facturas = facturas + 1,
+        centimos = centimos + excluded.centimos,
+        centimos_cuadrado = centimos_cuadrado + excluded.centimos_cuadrado;
+END;
+CREATE TRIGGER IF NOT EXISTS resumen_baja AFTER DELETE ON facturas BEGIN
+    UPDATE resumen_mensual SET
+        facturas = facturas - 1,
+        centimos = centimos - {CENTIMOS_SQLITE.format(f="old")},
+        centimos_cuadrado = centimos_cuadrado - {CENTIMOS_SQLITE.format(f="old")} * {CENTIMOS_SQLITE.format(f="old")}
+    WHERE mes = {MES_SQLITE.format(f="old")} AND estado = old.estado;
+END;
+INSERT INTO resumen_mensual
+    SELECT {MES_SQLITE.format(f="f")}, f.estado, COUNT(*),
+           SUM({CENTIMOS_SQLITE.format(f="f")}), SUM({CENTIMOS_SQLITE.format(f="f")} * {CENTIMOS_SQLITE.format(f="f")})
+    FROM facturas f
+    WHERE NOT EXISTS (SELECT 1 FROM resumen_mensual)
+    GROUP BY 1, 2;
+COMMIT;
+"""
+
+MAX_PARAMETROS = 500
+
+
+def fecha_iso(fecha):
+    """Convierte "dd/mm/YYYY HH:MM" a "YYYY-MM-DD HH:MM" para poder ordenar por fecha."""
+    return datetime.datetime.strptime(fecha, "%d/%m/%Y %H:%M").strftime("%Y-%m-%d %H:%M")
+
+
+def fila_factura(factura):
+    return (
+        factura.numero, factura.fecha, fecha_iso(factura.fecha), factura.descripcion,
+        factura.monto, factura.estado.value, factura.cliente, factura.email,
+    )
+
+
+def fila_usuario(usuario):
+    return (
+        usuario["email"], usuario["id"], usuario["nombre"],
+        usuario["telefono"], usuario["direccion"], usuario["fecha_registro"],
+    )
+
+
+def conectar_sqlite(db_file):
+    # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+    conexion = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    return conexion
+
+
+class TramoSQLite:
+    """Facturas con rowid entre `desde` y `hasta`, leídas con una conexión propia (ver paralelo.py)."""
+
+    def __init__(self, db_file, desde, hasta):
+        self.db_file = db_file
+        self.desde = desde
+        self.hasta = hasta
+
+    def facturas(self):
+        conexion = conectar_sqlite(self.db_file)
+        try:
+            sql = RepositorioSQLite.SELECT_FACTURA + " WHERE rowid BETWEEN ? AND ? ORDER BY rowid"
+            for fila in conexion.execute(sql, (self.desde, self.hasta)):
+                yield Factura.desde_dict(dict(fila))
+        finally:
+            conexion.close()
+
+    def tabla(self):
+        return TablaFacturas.desde_facturas(self.facturas())
+
+    def en_uso(self):
+        return contextlib.nullcontext()
+
+
+class RepositorioSQLite(Repositorio):
+    """Usuarios y facturas en una base SQLite con índices por email, estado y fecha.
+
+    Las consultas se resuelven en la base de datos, así que la memoria usada
+    no crece con el número de facturas. Las escrituras usan BEGIN IMMEDIATE,
+    que SQLite ya serializa entre procesos.
+    """
+
+    SELECT_USUARIO = "SELECT " + ", ".join(CAMPOS_USUARIO) + " FROM usuarios"
+    SELECT_FACTURA = "SELECT " + ", ".join(CAMPOS_FACTURA) + " FROM facturas"
+
+    def __init__(self, db_file):
+        super().__init__()
+        self.db_file = db_file
+        self.conexion = conectar_sqlite(db_file)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.executescript(ESQUEMA_SQLITE)
+        self.conexion.executescript(ESQUEMA_RESUMEN_SQLITE)
+        self._data_version = self._leer_data_version()
+        self.ids = AsignadorIds(SecuenciasSQLite(self.conexion, self.cerrojo), self._siguiente_numero)
+
+    # -------- sincronización entre procesos --------
+    def _empezar(self):
+        self.conexion.execute("BEGIN IMMEDIATE")
+
+    def _terminar(self, ok):
+        self.conexion.execute("COMMIT" if ok else "ROLLBACK")
+
+    def _leer_data_version(self):
+        with self.cerrojo:
+            return self.conexion.execute("PRAGMA data_version").fetchone()[0]
+
+    def sincronizar(self):
+        # data_version cambia cuando otra conexión confirma una escritura
+        actual = self._leer_data_version()
+        if actual != self._data_version:
+            self._data_version = actual
+            self._indice_busqueda = None
+            self.version += 1
+
+    def _siguiente_numero(self, prefijo):
+        tabla, columna = ("usuarios", "id") if prefijo == PREFIJO_USUARIO else ("facturas", "numero")
+        maximo = self._valor(
+            f"SELECT MAX(CAST(SUBSTR({columna}, ?) AS INTEGER)) FROM {tabla} WHERE {columna} LIKE ?",
+            (len(prefijo) + 1, prefijo + "%"),
+        )
+        return (maximo or 0) + 1
+
+    # -------- lectura --------
+    def _filas(self, sql, parametros=()):
+        with self.cerrojo:
+            return [dict(fila) for fila in self.conexion.execute(sql, parametros)]
+
+    def _fila(self, sql, parametros=()):
+        with self.cerrojo:
+            fila = self.conexion.execute(sql, parametros).fetchone()
+        return dict(fila) if fila else None
+
+    def _valor(self, sql, parametros=()):
+        with self.cerrojo:
+            return self.conexion.execute(sql, parametros).fetchone()[0]
+
+    def _recorrer(self, sql, registro):
+        """Recorre una consulta larga con una conexión propia, sin bloquear las escrituras."""
+        conexion = conectar_sqlite(self.db_file)
+        try:
+            for fila in conexion.execute(sql):
+                yield registro.desde_dict(dict(fila))
+        finally:
+            conexion.close()
+
+    def obtener_usuario(self, email):
+        fila = self._fila(self.SELECT_USUARIO + " WHERE email = ?", (email,))
+        return Usuario.desde_dict(fila) if fila else None
+
+    def obtener_usuarios(self, emails):
+        emails = list(emails)
+        encontrados = {}
+        # De MAX_PARAMETROS en MAX_PARAMETROS para no pasar el límite de SQLite
+        for i in range(0, len(emails), MAX_PARAMETROS):
+            grupo = emails[i:i + MAX_PARAMETROS]
+            marcas = ", ".join("?" * len(grupo))
+            for fila in self._filas(self.SELECT_USUARIO + f" WHERE email IN ({marcas})", grupo):
+                encontrados[fila["email"]] = Usuario.desde_dict(fila)
+        return encontrados
+
+    def usuarios(self):
+        return self._recorrer(self.SELECT_USUARIO + " ORDER BY rowid", Usuario)
+
+    def pagina_usuarios(self, offset, limite):
+        filas = self._filas(self.SELECT_USUARIO + " ORDER BY rowid LIMIT ? OFFSET ?", (limite, offset))
+        return list(map(Usuario.desde_dict, filas))
+
+    def usuarios_despues(self, despues, limite):
+        orden = f" ORDER BY {NUMERO_USUARIO_SQLITE}, id LIMIT ?"
+        if despues is None:
+            filas = self._filas(self.SELECT_USUARIO + orden, (limite,))
+        else:
+            # Escrito así (y no como (número, id) > (?, ?)) SQLite busca en el índice en vez de recorrerlo
+            numero, identificador = orden_id(despues)
+            filas = self._filas(
+                self.SELECT_USUARIO + f" WHERE {NUMERO_USUARIO_SQLITE} >= ? AND ({NUMERO_USUARIO_SQLITE} > ? OR id > ?)" + orden,
+                (numero, numero, identificador, limite),
+            )
+        return list(map(Usuario.desde_dict, filas))
+
+    def emails(self):
+        return [fila["email"] for fila in self._filas("SELECT email FROM usuarios ORDER BY rowid")]
+
+    def contar_usuarios(self):
+        return self._valor("SELECT COUNT(*) FROM usuarios")
+
+    def facturas(self):
+        return self._recorrer(self.SELECT_FACTURA + " ORDER BY rowid", Factura)
+
+    def facturas_de(self, email, offset=0, limite=None):
+        filas = self._filas(
+            self.SELECT_FACTURA + " WHERE email = ? ORDER BY rowid LIMIT ? OFFSET ?",
+            (email, -1 if limite is None else limite, offset),
+        )
+        return list(map(Factura.desde_dict, filas))
+
+    def contar_facturas(self):
+        return self._valor("SELECT COUNT(*) FROM facturas")
+
+    def tramos_facturas(self, tam):
+        # Por rowid: con huecos (bajas) algún tramo queda más corto, pero no hace falta contar
+        rango = self._fila("SELECT MIN(rowid) AS minimo, MAX(rowid) AS maximo FROM facturas")
+        if rango["minimo"] is None:
+            return []
+        return [
+            TramoSQLite(self.db_file, desde, min(desde + tam - 1, rango["maximo"]))
+            for desde in range(rango["minimo"], rango["maximo"] + 1, tam)
+        ]
+
+    # Los importes se suman en céntimos, como en el backend JSON (ver indices.py)
+    SELECT_RESUMEN = f"""
+        SELECT u.email, u.nombre,
+               COUNT(f.email) AS facturas,
+               COALESCE(SUM({CENTIMOS_SQLITE.format(f="f")}), 0) AS total,
+               COALESCE(SUM(CASE WHEN f.estado = 'Pagada' THEN {CENTIMOS_SQLITE.format(f="f")} END), 0) AS pagado,
+               COALESCE(SUM(CASE WHEN f.estado = 'Pendiente' THEN {CENTIMOS_SQLITE.format(f="f")} END), 0) AS pendiente
+        FROM usuarios u LEFT JOIN facturas f ON f.email = u.email
+    """
+
+    @staticmethod
+    def _resumen(fila):
+        return {
+            "email": fila["email"], "nombre": fila["nombre"],
+            **en_euros([fila["facturas"], fila["total"], fila["pagado"], fila["pendiente"]]),
+        }
+
+    def resumen_por_usuario(self):
+        return [self._resumen(fila) for fila in self._filas(self.SELECT_RESUMEN + " GROUP BY u.email ORDER BY u.rowid")]
+
+    def resumen_de(self, email):
+        fila = self._fila(self.SELECT_RESUMEN + " WHERE u.email = ? GROUP BY u.email", (email,))
+        return self._resumen(fila) if fila else None
+
+    def resumen_mensual(self):
+        filas = self._filas("SELECT mes, estado, facturas, centimos, centimos_cuadrado FROM resumen_mensual")
+        return ResumenMensual.desde_filas(
+            [f["mes"], CODIGO_ESTADO[f["estado"]], f["facturas"], f["centimos"], f["centimos_cuadrado"]]
+            for f in filas
+        )
+
+    # -------- escritura --------
+    def _agregar_usuario(self, usuario):
+        self.conexion.execute("INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?, ?, ?, ?)", fila_usuario(usuario))
+
+    def _eliminar_usuario(self, email):
+        self.conexion.execute("DELETE FROM facturas WHERE email = ?", (email,))
+        self.conexion.execute("DELETE FROM usuarios WHERE email = ?", (email,))
+
+    def _agregar_factura(self, factura):
+        self.conexion.execute("INSERT INTO facturas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", fila_factura(factura))
+
+    def _agregar_lote(self, usuarios, facturas):
+        self.conexion.executemany("INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?, ?, ?, ?)", map(fila_usuario, usuarios))
+        self.conexion.executemany("INSERT INTO facturas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", map(fila_factura, facturas))
+
+    def cerrar(self):
+        self.ids.almacen.cerrar()
+        self.conexion.close()
+
+
+# ============================================
+# -------- APERTURA Y MIGRACIÓN --------
+# ============================================
+
+@metricas.medido("cargar_datos")
+def abrir_repositorio(directorio, backend=None):
+    """Abre el repositorio del directorio indicado.
+
+    El backend se elige con el argumento o con la variable de entorno
+    CRM_BACKEND ("json" por defecto, o "sqlite"). Si el directorio está
+    repartido en particiones (ver particiones.py) se abre el repositorio
+    particionado, con el backend que indique su distribución.
+    """
+    if os.path.exists(os.path.join(directorio, DISTRIBUCION_FILE)):
+        from particiones import RepositorioParticionado  # particiones.py importa este módulo
+        return RepositorioParticionado(directorio)
+    return abrir_backend(directorio, backend)
+
+
+def abrir_backend(directorio, backend=None):
+    """Repositorio JSON o SQLite de un directorio, sin mirar si está particionado."""
+    backend = backend or os.environ.get("CRM_BACKEND", "json")
+    if backend == "json":
+        return RepositorioJSON(directorio)
+    if backend == "sqlite":
+        return RepositorioSQLite(os.path.join(directorio, DB_FILE))
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+
+
+def migrar_json_a_sqlite(directorio):
+    """Copia los usuarios y facturas de los JSON del directorio a su base SQLite."""
+    origen = RepositorioJSON(directorio)
+    try:
+        destino = RepositorioSQLite(os.path.join(directorio, DB_FILE))
+        try:
+            with destino.transaccion():
+                destino.conexion.executemany(
+                    "INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?, ?, ?, ?)",
+                    (fila_usuario(u) for u in origen.usuarios()),
+                )
+                destino.conexion.executemany(
+                    "INSERT INTO facturas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fila_factura(f) for f in origen.facturas()),
+                )
+            return destino.contar_usuarios(), destino.contar_facturas()
+        finally:
+            destino.cerrar()
+    finally:
+        # Para el hilo de guardado en segundo plano del repositorio JSON
+        origen.cerrar()
+
+
+def exportar_a_json(directorio, destino=None, backend=None):
+    """Escribe los datos del directorio como usuarios.json y facturas.json (ver persistencia.exportar_json).
+
+    Por defecto en el mismo directorio, donde sustituyen al facturas.json de
+    versiones anteriores. Se escriben dentro de una transacción: nadie más
+    escribe ni termina una compactación mientras tanto, y los datos
+    exportados son los de un mismo momento. Devuelve (usuarios, facturas)
+    exportados.
+    """
+    destino = destino or directorio
+    repo = abrir_repositorio(directorio, backend)
+    try:
+        with repo.transaccion():
+            return exportar_json(
+                repo.usuarios(), repo.facturas(),
+                os.path.join(destino, USUARIOS_FILE), os.path.join(destino, FACTURAS_FILE),
+            )
+    finally:
+        repo.cerrar()
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if a != "--json"]
+    directorio = argumentos[0] if argumentos else "data"
+    if "--json" in sys.argv:
+        n_usuarios, n_facturas = exportar_a_json(directorio)
+        print(f"Exportados {n_usuarios} usuarios y {n_facturas} facturas a {directorio}")
+    elif os.path.exists(os.path.join(directorio, DB_FILE)):
+        sys.exit(f"Ya existe {os.path.join(directorio, DB_FILE)}; bórrala antes de volver a migrar.")
+    else:
+        n_usuarios, n_facturas = migrar_json_a_sqlite(directorio)
+        print(f"Migrados {n_usuarios} usuarios y {n_facturas} facturas a {os.path.join(directorio, DB_FILE)}")
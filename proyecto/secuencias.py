@@ -0,0 +1,123 @@
+# ============================================
+# -------- SECUENCIAS DE IDS --------
+# ============================================
+# Los IDs (USR000001, FAC000001...) salen de un contador persistente por
+# prefijo que nunca retrocede, así que no se reutilizan aunque se borren
+# usuarios. Para no ir a disco en cada alta, cada proceso reserva los
+# números en bloques y los va repartiendo desde memoria. Si el proceso se
+# reinicia, los números que le quedaban del bloque se pierden (quedan
+# huecos), pero nunca se repiten.
+
+import json
+import os
+import threading
+
+from bloqueo import BloqueoArchivo
+from persistencia import escribir_atomico
+
+ANCHO_ID = 6
+TAM_BLOQUE = 100
+
+
+def formatear_id(prefijo, numero):
+    return f"{prefijo}{numero:0{ANCHO_ID}d}"
+
+
+def numero_de_id(identificador, prefijo):
+    """Parte numérica de un ID ("FAC012" -> 12), o 0 si no tiene ese formato."""
+    if not identificador or not identificador.startswith(prefijo):
+        return 0
+    cifras = identificador[len(prefijo):]
+    return int(cifras) if cifras.isdigit() else 0
+
+
+class SecuenciasArchivo:
+    """Contadores guardados en un JSON {prefijo: siguiente número libre}."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.bloqueo = BloqueoArchivo(ruta + ".lock")
+        # El bloqueo de fichero es uno por instancia: entre hilos hace falta además este cerrojo
+        self._cerrojo = threading.Lock()
+
+    def reservar_bloque(self, prefijo, cantidad, inicial):
+        """Reserva `cantidad` números consecutivos y devuelve el primero."""
+        with self._cerrojo, self.bloqueo:
+            contadores = {}
+            if os.path.exists(self.ruta):
+                with open(self.ruta, "r", encoding="utf-8") as f:
+                    contadores = json.load(f)
+            inicio = contadores[prefijo] if prefijo in contadores else inicial()
+            contadores[prefijo] = inicio + cantidad
+            escribir_atomico(self.ruta, json.dumps(contadores))
+        return inicio
+
+
+class SecuenciasSQLite:
+    """Contadores en una tabla de la base SQLite, con la conexión y el cerrojo del repositorio.
+
+    Con una conexión propia, cada reserva contaría para el repositorio como
+    un cambio de otro proceso (PRAGMA data_version) y esperaría su turno de
+    escritura durmiendo, en vez de en el cerrojo. La reserva no se puede
+    hacer dentro de una transacción del repositorio.
+    """
+
+    def __init__(self, conexion, cerrojo):
+        self.conexion = conexion
+        self._cerrojo = cerrojo
+        with cerrojo:
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS secuencias (prefijo TEXT PRIMARY KEY, siguiente INTEGER NOT NULL)"
+            )
+
+    def reservar_bloque(self, prefijo, cantidad, inicial):
+        with self._cerrojo:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self.conexion.execute("SELECT siguiente FROM secuencias WHERE prefijo = ?", (prefijo,)).fetchone()
+                inicio = fila[0] if fila else inicial()
+                self.conexion.execute(
+                    "INSERT OR REPLACE INTO secuencias VALUES (?, ?)", (prefijo, inicio + cantidad)
+                )
+            except BaseException:
+                self.conexion.execute("ROLLBACK")
+                raise
+            self.conexion.execute("COMMIT")
+        return inicio
+
+    def cerrar(self):
+        pass  # la conexión la cierra el repositorio
+
+
+class AsignadorIds:
+    """Reparte IDs únicos por prefijo a partir de bloques reservados en `almacen`.
+
+    `inicial(prefijo)` da el primer número de una secuencia que aún no
+    existe; solo se consulta una vez, al migrar datos antiguos.
+    """
+
+    def __init__(self, almacen, inicial, tam_bloque=TAM_BLOQUE):
+        self.almacen = almacen
+        self.inicial = inicial
+        self.tam_bloque = tam_bloque
+        self._bloques = {}
+        self._cerrojo = threading.Lock()
+
+    def siguiente(self, prefijo):
+        with self._cerrojo:
+            siguiente, fin = self._bloques.get(prefijo, (0, 0))
+            if siguiente >= fin:
+                siguiente = self._reservar(prefijo, self.tam_bloque)
+                fin = siguiente + self.tam_bloque
+            self._bloques[prefijo] = (siguiente + 1, fin)
+        return formatear_id(prefijo, siguiente)
+
+    def reservar(self, prefijo, cantidad):
+        """Reserva de una vez `cantidad` IDs seguidos, para importaciones masivas."""
+        if cantidad <= 0:
+            return []
+        inicio = self._reservar(prefijo, cantidad)
+        return [formatear_id(prefijo, n) for n in range(inicio, inicio + cantidad)]
+
+    def _reservar(self, prefijo, cantidad):
+        return self.almacen.reservar_bloque(prefijo, cantidad, lambda: self.inicial(prefijo))
@@ -0,0 +1,144 @@
+# ============================================
+# -------- SERIALIZACIÓN --------
+# ============================================
+# Codifica y decodifica la foto de datos y las líneas del diario.
+#
+# JSON: se usa orjson o msgspec si están instalados (varias veces más
+# rápidos que el módulo json) y, si no, la librería estándar. En todos los
+# casos se escribe JSON compacto en UTF-8, sin sangría.
+#
+# Formatos de la foto (CRM_FORMATO_FOTO):
+# - "json" (por defecto): JSON compacto.
+# - "msgpack": MessagePack (necesita msgpack o msgspec).
+# Las facturas se guardan en su propio fichero binario, una factura por
+# registro en el formato elegido (ver almacen.py). Al cargar, el formato
+# se detecta solo, así que se puede cambiar en cualquier momento: la
+# siguiente compactación reescribe la foto en el nuevo.
+#
+# Las fotos de facturas por columnas ("campos", "filas", "columnas") de
+# versiones anteriores se siguen pudiendo leer.
+
+import json
+import os
+from itertools import repeat
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATOS_FOTO = ["json", "msgpack"]
+BOM_UTF8 = b"\xef\xbb\xbf"
+
+
+# -------- JSON --------
+if orjson is not None:
+    CODIFICADOR_JSON = "orjson"
+
+    def codificar_json(datos):
+        return orjson.dumps(datos)
+
+    def decodificar_json(datos):
+        return orjson.loads(datos)
+
+elif msgspec is not None:
+    CODIFICADOR_JSON = "msgspec"
+    _codificador = msgspec.json.Encoder()
+    _decodificador = msgspec.json.Decoder()
+
+    def codificar_json(datos):
+        return _codificador.encode(datos)
+
+    def decodificar_json(datos):
+        # Como json y orjson, los errores de formato se señalan con ValueError
+        try:
+            return _decodificador.decode(datos)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+else:
+    CODIFICADOR_JSON = "json"
+
+    def codificar_json(datos):
+        return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decodificar_json(datos):
+        return json.loads(datos)
+
+
+# -------- MessagePack --------
+if msgpack is not None:
+    def codificar_msgpack(datos):
+        return msgpack.packb(datos, use_bin_type=True)
+
+    def decodificar_msgpack(datos):
+        return msgpack.unpackb(datos, raw=False, strict_map_key=False)
+
+elif msgspec is not None:
+    def codificar_msgpack(datos):
+        return msgspec.msgpack.encode(datos)
+
+    def decodificar_msgpack(datos):
+        return msgspec.msgpack.decode(datos)
+
+else:
+    def codificar_msgpack(datos):
+        raise RuntimeError("El formato msgpack necesita instalar msgpack o msgspec.")
+
+    decodificar_msgpack = codificar_msgpack
+
+
+def msgpack_disponible():
+    return msgpack is not None or msgspec is not None
+
+
+# -------- foto --------
+def formato_por_defecto():
+    """Formato de la foto elegido con CRM_FORMATO_FOTO ("json" por defecto)."""
+    formato = os.environ.get("CRM_FORMATO_FOTO", "json")
+    if formato not in FORMATOS_FOTO:
+        raise ValueError(f"Formato de foto desconocido: {formato}")
+    if formato == "msgpack" and not msgpack_disponible():
+        raise RuntimeError("CRM_FORMATO_FOTO=msgpack necesita instalar msgpack o msgspec.")
+    return formato
+
+
+def detectar_formato(contenido):
+    """"json" si el contenido empieza (tras espacios o BOM) por { o [; si no, "msgpack"."""
+    inicio = contenido[:64].lstrip()
+    if inicio.startswith(BOM_UTF8):
+        inicio = inicio[len(BOM_UTF8):].lstrip()
+    return "json" if inicio[:1] in (b"{", b"[") or not inicio else "msgpack"
+
+
+def facturas_de_columnas(foto):
+    """Lista de facturas de una foto por columnas de versiones anteriores."""
+    columnas = []
+    for campo in foto["campos"]:
+        columna = foto["columnas"][campo]
+        if isinstance(columna, dict):
+            columna = list(map(columna["valores"].__getitem__, columna["codigos"]))
+        columnas.append(columna)
+    return list(map(dict, map(zip, repeat(foto["campos"]), zip(*columnas))))
+
+
+def codificar_foto(datos, formato="json"):
+    return codificar_msgpack(datos) if formato == "msgpack" else codificar_json(datos)
+
+
+def decodificar_foto(contenido):
+    if detectar_formato(contenido) == "msgpack":
+        return decodificar_msgpack(contenido)
+    if contenido.startswith(BOM_UTF8):
+        contenido = contenido[len(BOM_UTF8):]
+    return decodificar_json(contenido)
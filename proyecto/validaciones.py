@@ -0,0 +1,87 @@
+# ============================================
+# -------- VALIDACIONES --------
+# ============================================
+# Reglas de datos compartidas por la app, el CRM por consola y la
+# importación masiva.
+
+import datetime
+import math
+import re
+
+from modelo import ESTADOS as ESTADOS_FACTURA, FORMATO_FECHA_REGISTRO, FORMATO_FECHA_FACTURA
+
+SIN_DATO = "No especificado"
+
+
+def email_valido(email):
+    """Valida formato básico de email."""
+    return re.match(r"[^@]+@[^@]+\.[^@]+", email)
+
+
+def fecha_valida(fecha, formato):
+    try:
+        datetime.datetime.strptime(fecha, formato)
+    except ValueError:
+        return False
+    return True
+
+
+def texto(fila, campo):
+    valor = fila.get(campo)
+    return "" if valor is None else str(valor).strip()
+
+
+def validar_usuario(fila):
+    """Convierte una fila importada en datos de usuario.
+
+    Devuelve (datos, None) si es válida o (None, motivo) si no lo es.
+    """
+    nombre = texto(fila, "nombre")
+    apellidos = texto(fila, "apellidos")
+    email = texto(fila, "email").lower()
+    if not nombre or not apellidos or not email:
+        return None, "Nombre, apellidos y email son obligatorios."
+    if not email_valido(email):
+        return None, "Formato de email no válido."
+    fecha = texto(fila, "fecha_registro") or datetime.date.today().strftime(FORMATO_FECHA_REGISTRO)
+    if not fecha_valida(fecha, FORMATO_FECHA_REGISTRO):
+        return None, f"Fecha de registro no válida: {fecha}"
+    return {
+        "nombre": f"{nombre} {apellidos}",
+        "email": email,
+        "telefono": texto(fila, "telefono") or SIN_DATO,
+        "direccion": texto(fila, "direccion") or SIN_DATO,
+        "fecha_registro": fecha,
+    }, None
+
+
+def validar_factura(fila):
+    """Convierte una fila importada en datos de factura (sin número ni cliente).
+
+    Devuelve (datos, None) si es válida o (None, motivo) si no lo es.
+    """
+    email = texto(fila, "email").lower()
+    if not email or not email_valido(email):
+        return None, "Email del cliente vacío o no válido."
+    try:
+        monto = float(texto(fila, "monto").replace(",", "."))
+    except ValueError:
+        return None, "Monto no válido."
+    # float() acepta "nan", "inf" y desbordes como "1e400" (que dan inf)
+    if not math.isfinite(monto):
+        return None, "Monto no válido."
+    if monto <= 0:
+        return None, "El monto debe ser mayor que 0."
+    estado = texto(fila, "estado").capitalize()
+    if estado not in ESTADOS_FACTURA:
+        return None, f"Estado inválido: debe ser {', '.join(ESTADOS_FACTURA)}."
+    fecha = texto(fila, "fecha") or datetime.datetime.now().strftime(FORMATO_FECHA_FACTURA)
+    if not fecha_valida(fecha, FORMATO_FECHA_FACTURA):
+        return None, f"Fecha no válida: {fecha}"
+    return {
+        "fecha": fecha,
+        "descripcion": texto(fila, "descripcion"),
+        "monto": monto,
+        "estado": estado,
+        "email": email,
+    }, None
@@ -0,0 +1,9 @@
+# Las pruebas importan los módulos de proyecto/ directamente (ver pytest.ini)
+
+import pytest
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request):
+    """Cada prueba que lo use se ejecuta con los dos backends de almacenamiento."""
+    return request.param
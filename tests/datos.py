@@ -0,0 +1,17 @@
+# Datos de prueba compartidos por las pruebas
+
+EMAIL = "estres@ejemplo.com"
+
+
+def usuario(email, nombre="Cliente Estrés"):
+    return {
+        "nombre": nombre, "email": email, "telefono": "No especificado",
+        "direccion": "No especificado", "fecha_registro": "01/01/2024",
+    }
+
+
+def factura(descripcion, email=EMAIL):
+    return {
+        "fecha": "01/01/2024 10:00", "descripcion": descripcion, "monto": 1.0,
+        "estado": "Pendiente", "cliente": "Cliente Estrés", "email": email,
+    }
@@ -0,0 +1,82 @@
+# ===========================================================
+# PRUEBAS DE LA API HTTP
+# ===========================================================
+# Se llama a ApiCRM.atender directamente, sin servidor.
+
+import json
+from urllib.parse import parse_qs
+
+import pytest
+
+import api
+from api import ApiCRM, Peticion
+from repositorio import abrir_backend
+
+from datos import factura, usuario
+
+USUARIOS = 7
+
+
+@pytest.fixture
+def cliente(tmp_path, backend, monkeypatch):
+    monkeypatch.setattr(api, "INTERVALO_SINCRONIZAR", 0)
+    repo = abrir_backend(str(tmp_path), backend)
+    for i in range(USUARIOS):
+        repo.crear_usuario(usuario(f"cliente{i}@ejemplo.com", f"Cliente {i}"))
+    for i, monto in enumerate([945.74, 299.85, 774.84, 134.0]):
+        repo.crear_factura({**factura(f"f{i}", "cliente0@ejemplo.com"), "monto": monto,
+                            "estado": "Pagada" if i == 3 else "Pendiente"})
+    aplicacion = ApiCRM(repo=repo)
+    yield aplicacion
+    aplicacion.cerrar()
+
+
+def pedir(aplicacion, metodo, ruta, consulta="", cuerpo=None, cabeceras=None):
+    peticion = Peticion(metodo, ruta, parse_qs(consulta), cabeceras or {},
+                        json.dumps(cuerpo).encode() if cuerpo is not None else b"")
+    estado, cabeceras, respuesta = aplicacion.atender(peticion)
+    return estado, dict(cabeceras), json.loads(respuesta) if respuesta else None
+
+
+def test_resumen_general(cliente):
+    estado, _, resumen = pedir(cliente, "GET", "/resumen")
+    assert estado == 200
+    assert resumen == {"usuarios": USUARIOS, "facturas": 4, "total": 2154.43, "pagado": 134.0, "pendiente": 2020.43}
+
+
+def test_resumen_de_usuarios_por_paginas(cliente):
+    filas, despues = [], None
+    while True:
+        estado, _, pagina = pedir(cliente, "GET", "/resumen/usuarios", f"limite=3&despues={despues or ''}")
+        assert estado == 200
+        filas += pagina["datos"]
+        if pagina["siguiente"] is None:
+            break
+        despues = pagina["siguiente"]
+    assert [fila["email"] for fila in filas] == [f"cliente{i}@ejemplo.com" for i in range(USUARIOS)]
+    assert filas[0]["facturas"] == 4 and filas[0]["total"] == 2154.43
+
+
+def test_etag_y_cambios(cliente):
+    estado, cabeceras, _ = pedir(cliente, "GET", "/resumen")
+    etag = cabeceras[b"etag"].decode()
+    estado, _, cuerpo = pedir(cliente, "GET", "/resumen", cabeceras={"if-none-match": etag})
+    assert (estado, cuerpo) == (304, None)
+    # Un alta cambia el resumen, y con él el ETag
+    estado, _, creada = pedir(cliente, "POST", "/facturas", cuerpo=factura("f9", "cliente1@ejemplo.com"))
+    assert estado == 201 and creada["numero"].startswith("FAC")
+    estado, cabeceras, resumen = pedir(cliente, "GET", "/resumen", cabeceras={"if-none-match": etag})
+    assert estado == 200 and cabeceras[b"etag"].decode() != etag
+    assert resumen["facturas"] == 5
+
+
+def test_lote_de_facturas_con_rechazos(cliente):
+    lote = [factura("l0", "cliente2@ejemplo.com"), factura("l1", "nadie@ejemplo.com"),
+            {**factura("l2", "cliente2@ejemplo.com"), "monto": "abc"}, factura("l3", "cliente3@ejemplo.com")]
+    estado, _, resultado = pedir(cliente, "POST", "/facturas/lote", cuerpo=lote)
+    assert estado == 200
+    assert (resultado["recibidos"], resultado["creados"]) == (4, 2)
+    assert [rechazo["posicion"] for rechazo in resultado["rechazos"]] == [1, 2]
+    estado, _, facturas = pedir(cliente, "GET", "/usuarios/cliente2@ejemplo.com/facturas")
+    assert [f["descripcion"] for f in facturas["datos"]] == ["l0"]
+    assert pedir(cliente, "GET", "/usuarios/nadie@ejemplo.com")[0] == 404
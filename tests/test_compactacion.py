@@ -0,0 +1,93 @@
+# ===========================================================
+# PRUEBAS DE LA COMPACTACIÓN ENTRE PROCESOS
+# ===========================================================
+# Dos procesos sobre el mismo directorio dan altas y compactan a la vez:
+# ninguno debe borrar los ficheros provisionales que el otro está
+# escribiendo, ni perder altas.
+
+import logging
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from repositorio import abrir_backend, USUARIOS_FILE
+
+from datos import EMAIL, factura, usuario
+
+PROCESOS = 2
+COMPACTACIONES = 15
+ALTAS_POR_COMPACTACION = 5
+FACTURAS_INICIALES = 20000   # para que escribir la foto tarde y las compactaciones se solapen
+
+
+class Errores(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.mensajes = []
+
+    def emit(self, registro):
+        self.mensajes.append(self.format(registro))
+
+
+def compactar_sin_parar(directorio, etiqueta):
+    """Da altas y compacta en bucle; devuelve los errores del guardado en segundo plano."""
+    errores = Errores()
+    logging.getLogger("crm.guardado").addHandler(errores)
+    repo = abrir_backend(directorio, "json")
+    try:
+        for i in range(COMPACTACIONES):
+            for j in range(ALTAS_POR_COMPACTACION):
+                repo.crear_factura(factura(f"{etiqueta}-{i}-{j}"))
+            repo.guardar()
+    finally:
+        repo.cerrar()
+    return errores.mensajes
+
+
+def test_dos_procesos_compactando_a_la_vez(tmp_path):
+    directorio = str(tmp_path)
+    repo = abrir_backend(directorio, "json")
+    repo.crear_usuario(usuario(EMAIL))
+    repo.agregar_lote(facturas=[{**factura(f"inicial-{i}"), "numero": f"FAC{i:06d}"} for i in range(FACTURAS_INICIALES)])
+    repo.guardar()
+    repo.cerrar()
+
+    with ProcessPoolExecutor(PROCESOS) as ejecutor:
+        resultados = [ejecutor.submit(compactar_sin_parar, directorio, f"p{p}") for p in range(PROCESOS)]
+        errores = [mensaje for resultado in resultados for mensaje in resultado.result()]
+    assert errores == []
+
+    repo = abrir_backend(directorio, "json")
+    try:
+        assert repo.contar_facturas() == FACTURAS_INICIALES + PROCESOS * COMPACTACIONES * ALTAS_POR_COMPACTACION
+    finally:
+        repo.cerrar()
+    assert not [nombre for nombre in os.listdir(directorio) if ".pendiente-" in nombre]
+
+
+def test_solo_se_borran_provisionales_de_procesos_terminados(tmp_path):
+    directorio = str(tmp_path)
+    repo = abrir_backend(directorio, "json")
+    repo.crear_usuario(usuario(EMAIL))
+    repo.guardar()
+    terminado = subprocess.Popen([sys.executable, "-c", "pass"])
+    terminado.wait()
+    en_marcha = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        usuarios_file = os.path.join(directorio, USUARIOS_FILE)
+        ajeno = f"{usuarios_file}.pendiente-1-{en_marcha.pid}-1"
+        # Lo que otro proceso en marcha está escribiendo, aunque sea de una generación anterior
+        provisionales_vivos = [ajeno, ajeno + ".tmp"]
+        provisionales_muertos = [f"{usuarios_file}.pendiente-1-{terminado.pid}-1" + final for final in ("", ".tmp")]
+        for ruta in provisionales_vivos + provisionales_muertos:
+            open(ruta, "w").close()
+        repo.crear_usuario(usuario("otra@ejemplo.com"))
+        repo.crear_usuario(usuario("mas@ejemplo.com"))
+        repo.guardar()
+        assert all(os.path.exists(ruta) for ruta in provisionales_vivos)
+        assert not any(os.path.exists(ruta) for ruta in provisionales_muertos)
+    finally:
+        en_marcha.kill()
+        en_marcha.wait()
+        repo.cerrar()
@@ -0,0 +1,64 @@
+# ===========================================================
+# PRUEBA DE ESTRÉS DE ESCRITURAS CONCURRENTES
+# ===========================================================
+# Varios hilos (que comparten un repositorio, como las sesiones de la app)
+# y varios procesos (cada uno con su propio repositorio sobre los mismos
+# ficheros, como varias instancias de la app) dan de alta usuarios y
+# facturas a la vez. Al final no se ha perdido ninguna alta y no hay
+# números USR ni FAC repetidos.
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from repositorio import abrir_backend, PREFIJO_FACTURA, PREFIJO_USUARIO
+from secuencias import numero_de_id
+
+from datos import EMAIL, factura, usuario
+
+HILOS = 4
+PROCESOS = 3
+ALTAS_POR_HILO = 100
+
+
+def dar_altas(repo, etiqueta):
+    for i in range(ALTAS_POR_HILO):
+        repo.crear_factura(factura(f"{etiqueta}-{i}"))
+        if i % 4 == 0:
+            repo.crear_usuario(usuario(f"{etiqueta}-{i}@ejemplo.com"))
+
+
+def trabajador(directorio, backend, etiqueta):
+    """Un proceso con su propio repositorio compartido por HILOS hilos."""
+    repo = abrir_backend(directorio, backend)
+    hilos = [threading.Thread(target=dar_altas, args=(repo, f"{etiqueta}-h{h}")) for h in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    repo.cerrar()
+
+
+def test_altas_concurrentes_sin_perdidas(tmp_path, backend):
+    directorio = str(tmp_path)
+    repo = abrir_backend(directorio, backend)
+    repo.crear_usuario(usuario(EMAIL))
+    repo.cerrar()
+
+    with ProcessPoolExecutor(PROCESOS) as ejecutor:
+        for resultado in [ejecutor.submit(trabajador, directorio, backend, f"p{p}") for p in range(PROCESOS)]:
+            resultado.result()
+
+    repo = abrir_backend(directorio, backend)
+    try:
+        trabajadores = PROCESOS * HILOS
+        facturas = list(repo.facturas())
+        usuarios = list(repo.usuarios())
+        assert len(facturas) == trabajadores * ALTAS_POR_HILO
+        assert len(usuarios) == 1 + trabajadores * len(range(0, ALTAS_POR_HILO, 4))
+        assert len({f["descripcion"] for f in facturas}) == len(facturas)
+        numeros_facturas = {numero_de_id(f["numero"], PREFIJO_FACTURA) for f in facturas}
+        numeros_usuarios = {numero_de_id(u["id"], PREFIJO_USUARIO) for u in usuarios}
+        assert len(numeros_facturas) == len(facturas)
+        assert len(numeros_usuarios) == len(usuarios)
+    finally:
+        repo.cerrar()
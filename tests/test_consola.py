@@ -0,0 +1,71 @@
+# ===========================================================
+# PRUEBAS DEL CRM POR CONSOLA Y DEL MOTOR ANALÍTICO
+# ===========================================================
+
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("pandas")
+
+import paralelo
+from analitica import MotorAnalitico
+from repositorio import abrir_backend
+
+from datos import factura, usuario
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Sumados en euros (float64) darían 2154.4300000000003
+MONTOS = [945.74, 299.85, 774.84, 134.0]
+
+
+def cargar_consola():
+    spec = importlib.util.spec_from_file_location("consola", os.path.join(RAIZ, "crm_tipología_de_datos.py"))
+    consola = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(consola)
+    return consola
+
+
+@pytest.fixture
+def directorio(tmp_path, backend, monkeypatch):
+    monkeypatch.setenv("CRM_BACKEND", backend)
+    repo = abrir_backend(str(tmp_path), backend)
+    repo.crear_usuario(usuario("ana@ejemplo.com", "Ana Peña"))
+    repo.crear_usuario(usuario("luis@ejemplo.com", "Luis Gil"))
+    for i, monto in enumerate(MONTOS):
+        repo.crear_factura({**factura(f"f{i}", "ana@ejemplo.com"), "monto": monto})
+    repo.crear_factura({**factura("pagada", "luis@ejemplo.com"), "monto": 5.5, "estado": "Pagada"})
+    repo.cerrar()
+    return str(tmp_path)
+
+
+def test_resumen_financiero_por_consola(directorio, monkeypatch, capsys):
+    consola = cargar_consola()
+    monkeypatch.setattr(consola, "DATA_DIR", directorio)
+    respuestas = iter(["6", "7"])
+    monkeypatch.setattr("builtins.input", lambda *_: next(respuestas))
+    consola.menu()
+    salida = capsys.readouterr().out
+    assert "Usuario: Ana Peña (ana@ejemplo.com)\n- Facturas: 4\n- Total facturado: €2154.43\n- Pagado: €0.0\n- Pendiente: €2154.43" in salida
+    assert "Usuario: Luis Gil (luis@ejemplo.com)\n- Facturas: 1\n- Total facturado: €5.5\n- Pagado: €5.5\n- Pendiente: €0.0" in salida
+    assert "Usuarios: 2\nFacturas emitidas: 5\nIngresos totales: €2159.93\nRecibido: €5.5\nPendiente: €2154.43" in salida
+
+
+def test_motor_analitico_igual_que_el_repositorio(directorio, backend):
+    repo = abrir_backend(directorio, backend)
+    try:
+        resumen = MotorAnalitico(repo).resumen_por_usuario()
+        assert resumen.to_dict("records") == repo.resumen_por_usuario()
+    finally:
+        repo.cerrar()
+
+
+def test_motor_analitico_repartido_entre_procesos(directorio, backend, monkeypatch):
+    monkeypatch.setattr(paralelo, "UMBRAL_PARALELO", 1)
+    repo = abrir_backend(directorio, backend)
+    try:
+        resumen = MotorAnalitico(repo, procesos=2).resumen_por_usuario()
+        assert resumen.to_dict("records") == repo.resumen_por_usuario()
+    finally:
+        repo.cerrar()
@@ -0,0 +1,54 @@
+# ===========================================================
+# PRUEBAS DEL RESUMEN MENSUAL MATERIALIZADO
+# ===========================================================
+
+from estadisticas import ResumenMensual, indice_mes
+from modelo import CODIGO_ESTADO, Estado
+from repositorio import abrir_backend
+
+from datos import factura, usuario
+
+PENDIENTE = CODIGO_ESTADO[Estado.PENDIENTE]
+ENERO = indice_mes(2024, 1)
+
+
+def test_combinado_conserva_celdas_sin_facturas_netas():
+    foto = ResumenMensual()
+    foto.sumar(ENERO, PENDIENTE, 1000)
+    cambios = ResumenMensual()
+    cambios.sumar(ENERO, PENDIENTE, 1000, -1)
+    cambios.sumar(ENERO, PENDIENTE, 2500)
+    assert cambios.filas() == [[ENERO, PENDIENTE, 0, 1500, 2500 * 2500 - 1000 * 1000]]
+    total = foto.combinado(cambios).totales()
+    assert (total["facturas"], total["importe"], total["varianza"]) == (1, 25.0, 0.0)
+
+
+def test_combinado_suma_celdas_de_los_dos_lados():
+    uno, otro = ResumenMensual(), ResumenMensual()
+    uno.sumar(ENERO, PENDIENTE, 100)
+    otro.sumar(ENERO, PENDIENTE, 300)
+    otro.sumar(ENERO + 1, CODIGO_ESTADO[Estado.PAGADA], 200)
+    combinado = uno.combinado(otro)
+    assert combinado.meses() == [((2024, 1), 2, 4.0), ((2024, 2), 1, 2.0)]
+    assert combinado.por_estado()[Estado.PAGADA] == (1, 2.0)
+    assert ResumenMensual.desde_filas(combinado.filas()).filas() == combinado.filas()
+
+
+def test_baja_y_alta_en_el_mismo_mes_y_estado(tmp_path, backend):
+    directorio = str(tmp_path)
+    repo = abrir_backend(directorio, backend)
+    repo.crear_usuario(usuario("ana@ejemplo.com"))
+    repo.crear_factura({**factura("vieja", "ana@ejemplo.com"), "monto": 10})
+    repo.guardar()   # la factura de 10 € queda en la foto
+    repo.eliminar_usuario("ana@ejemplo.com")
+    repo.crear_usuario(usuario("luis@ejemplo.com"))
+    repo.crear_factura({**factura("nueva", "luis@ejemplo.com"), "monto": 25})
+    esperado = {"facturas": 1, "importe": 25.0, "media": 25.0, "varianza": 0.0}
+    assert repo.resumen_mensual().totales() == esperado
+    repo.guardar()   # y el resumen que se escribe con la foto también
+    repo.cerrar()
+    repo = abrir_backend(directorio, backend)
+    try:
+        assert repo.resumen_mensual().totales() == esperado
+    finally:
+        repo.cerrar()
@@ -0,0 +1,32 @@
+# ===========================================================
+# PRUEBAS DE LA EXPORTACIÓN
+# ===========================================================
+
+import os
+import stat
+import subprocess
+import sys
+
+from exportacion import directorio_exportaciones, ruta_exportacion
+
+
+def test_exportaciones_en_directorio_propio_del_proceso():
+    ruta = ruta_exportacion("usuarios", 3, "csv")
+    directorio = directorio_exportaciones()
+    assert os.path.dirname(ruta) == directorio
+    assert stat.S_IMODE(os.stat(directorio).st_mode) == 0o700
+    # Otro proceso (otra instancia de la app) usa su propio directorio
+    otro = subprocess.run(
+        [sys.executable, "-c", "from exportacion import ruta_exportacion; print(ruta_exportacion('usuarios', 3, 'csv'))"],
+        capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    ).stdout.strip()
+    assert otro != ruta
+    assert not os.path.exists(os.path.dirname(otro))  # se borra al salir
+
+
+def test_ruta_exportacion_borra_versiones_anteriores():
+    vieja = ruta_exportacion("facturas", 1, "csv")
+    with open(vieja, "w") as f:
+        f.write("numero\n")
+    nueva = ruta_exportacion("facturas", 2, "csv")
+    assert nueva != vieja and not os.path.exists(vieja)
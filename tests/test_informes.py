@@ -0,0 +1,44 @@
+# ===========================================================
+# PRUEBAS DE LOS INFORMES PDF
+# ===========================================================
+
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("fpdf")
+
+import informes
+
+FILAS = [("Ana", "ana@ejemplo.com", "01/01/2024 10:00", "10.0")] * 7
+
+
+def generar(tmp_path, filas):
+    avances = []
+    ruta = informes.generar_informe("Prueba", informes.COLUMNAS_FACTURAS, informes.ANCHOS_FACTURAS, filas,
+                                    str(tmp_path / "facturas_1.pdf"), avances.append)
+    return ruta, avances
+
+
+@pytest.mark.parametrize("n", [0, 3])
+def test_informe_corto_es_un_solo_pdf(tmp_path, monkeypatch, n):
+    monkeypatch.setattr(informes, "FILAS_POR_PDF", 3)
+    ruta, avances = generar(tmp_path, FILAS[:n])
+    assert ruta == str(tmp_path / "facturas_1.pdf")
+    with open(ruta, "rb") as f:
+        assert f.read(4) == b"%PDF"
+    assert avances[-1] == n
+    assert os.listdir(tmp_path) == ["facturas_1.pdf"]
+
+
+def test_informe_largo_se_parte_en_varios_pdf_dentro_de_un_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr(informes, "FILAS_POR_PDF", 3)
+    ruta, avances = generar(tmp_path, iter(FILAS))
+    assert ruta == str(tmp_path / "facturas_1.zip")
+    with zipfile.ZipFile(ruta) as zip_:
+        assert zip_.namelist() == ["facturas_1_1.pdf", "facturas_1_2.pdf", "facturas_1_3.pdf"]
+        assert all(zip_.read(nombre).startswith(b"%PDF") for nombre in zip_.namelist())
+    # El progreso cuenta las filas de todas las partes, y las partes sueltas se borran
+    assert avances == sorted(avances) and avances[-1] == len(FILAS)
+    assert os.listdir(tmp_path) == ["facturas_1.zip"]
@@ -0,0 +1,19 @@
+# ===========================================================
+# PRUEBAS DEL ENDPOINT DE MÉTRICAS
+# ===========================================================
+
+import urllib.request
+
+import metricas
+
+
+def test_servidor_metricas_solo_en_local_por_defecto():
+    servidor = metricas.iniciar_servidor(0)
+    try:
+        host, puerto = servidor.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metrics") as respuesta:
+            assert respuesta.status == 200
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,98 @@
+# ===========================================================
+# PRUEBAS DEL REPOSITORIO PARTICIONADO
+# ===========================================================
+
+import os
+
+from particiones import RepositorioParticionado, leer_distribucion, particion_de, repartir
+from repositorio import abrir_backend, abrir_repositorio
+
+from datos import factura, usuario
+
+USUARIOS = 12
+
+
+def con_datos(directorio, backend):
+    """Directorio sin particionar con usuarios y facturas de varios meses, estados e importes."""
+    repo = abrir_backend(directorio, backend)
+    try:
+        for i in range(USUARIOS):
+            email = f"cliente{i}@ejemplo.com"
+            repo.crear_usuario(usuario(email, f"Cliente {i}"))
+            for j in range(i % 4):
+                repo.crear_factura({
+                    **factura(f"f{i}-{j}", email), "fecha": f"15/{1 + (i + j) % 12:02d}/2024 10:00",
+                    "monto": round(10 + i * 3.17 + j, 2), "estado": "Pagada" if (i + j) % 3 else "Pendiente",
+                })
+    finally:
+        repo.cerrar()
+
+
+def estado(repo):
+    """Lo que tiene que dar igual con o sin particiones."""
+    paginas, despues = [], None
+    while pagina := repo.usuarios_despues(despues, 5):
+        paginas.append([u.id for u in pagina])
+        despues = pagina[-1].id
+    return {
+        "contadores": (repo.contar_usuarios(), repo.contar_facturas()),
+        "usuarios": sorted(u["email"] for u in repo.usuarios()),
+        "facturas": sorted((f["numero"], f["descripcion"], f["monto"]) for f in repo.facturas()),
+        "resumen_mensual": sorted(repo.resumen_mensual().filas()),
+        "paginas": paginas,
+        "resumen_por_usuario": sorted(repo.resumen_por_usuario(), key=lambda fila: fila["email"]),
+        "facturas_de": [f["descripcion"] for f in repo.facturas_de("cliente7@ejemplo.com")],
+    }
+
+
+def test_repartir_da_los_mismos_datos_que_sin_particiones(tmp_path, backend):
+    directorio = str(tmp_path)
+    con_datos(directorio, backend)
+    repo = abrir_repositorio(directorio, backend)
+    esperado = estado(repo)
+    repo.cerrar()
+
+    assert repartir(directorio, 3, backend) == esperado["contadores"]
+    repo = abrir_repositorio(directorio)
+    try:
+        assert isinstance(repo, RepositorioParticionado)
+        assert estado(repo) == esperado
+        # Cada usuario está en la partición que le toca por su email
+        for numero, particion in enumerate(repo._particiones):
+            assert all(particion_de(email, 3) == numero for email in particion.emails())
+    finally:
+        repo.cerrar()
+
+
+def test_volver_a_repartir_con_el_repositorio_abierto(tmp_path, backend):
+    directorio = str(tmp_path)
+    con_datos(directorio, backend)
+    repartir(directorio, 2, backend)
+    repo = abrir_repositorio(directorio)
+    try:
+        esperado = estado(repo)
+        assert repartir(directorio, 4) == esperado["contadores"]
+        assert leer_distribucion(directorio) == {"generacion": 2, "particiones": 4, "backend": backend}
+        # El repositorio abierto pasa a la distribución nueva en su siguiente escritura
+        repo.crear_usuario(usuario("nuevo@ejemplo.com", "Nuevo"))
+        repo.crear_factura(factura("f-nueva", "nuevo@ejemplo.com"))
+        assert len(repo._particiones) == 4
+        repo.eliminar_usuario("cliente3@ejemplo.com")
+        esperado = estado(repo)
+    finally:
+        repo.cerrar()
+    repo = abrir_repositorio(directorio)
+    try:
+        assert estado(repo) == esperado
+        assert "nuevo@ejemplo.com" in esperado["usuarios"]
+        assert "cliente3@ejemplo.com" not in esperado["usuarios"]
+        assert not any(f.startswith("f3-") for _, f, _ in esperado["facturas"])
+        # Los números siguen una única secuencia para todas las particiones
+        numeros = [numero for numero, _, _ in esperado["facturas"]]
+        assert len(set(numeros)) == len(numeros)
+    finally:
+        repo.cerrar()
+    # La generación sustituida se conserva para otras instancias; las anteriores no
+    assert os.path.isdir(os.path.join(directorio, "particiones.1"))
+    repartir(directorio, 2)
+    assert not os.path.exists(os.path.join(directorio, "particiones.1"))
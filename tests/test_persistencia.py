@@ -0,0 +1,158 @@
+# ===========================================================
+# PRUEBAS DE LA FOTO Y EL DIARIO DE CAMBIOS
+# ===========================================================
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+import repositorio
+from persistencia import Diario
+from repositorio import abrir_backend, exportar_a_json
+
+from datos import factura, usuario
+
+
+def diario_en(directorio, max_entradas=3):
+    return Diario(
+        os.path.join(directorio, "usuarios.json"),
+        os.path.join(directorio, "facturas.json"),
+        os.path.join(directorio, "diario.jsonl"),
+        max_entradas=max_entradas,
+    )
+
+
+def usuario_registro(email):
+    return {**usuario(email), "id": f"USR{len(email):03d}"}
+
+
+def factura_registro(numero, email):
+    return {**factura(f"f{numero}", email), "numero": f"FAC{numero:03d}"}
+
+
+def compactar(diario, usuarios, facturas):
+    compactacion = diario.preparar(usuarios, facturas)
+    compactacion.escribir()
+    return diario.confirmar(compactacion, usuarios, facturas)
+
+
+def contenido(directorio):
+    usuarios, facturas = diario_en(directorio).cargar()
+    return sorted(usuarios), sorted(f["descripcion"] for f in facturas)
+
+
+def test_foto_mas_diario_reproduce_todos_los_cambios(tmp_path):
+    diario = diario_en(tmp_path)
+    diario.cargar()
+    diario.anotar("alta_usuario", usuario=usuario_registro("ana@ejemplo.com"))
+    diario.anotar("alta_factura", factura=factura_registro(1, "ana@ejemplo.com"))
+    diario.anotar("alta_usuario", usuario=usuario_registro("luis@ejemplo.com"))
+    assert diario.necesita_compactar()
+    # Quien compacta tiene en memoria los cambios que anotó
+    compactar(diario, *diario_en(tmp_path).cargar())
+    assert os.path.exists(diario.ruta_facturas(diario.foto_facturas))
+    # Cambios posteriores a la foto, incluida una baja con sus facturas
+    diario.anotar("alta_factura", factura=factura_registro(2, "luis@ejemplo.com"))
+    diario.anotar("baja_usuario", email="ana@ejemplo.com")
+    diario.anotar("lote", usuarios=[usuario_registro("eva@ejemplo.com")],
+                  facturas=[factura_registro(3, "eva@ejemplo.com")])
+    assert contenido(tmp_path) == (["eva@ejemplo.com", "luis@ejemplo.com"], ["f2", "f3"])
+
+
+def test_linea_cortada_al_final_del_diario_se_descarta(tmp_path):
+    diario = diario_en(tmp_path, max_entradas=100)
+    diario.cargar()
+    diario.anotar("alta_usuario", usuario=usuario_registro("ana@ejemplo.com"))
+    diario.anotar("alta_factura", factura=factura_registro(1, "ana@ejemplo.com"))
+    # Una escritura que se cortó a medias: sin salto de línea final
+    linea = json.dumps({"op": "alta_factura", "factura": factura_registro(2, "ana@ejemplo.com")})
+    with open(diario.diario_file, "ab") as f:
+        f.write(linea[: len(linea) // 2].encode("utf-8"))
+    recuperado = diario_en(tmp_path, max_entradas=100)
+    assert sorted(f["descripcion"] for f in recuperado.cargar()[1]) == ["f1"]
+    # Se trunca lo cortado, y lo que se anote después se lee bien
+    assert os.path.getsize(recuperado.diario_file) == recuperado.posicion
+    recuperado.anotar("alta_factura", factura=factura_registro(3, "ana@ejemplo.com"))
+    assert contenido(tmp_path) == (["ana@ejemplo.com"], ["f1", "f3"])
+
+
+def test_linea_ilegible_descarta_lo_que_venga_detras(tmp_path):
+    diario = diario_en(tmp_path, max_entradas=100)
+    diario.cargar()
+    diario.anotar("alta_usuario", usuario=usuario_registro("ana@ejemplo.com"))
+    with open(diario.diario_file, "ab") as f:
+        f.write(b'{"op": "alta_fac\n')
+    diario.anotar("alta_factura", factura=factura_registro(1, "ana@ejemplo.com"))
+    assert contenido(tmp_path) == (["ana@ejemplo.com"], [])
+
+
+def test_compactar_no_borra_el_facturas_json_de_versiones_anteriores(tmp_path):
+    legado = [factura_registro(1, "ana@ejemplo.com")]
+    (tmp_path / "usuarios.json").write_text(json.dumps({"ana@ejemplo.com": usuario_registro("ana@ejemplo.com")}))
+    (tmp_path / "facturas.json").write_text(json.dumps(legado))
+    diario = diario_en(tmp_path)
+    diario.cargar()
+    diario.anotar("alta_factura", factura=factura_registro(2, "ana@ejemplo.com"))
+    compactar(diario, *diario_en(tmp_path).cargar())
+    assert json.loads((tmp_path / "facturas.json").read_text()) == legado
+    assert contenido(tmp_path) == (["ana@ejemplo.com"], ["f1", "f2"])
+
+
+def test_exportar_a_json_legible_por_versiones_anteriores(tmp_path, backend):
+    directorio, destino = tmp_path / "datos", tmp_path / "exportado"
+    directorio.mkdir()
+    destino.mkdir()
+    repo = abrir_backend(str(directorio), backend)
+    repo.crear_usuario(usuario("ana@ejemplo.com", "Ana Peña"))
+    for i in range(3):
+        repo.crear_factura(factura(f"f{i}", "ana@ejemplo.com"))
+    repo.cerrar()
+    assert exportar_a_json(str(directorio), str(destino), backend) == (1, 3)
+    with open(destino / "usuarios.json", encoding="utf-8") as f:
+        assert f.read().count("Ana Peña") == 1
+    with open(destino / "facturas.json", encoding="utf-8") as f:
+        facturas = json.load(f)
+    assert [f["descripcion"] for f in facturas] == ["f0", "f1", "f2"]
+    # Sin foto de facturas ni diario, el directorio exportado se carga desde los JSON
+    assert contenido(destino) == (["ana@ejemplo.com"], ["f0", "f1", "f2"])
+
+
+def bloqueado(directorio, backend):
+    """Si otro (aquí, quien exporta) tiene el bloqueo de escritura del directorio."""
+    if backend == "sqlite":
+        conexion = sqlite3.connect(os.path.join(directorio, repositorio.DB_FILE), timeout=0)
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return True
+        finally:
+            conexion.close()
+        return False
+    fcntl = pytest.importorskip("fcntl")
+    with open(os.path.join(directorio, repositorio.DIARIO_FILE + ".lock"), "a+b") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return False
+
+
+def test_exportar_a_json_escribe_con_el_bloqueo_tomado(tmp_path, monkeypatch, backend):
+    repo = abrir_backend(str(tmp_path), backend)
+    repo.crear_usuario(usuario("ana@ejemplo.com"))
+    repo.crear_factura(factura("f0", "ana@ejemplo.com"))
+    repo.cerrar()
+    exportar_json = repositorio.exportar_json
+    durante = []
+
+    def exportar_comprobando(*args):
+        durante.append(bloqueado(str(tmp_path), backend))
+        return exportar_json(*args)
+
+    monkeypatch.setattr(repositorio, "exportar_json", exportar_comprobando)
+    assert exportar_a_json(str(tmp_path), backend=backend) == (1, 1)
+    assert durante == [True]
+    assert not bloqueado(str(tmp_path), backend)
@@ -0,0 +1,94 @@
+# ===========================================================
+# PRUEBAS DE LOS BACKENDS DE ALMACENAMIENTO
+# ===========================================================
+
+import threading
+
+import pytest
+
+from repositorio import abrir_backend, migrar_json_a_sqlite
+
+from datos import factura, usuario
+
+MONTOS = [0.1, 0.2, 19.99, 1234.56, 0.7]
+
+
+def repositorio_con_datos(directorio, backend):
+    directorio.mkdir()
+    repo = abrir_backend(str(directorio), backend)
+    repo.crear_usuario(usuario("ana@ejemplo.com", "Ana"))
+    repo.crear_usuario(usuario("sin.facturas@ejemplo.com", "Sin Facturas"))
+    for i, monto in enumerate(MONTOS):
+        repo.crear_factura({**factura(f"f{i}", "ana@ejemplo.com"), "monto": monto,
+                            "estado": "Pagada" if i % 2 else "Pendiente"})
+    return repo
+
+
+def test_resumen_por_usuario_igual_en_los_dos_backends(tmp_path):
+    resumenes = {}
+    for backend in ("json", "sqlite"):
+        repo = repositorio_con_datos(tmp_path / backend, backend)
+        try:
+            resumenes[backend] = repo.resumen_por_usuario()
+        finally:
+            repo.cerrar()
+    assert resumenes["json"] == resumenes["sqlite"]
+    ana, vacio = resumenes["sqlite"]
+    assert ana["total"] == 1255.55 and ana["pagado"] == 1234.76 and ana["pendiente"] == 20.79
+    assert vacio == {"email": "sin.facturas@ejemplo.com", "nombre": "Sin Facturas",
+                     "facturas": 0, "total": 0.0, "pagado": 0.0, "pendiente": 0.0}
+    assert all(isinstance(vacio[campo], float) for campo in ("total", "pagado", "pendiente"))
+
+
+def test_migrar_json_a_sqlite_cierra_los_dos_repositorios(tmp_path):
+    repo = repositorio_con_datos(tmp_path / "datos", "json")
+    repo.cerrar()
+    hilos = set(threading.enumerate())
+    assert migrar_json_a_sqlite(str(tmp_path / "datos")) == (2, len(MONTOS))
+    assert set(threading.enumerate()) <= hilos
+    destino = abrir_backend(str(tmp_path / "datos"), "sqlite")
+    try:
+        assert [f["descripcion"] for f in destino.facturas()] == [f"f{i}" for i in range(len(MONTOS))]
+    finally:
+        destino.cerrar()
+
+
+def estado(repo):
+    return (sorted(u["email"] for u in repo.usuarios()), [f["descripcion"] for f in repo.facturas()],
+            repo.resumen_por_usuario(), [u.email for u in repo.buscar_usuarios("luis")])
+
+
+def test_escritura_fallida_no_deja_cambios_en_memoria(tmp_path, monkeypatch):
+    repo = repositorio_con_datos(tmp_path / "datos", "json")
+    try:
+        antes, version = estado(repo), repo.version
+
+        def anotar_a_medias(operacion, **datos):
+            with open(repo.diario.diario_file, "ab") as f:
+                f.write(b'{"op": "' + operacion.encode() + b'", ')
+            raise OSError("No queda espacio en el disco")
+
+        monkeypatch.setattr(repo.diario, "anotar", anotar_a_medias)
+        with pytest.raises(OSError):
+            repo.crear_usuario(usuario("luis@ejemplo.com", "Luis"))
+        with pytest.raises(OSError):
+            repo.crear_factura(factura("f9", "ana@ejemplo.com"))
+        with pytest.raises(OSError):
+            repo.eliminar_usuario("ana@ejemplo.com")
+        with pytest.raises(OSError):
+            repo.agregar_lote([{**usuario("luis@ejemplo.com", "Luis"), "id": "USR900"}],
+                              [{**factura("f9", "luis@ejemplo.com"), "numero": "FAC900"}])
+        assert estado(repo) == antes
+        assert repo.version > version
+
+        # Lo cortado se descarta del diario y lo siguiente se anota bien
+        monkeypatch.undo()
+        repo.crear_usuario(usuario("luis@ejemplo.com", "Luis"))
+        esperado = estado(repo)
+    finally:
+        repo.cerrar()
+    repo = abrir_backend(str(tmp_path / "datos"), "json")
+    try:
+        assert estado(repo) == esperado
+    finally:
+        repo.cerrar()
@@ -0,0 +1,55 @@
+# ===========================================================
+# PRUEBAS DE LA VALIDACIÓN DE FACTURAS
+# ===========================================================
+
+import io
+import json
+
+import pytest
+
+from api import ApiCRM, Peticion
+from importacion import importar, leer_filas
+from repositorio import abrir_backend
+from validaciones import validar_factura
+
+from datos import EMAIL, factura, usuario
+
+MONTOS_NO_VALIDOS = ["nan", "NaN", "inf", "-inf", "1e400", "abc", "0", "-5"]
+
+
+@pytest.mark.parametrize("monto", MONTOS_NO_VALIDOS)
+def test_monto_no_valido(monto):
+    datos, motivo = validar_factura({**factura("x"), "monto": monto})
+    assert datos is None and motivo
+
+
+def test_monto_con_coma_decimal():
+    datos, motivo = validar_factura({**factura("x"), "monto": "12,50"})
+    assert motivo is None and datos["monto"] == 12.5
+
+
+@pytest.fixture
+def repo(tmp_path, backend):
+    repo = abrir_backend(str(tmp_path), backend)
+    repo.crear_usuario(usuario(EMAIL))
+    yield repo
+    repo.cerrar()
+
+
+def test_importacion_rechaza_solo_las_filas_con_monto_no_finito(repo):
+    csv = "email,descripcion,monto,estado\n" + "".join(
+        f"{EMAIL},f{i},{monto},Pendiente\n" for i, monto in enumerate(["10", "nan", "inf", "1e400", "2.5"])
+    )
+    resultado = importar(repo, "facturas", leer_filas(io.StringIO(csv), "csv"), guardar=False)
+    assert resultado.importadas == 2
+    assert [linea for linea, _ in resultado.rechazos] == [3, 4, 5]
+    assert sorted(f["descripcion"] for f in repo.facturas()) == ["f0", "f4"]
+
+
+def test_api_responde_400_a_un_monto_no_finito(repo):
+    api = ApiCRM(repo=repo)
+    for monto in ("nan", "inf", "1e400"):
+        cuerpo = json.dumps({"email": EMAIL, "monto": monto, "estado": "Pendiente"}).encode()
+        estado, _, respuesta = api.atender(Peticion("POST", "/facturas", {}, {}, cuerpo))
+        assert estado == 400, respuesta
+    assert repo.contar_facturas() == 0